@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Register/login throughput of the gateway's database layer, before and after
+the move to async SQLAlchemy.
+
+Usage (from src/backend):
+  python bench/db_throughput.py [--users 500] [--logins-per-user 4] \
+    [--concurrency 1 16 64] [--hash-rounds 0] [--out results.json]
+
+Both runs use the gateway's User model on a fresh SQLite file and the same
+queries as /register (lookup by email, insert, commit) and /login (lookup by
+email), driven by asyncio tasks at the given concurrency:
+
+- before: synchronous engine, default (rollback journal) SQLite settings,
+  each request's DB work in a thread pool the way FastAPI runs sync routes
+- after:  an engine from src.database.make_engine (aiosqlite, WAL,
+  synchronous=NORMAL, pooled), awaited directly
+
+Password hashing is left out by default because bcrypt dominates both paths
+equally; --hash-rounds N (4-12) adds a bcrypt hash per register and a verify
+per login, in the thread pool for both.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q / 100 * len(values)))] if values else 0.0
+
+
+async def _drive(concurrency, users, logins_per_user, register, login):
+    """Run every user's register + logins; returns (seconds, per-op latencies)."""
+    sem = asyncio.Semaphore(concurrency)
+    latencies = {"register": [], "login": []}
+
+    async def one_user(i):
+        email = f"user{i}@bench.local"
+        async with sem:
+            t0 = time.perf_counter()
+            await register(email)
+            latencies["register"].append(time.perf_counter() - t0)
+        for _ in range(logins_per_user):
+            async with sem:
+                t0 = time.perf_counter()
+                await login(email)
+                latencies["login"].append(time.perf_counter() - t0)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one_user(i) for i in range(users)))
+    return time.perf_counter() - start, latencies
+
+
+def _hasher(rounds):
+    if not rounds:
+        return (lambda pw: "x"), (lambda pw, h: True)
+    from passlib.context import CryptContext
+    ctx = CryptContext(schemes=["bcrypt"], bcrypt__rounds=rounds)
+    return ctx.hash, ctx.verify
+
+
+async def run_before(db_path, args):
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from src import models
+
+    engine = create_engine(f"sqlite:///{db_path}", connect_args={"check_same_thread": False})
+    models.Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    pool = ThreadPoolExecutor(max_workers=40)  # anyio's default thread limiter
+    hash_pw, verify_pw = _hasher(args.hash_rounds)
+    loop = asyncio.get_running_loop()
+
+    def register_sync(email):
+        db = Session()
+        try:
+            if db.query(models.User).filter(models.User.email == email).first():
+                return
+            db.add(models.User(email=email, hashed_password=hash_pw("pw")))
+            db.commit()
+        finally:
+            db.close()
+
+    def login_sync(email):
+        db = Session()
+        try:
+            user = db.query(models.User).filter(models.User.email == email).first()
+            verify_pw("pw", user.hashed_password)
+        finally:
+            db.close()
+
+    async def register(email):
+        await loop.run_in_executor(pool, register_sync, email)
+
+    async def login(email):
+        await loop.run_in_executor(pool, login_sync, email)
+
+    try:
+        return await _drive(args.concurrency_level, args.users, args.logins_per_user, register, login)
+    finally:
+        pool.shutdown()
+        engine.dispose()
+
+
+async def run_after(db_path, args):
+    from sqlalchemy import select
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+    from src import database, models
+
+    engine = database.make_engine(f"sqlite+aiosqlite:///{db_path}")
+    await database.init_models(engine)
+    Session = async_sessionmaker(engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+    pool = ThreadPoolExecutor(max_workers=40)
+    hash_pw, verify_pw = _hasher(args.hash_rounds)
+    loop = asyncio.get_running_loop()
+
+    async def register(email):
+        async with Session() as db:
+            if await db.scalar(select(models.User).where(models.User.email == email)):
+                return
+            hashed = await loop.run_in_executor(pool, hash_pw, "pw") if args.hash_rounds else "x"
+            db.add(models.User(email=email, hashed_password=hashed))
+            await db.commit()
+
+    async def login(email):
+        async with Session() as db:
+            user = await db.scalar(select(models.User).where(models.User.email == email))
+            if args.hash_rounds:
+                await loop.run_in_executor(pool, verify_pw, "pw", user.hashed_password)
+
+    try:
+        return await _drive(args.concurrency_level, args.users, args.logins_per_user, register, login)
+    finally:
+        pool.shutdown()
+        await engine.dispose()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark register/login throughput of the gateway DB layer.")
+    ap.add_argument("--users", type=int, default=500)
+    ap.add_argument("--logins-per-user", type=int, default=4)
+    ap.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64])
+    ap.add_argument("--hash-rounds", type=int, default=0, help="bcrypt rounds per register/login (0: no hashing).")
+    ap.add_argument("--dir", help="Directory for the SQLite files (default: system temp; use a real disk, fsync cost matters).")
+    ap.add_argument("--out", help="Also write the results as JSON to this file.")
+    args = ap.parse_args()
+
+    results = []
+    print(f"{'mode':>7} {'conc':>5} {'ops':>6} {'ops/s':>9} {'reg_p50_ms':>11} {'reg_p95_ms':>11} "
+          f"{'login_p50_ms':>13} {'login_p95_ms':>13}")
+    for conc in args.concurrency:
+        args.concurrency_level = conc
+        for mode, runner in (("before", run_before), ("after", run_after)):
+            with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+                seconds, lat = asyncio.run(runner(os.path.join(tmp, f"{mode}.db"), args))
+            ops = len(lat["register"]) + len(lat["login"])
+            row = {
+                "mode": mode, "concurrency": conc, "ops": ops, "seconds": seconds, "ops_per_s": ops / seconds,
+                "register_p50_ms": _percentile(lat["register"], 50) * 1e3,
+                "register_p95_ms": _percentile(lat["register"], 95) * 1e3,
+                "login_p50_ms": _percentile(lat["login"], 50) * 1e3,
+                "login_p95_ms": _percentile(lat["login"], 95) * 1e3,
+            }
+            results.append(row)
+            print(f"{mode:>7} {conc:>5} {ops:>6} {row['ops_per_s']:>9.1f} {row['register_p50_ms']:>11.2f} "
+                  f"{row['register_p95_ms']:>11.2f} {row['login_p50_ms']:>13.2f} {row['login_p95_ms']:>13.2f}")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"args": {k: v for k, v in vars(args).items() if k != "concurrency_level"},
+                       "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Load test for the gateway against local stub upstreams.
+
+Usage (from src/backend):
+  python bench/gateway_load.py [--concurrency 1 8 32] [--users 20] [--requests 200] \
+    [--scenarios me parse-pdf invoke-bedrock knowledge-graph] \
+    [--upstream-latency-ms 200] [--upload-kb 256] [--response-kb 8] [--same-upload [--coalesce]] \
+    [--out results.json] [--compare baseline.json]
+
+Everything runs in this process. Stub PDF parser, Bedrock client and knowledge
+graph services and the gateway (src.main:app, with its real lifespan, database
+and pooled upstream client) are each served by uvicorn on a loopback port. The
+gateway uses a fresh SQLite database and job directory.
+
+For each concurrency level the harness registers --users users, logs each of
+them in, then sends --requests requests per scenario as those users.
+Scenarios:
+
+  me               GET /users/me
+  parse-pdf        POST /parse-pdf/        (multipart upload, --upload-kb)
+  knowledge-graph  POST /knowledge-graph/  (multipart upload)
+  invoke-bedrock   POST /invoke-bedrock/   (small JSON body)
+  parse-pdf-job    POST /parse-pdf/ with Prefer: respond-async, then poll
+                   /jobs/{id} until it finishes (latency is end to end)
+
+Stubs wait --upstream-latency-ms (+-jitter) and answer with --response-kb of
+JSON. Uploads differ per request unless --same-upload is given; with
+--coalesce as well, concurrent identical requests coalesce in the gateway
+(COALESCE_REQUESTS=1), which is otherwise off.
+
+Results (throughput, p50/p95/p99/mean latency, errors per operation) are
+printed and, with --out, written as JSON together with the git commit, so runs
+can be compared across commits; --compare prints the change against an
+earlier --out file. The load generator shares the CPU with the gateway, so
+compare runs from the same machine only.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+SCENARIOS = ("me", "parse-pdf", "knowledge-graph", "invoke-bedrock", "parse-pdf-job")
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q / 100 * len(values)))] if values else 0.0
+
+
+def _free_port():
+    # uvicorn binds it itself: a socket handed over via sockets= left every
+    # request 40 ms slower here (delayed ACKs)
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def stub_app(latency_s, jitter_s, response_kb):
+    filler = "x" * (response_kb * 1024)
+
+    async def answer(request: Request):
+        body = await request.body()
+        await asyncio.sleep(max(0.0, latency_s + random.uniform(-jitter_s, jitter_s)))
+        return JSONResponse({"path": request.url.path, "received_bytes": len(body), "text": filler})
+
+    return Starlette(routes=[Route(p, answer, methods=["POST"])
+                             for p in ("/parse-pdf/", "/invoke-bedrock/", "/knowledge-graph/")])
+
+
+async def _serve(app, port):
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning",
+                                           access_log=False, lifespan="on"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        if task.done():
+            task.result()
+        await asyncio.sleep(0.01)
+    return server, task
+
+
+async def _timed(latencies, errors, name, call):
+    start = time.perf_counter()
+    try:
+        ok = await call()
+    except httpx.HTTPError:
+        ok = False
+    latencies.setdefault(name, []).append(time.perf_counter() - start)
+    if not ok:
+        errors[name] = errors.get(name, 0) + 1
+
+
+async def run_level(base_url, concurrency, args, level):
+    """Register, log in and drive every scenario at one concurrency level."""
+    latencies, errors, seconds = {}, {}, {}
+    sem = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+
+        async def gather(name, n, make_call):
+            async def one(i):
+                async with sem:
+                    await _timed(latencies, errors, name, make_call(i))
+            start = time.perf_counter()
+            await asyncio.gather(*(one(i) for i in range(n)))
+            seconds[name] = time.perf_counter() - start
+
+        emails = [f"user{level}-{i}@bench.example.com" for i in range(args.users)]
+        tokens = {}
+
+        def register(i):
+            async def call():
+                r = await client.post("/register", json={"email": emails[i], "password": "bench-pw"})
+                return r.status_code == 200
+            return call
+
+        def login(i):
+            async def call():
+                r = await client.post("/login", data={"username": emails[i], "password": "bench-pw"})
+                if r.status_code == 200:
+                    tokens[i] = r.json()["access_token"]
+                return r.status_code == 200
+            return call
+
+        await gather("register", args.users, register)
+        await gather("login", args.users, login)
+        if not tokens:
+            return latencies, errors, seconds
+        token_list = list(tokens.values())
+
+        def headers(i, **extra):
+            return {"Authorization": f"Bearer {token_list[i % len(token_list)]}", **extra}
+
+        upload = os.urandom(args.upload_kb * 1024)
+
+        def files(i):
+            prefix = b"" if args.same_upload else f"{level}-{i}-".encode()
+            return {"file": ("bench.pdf", prefix + upload, "application/pdf")}
+
+        def scenario_call(name):
+            def make(i):
+                async def call():
+                    if name == "me":
+                        r = await client.get("/users/me", headers=headers(i))
+                    elif name == "invoke-bedrock":
+                        q = "same question" if args.same_upload else f"question {level}-{i}"
+                        r = await client.post("/invoke-bedrock/", json={"question": q}, headers=headers(i))
+                    elif name == "parse-pdf-job":
+                        r = await client.post("/parse-pdf/", files=files(i),
+                                              headers=headers(i, Prefer="respond-async"))
+                        if r.status_code != 202:
+                            return False
+                        job_url = r.headers["location"]
+                        while True:
+                            await asyncio.sleep(args.poll_ms / 1e3)
+                            r = await client.get(job_url, headers=headers(i))
+                            if r.status_code != 200 or r.json()["status"] in ("succeeded", "failed"):
+                                return r.status_code == 200 and r.json()["status"] == "succeeded"
+                    else:
+                        r = await client.post(f"/{name}/", files=files(i), headers=headers(i))
+                    return r.status_code == 200
+                return call
+            return make
+
+        for name in args.scenarios:
+            await gather(name, args.requests, scenario_call(name))
+    return latencies, errors, seconds
+
+
+async def main_async(args, tmp):
+    stub_port, gateway_port = _free_port(), _free_port()
+    stub_url = f"http://127.0.0.1:{stub_port}"
+    os.environ.update({
+        "PDF_PARSER_URL": stub_url + "/parse-pdf/",
+        "BEDROCK_CLIENT_URL": stub_url + "/invoke-bedrock/",
+        "KNOWLEDGE_GRAPH_URL": stub_url + "/knowledge-graph/",
+        "DATABASE_URL": f"sqlite+aiosqlite:///{os.path.join(tmp, 'gateway.db')}",
+        "JOBS_DIR": os.path.join(tmp, "jobs"),
+        "COALESCE_REQUESTS": "1" if args.coalesce else "0",
+    })
+    from src import auth
+    from src.main import app  # after the environment is set: URLs and engine are read at import
+    if args.bcrypt_rounds:
+        auth.pwd_context.update(bcrypt__rounds=args.bcrypt_rounds)
+
+    stub_server, stub_task = await _serve(stub_app(args.upstream_latency_ms / 1e3, args.jitter_ms / 1e3,
+                                                   args.response_kb), stub_port)
+    gateway_server, gateway_task = await _serve(app, gateway_port)
+    base_url = f"http://127.0.0.1:{gateway_port}"
+    results = []
+    try:
+        for level, conc in enumerate(args.concurrency):
+            latencies, errors, seconds = await run_level(base_url, conc, args, level)
+            for name, lat in latencies.items():
+                results.append({
+                    "concurrency": conc,
+                    "operation": name,
+                    "requests": len(lat),
+                    "errors": errors.get(name, 0),
+                    "seconds": seconds[name],
+                    "throughput_rps": len(lat) / seconds[name] if seconds[name] else 0.0,
+                    "p50_ms": _percentile(lat, 50) * 1e3,
+                    "p95_ms": _percentile(lat, 95) * 1e3,
+                    "p99_ms": _percentile(lat, 99) * 1e3,
+                    "mean_ms": sum(lat) / len(lat) * 1e3,
+                })
+    finally:
+        gateway_server.should_exit = True
+        await gateway_task
+        stub_server.should_exit = True
+        await stub_task
+    return results
+
+
+def _print_results(results):
+    print(f"{'conc':>5} {'operation':>16} {'reqs':>6} {'err':>4} {'req/s':>9} {'p50_ms':>9} {'p95_ms':>9} "
+          f"{'p99_ms':>9}")
+    for r in results:
+        print(f"{r['concurrency']:>5} {r['operation']:>16} {r['requests']:>6} {r['errors']:>4} "
+              f"{r['throughput_rps']:>9.1f} {r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} {r['p99_ms']:>9.1f}")
+
+
+def _print_comparison(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    before = {(r["concurrency"], r["operation"]): r for r in baseline["results"]}
+    print(f"\nchange vs {baseline_path} (commit {baseline.get('commit')}):")
+    print(f"{'conc':>5} {'operation':>16} {'req/s':>9} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for r in results:
+        b = before.get((r["concurrency"], r["operation"]))
+        if b is None:
+            continue
+
+        def pct(key):
+            return f"{(r[key] / b[key] - 1) * 100:+.1f}%" if b[key] else "n/a"
+
+        print(f"{r['concurrency']:>5} {r['operation']:>16} {pct('throughput_rps'):>9} {pct('p50_ms'):>9} "
+              f"{pct('p95_ms'):>9} {pct('p99_ms'):>9}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Load-test the gateway against local stub upstreams.")
+    ap.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    ap.add_argument("--users", type=int, default=20, help="Users registered and logged in per concurrency level.")
+    ap.add_argument("--requests", type=int, default=200, help="Requests per scenario and concurrency level.")
+    ap.add_argument("--scenarios", nargs="+", choices=SCENARIOS,
+                    default=["me", "parse-pdf", "knowledge-graph", "invoke-bedrock"])
+    ap.add_argument("--upstream-latency-ms", type=float, default=200.0)
+    ap.add_argument("--jitter-ms", type=float, default=20.0)
+    ap.add_argument("--upload-kb", type=int, default=256, help="Size of each uploaded file.")
+    ap.add_argument("--response-kb", type=int, default=8, help="Size of each stub answer.")
+    ap.add_argument("--same-upload", action="store_true", help="Send identical bodies.")
+    ap.add_argument("--coalesce", action="store_true", help="Run the gateway with COALESCE_REQUESTS=1.")
+    ap.add_argument("--bcrypt-rounds", type=int, default=4,
+                    help="Password hashing cost for the run (0: the gateway's default); it dominates "
+                         "register/login and is the same for every commit.")
+    ap.add_argument("--poll-ms", type=float, default=50.0, help="Job polling interval for parse-pdf-job.")
+    ap.add_argument("--out", help="Write the results as JSON to this file.")
+    ap.add_argument("--compare", help="A previous --out file to compare against.")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="gateway-bench-") as tmp:
+        results = asyncio.run(main_async(args, tmp))
+    _print_results(results)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"commit": _git_commit(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                       "args": vars(args), "results": results}, f, indent=2)
+    if args.compare:
+        _print_comparison(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
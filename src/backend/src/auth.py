@@ -1,20 +1,35 @@
+import os
+import time
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Any, Dict, Optional
 
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from pydantic import BaseModel
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import event, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from . import database, models, schemas
+from .utils.cache import TTLCache
+from .utils.metrics import phase
 
 # Configurare
 SECRET_KEY = "a-very-secret-key-that-should-be-long-and-random"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# Per-process auth caches. Decoded token payloads are kept until the token
+# expires, so a repeated bearer token skips signature verification. Users are
+# kept by token subject (email) for AUTH_USER_CACHE_TTL seconds and dropped
+# whenever the ORM inserts, updates or deletes that user.
+token_cache = TTLCache("token_decode", int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000")),
+                       ttl_seconds=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+user_cache = TTLCache("user", int(os.getenv("AUTH_USER_CACHE_SIZE", "10000")),
+                      ttl_seconds=float(os.getenv("AUTH_USER_CACHE_TTL", "60")))
+USER_FIELDS = ("id", "email", "hashed_password", "is_active")
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
@@ -34,14 +49,48 @@ def create_access_token(data: dict):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(database.get_db)):
+def decode_token(token: str) -> Dict[str, Any]:
+    payload = token_cache.get(token)
+    if payload is None:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        exp = payload.get("exp")
+        token_cache.put(token, payload, ttl_seconds=None if exp is None else exp - time.time())
+    return payload
+
+def invalidate_user(email: Optional[str]) -> None:
+    if email:
+        user_cache.invalidate(email)
+
+@event.listens_for(models.User, "after_insert")
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def _drop_cached_user(mapper, connection, target):
+    invalidate_user(target.email)
+    for old_email in inspect(target).attrs.email.history.deleted or ():
+        invalidate_user(old_email)
+
+async def get_user_by_email(db: AsyncSession, email: str) -> Optional[models.User]:
+    """The user for a token subject; a cache hit returns a detached copy."""
+    fields = user_cache.get(email)
+    if fields is not None:
+        return models.User(**fields)
+    user = await db.scalar(select(models.User).where(models.User.email == email))
+    if user is not None:
+        user_cache.put(email, {f: getattr(user, f) for f in USER_FIELDS})
+    return user
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    return {"token_decode": token_cache.stats(), "user": user_cache.stats()}
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(database.get_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        with phase("auth"):
+            payload = decode_token(token)
         email: str = payload.get("sub")
         if email is None:
             raise credentials_exception
@@ -49,7 +98,7 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     except JWTError:
         raise credentials_exception
     
-    user = db.query(models.User).filter(models.User.email == token_data.email).first()
+    user = await get_user_by_email(db, token_data.email)
     if user is None:
         raise credentials_exception
     return user
\ No newline at end of file
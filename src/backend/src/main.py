@@ -1,15 +1,63 @@
-from fastapi import FastAPI, UploadFile, File, Request, Depends, HTTPException, status
+import asyncio
+import hashlib
+import json
+import os
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+
+from fastapi import FastAPI, Request, Depends, Header, HTTPException, status
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 import httpx
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import UploadFile
 
 from . import auth, models, schemas
-from .database import SessionLocal, engine, get_db
+from .database import SessionLocal, engine, get_db, init_models
+from .services.jobs import FINISHED, JobQueue, QueueFull, job_payload
+from .services.upstream import Upstream, UpstreamClient
+from .utils.metrics import REGISTRY, MetricsMiddleware, phase
+from .utils.singleflight import SingleFlight
+
+# Service URLs for Docker internal communication
+PDF_PARSER_URL = os.getenv("PDF_PARSER_URL", "http://pdf-parser-microservice:8001/parse-pdf/")
+BEDROCK_CLIENT_URL = os.getenv("BEDROCK_CLIENT_URL", "http://bedrock-client-microservice:8002/invoke-bedrock/")
+KNOWLEDGE_GRAPH_URL = os.getenv("KNOWLEDGE_GRAPH_URL", "http://knowledge-graph-microservice:8003/knowledge-graph/")
+
+# Uploads above this are rejected with 413 (from Content-Length before any
+# upstream call, otherwise as soon as the streamed body exceeds it)
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", "200")) * 1024 * 1024
 
-models.Base.metadata.create_all(bind=engine)
+# With 1, concurrent identical calls (same endpoint, same file or JSON body)
+# share one upstream call. Off by default: it spools each upload and buffers
+# each answer, where uploads are otherwise piped straight through.
+COALESCE_REQUESTS = os.getenv("COALESCE_REQUESTS", "0") == "1"
+
+# Parsing is a pure function of the upload; the other two run LLM calls
+UPSTREAMS = {
+    "pdf-parser": Upstream("pdf-parser", PDF_PARSER_URL, idempotent=True),
+    "bedrock-client": Upstream("bedrock-client", BEDROCK_CLIENT_URL),
+    "knowledge-graph": Upstream("knowledge-graph", KNOWLEDGE_GRAPH_URL),
+}
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await init_models()
+    app.state.upstream = UpstreamClient.from_env(UPSTREAMS)
+    app.state.jobs = JobQueue.from_env(app.state.upstream, SessionLocal)
+    await app.state.jobs.start()
+    try:
+        yield
+    finally:
+        await app.state.jobs.stop()
+        await app.state.upstream.aclose()
+        await engine.dispose()
 
-app = FastAPI(title="MindBoost API Gateway")
+app = FastAPI(title="MindBoost API Gateway", lifespan=lifespan)
 
 origins = [
     "http://localhost",
@@ -22,39 +70,68 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
+app.add_middleware(MetricsMiddleware)
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+def get_upstream(request: Request) -> UpstreamClient:
+    return request.app.state.upstream
 
-# Service URLs for Docker internal communication
-PDF_PARSER_URL = "http://pdf-parser-microservice:8001/parse-pdf/"
-BEDROCK_CLIENT_URL = "http://bedrock-client-microservice:8002/invoke-bedrock/"
-KNOWLEDGE_GRAPH_URL = "http://knowledge-graph-microservice:8003/knowledge-graph/"
+def get_jobs(request: Request) -> JobQueue:
+    return request.app.state.jobs
+
+class UploadTooLarge(Exception):
+    pass
+
+@app.exception_handler(UploadTooLarge)
+async def upload_too_large_handler(request: Request, exc: UploadTooLarge):
+    return JSONResponse(status_code=413,
+                        content={"detail": f"Upload exceeds {MAX_UPLOAD_BYTES // (1024 * 1024)} MB"})
+
+@app.exception_handler(QueueFull)
+async def queue_full_handler(request: Request, exc: QueueFull):
+    return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, headers={"Retry-After": "30"},
+                        content={"detail": f"Too many queued {exc} jobs, retry later"})
+
+@app.exception_handler(httpx.TimeoutException)
+async def upstream_timeout_handler(request: Request, exc: httpx.TimeoutException):
+    return JSONResponse(status_code=status.HTTP_504_GATEWAY_TIMEOUT, content={"detail": "Upstream service timed out"})
+
+@app.exception_handler(httpx.TransportError)
+async def upstream_unavailable_handler(request: Request, exc: httpx.TransportError):
+    return JSONResponse(status_code=status.HTTP_502_BAD_GATEWAY, content={"detail": "Upstream service unavailable"})
 
 # --- Authentication Endpoints ---
 
+# bcrypt is deliberately slow CPU work; it runs in the threadpool so the
+# event loop keeps serving other requests meanwhile.
+
 @app.post("/register", response_model=schemas.User, tags=["Authentication"])
-def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = db.query(models.User).filter(models.User.email == user.email).first()
+async def register_user(user: schemas.UserCreate, db: AsyncSession = Depends(get_db)):
+    email_taken = HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered")
+    db_user = await db.scalar(select(models.User).where(models.User.email == user.email))
     if db_user:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered")
+        raise email_taken
     
-    hashed_password = auth.get_password_hash(user.password)
+    with phase("auth"):
+        hashed_password = await run_in_threadpool(auth.get_password_hash, user.password)
     new_user = models.User(email=user.email, hashed_password=hashed_password)
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    try:
+        await db.commit()
+    except IntegrityError:  # registered concurrently
+        await db.rollback()
+        raise email_taken
+    await db.refresh(new_user)
     return new_user
 
 @app.post("/login", response_model=schemas.Token, tags=["Authentication"])
-def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.email == form_data.username).first()
-    if not user or not auth.verify_password(form_data.password, user.hashed_password):
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
+    user = await db.scalar(select(models.User).where(models.User.email == form_data.username))
+    with phase("auth"):
+        valid = user is not None and await run_in_threadpool(
+            auth.verify_password, form_data.password, user.hashed_password)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -66,29 +143,274 @@ def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db:
 # --- Protected Endpoints ---
 
 @app.get("/users/me", response_model=schemas.User, tags=["Users"])
-def read_users_me(current_user: models.User = Depends(auth.get_current_user)):
+async def read_users_me(current_user: models.User = Depends(auth.get_current_user)):
     return current_user
 
-@app.post("/parse-pdf/", tags=["Core Services"])
-async def proxy_parse_pdf(file: UploadFile = File(...), current_user: models.User = Depends(auth.get_current_user)):
-    async with httpx.AsyncClient() as client:
-        files = {'file': (file.filename, await file.read(), file.content_type)}
-        response = await client.post(PDF_PARSER_URL, files=files)
+# Without coalescing, file uploads are passed through as they arrive: the
+# multipart body is streamed to the upstream unparsed and the upstream's
+# answer is streamed back, so memory per request stays at a few chunks
+# whatever the file size.
+
+UPLOAD_OPENAPI = {"requestBody": {"required": True, "content": {"multipart/form-data": {"schema": {
+    "type": "object", "required": ["file"], "properties": {"file": {"type": "string", "format": "binary"}}}}}}}
+
+async def _limited_body(request: Request) -> AsyncIterator[bytes]:
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > MAX_UPLOAD_BYTES:
+            raise UploadTooLarge()
+        yield chunk
+
+def _upload_headers(request: Request) -> Dict[str, str]:
+    content_type = request.headers.get("content-type", "")
+    if not content_type.startswith("multipart/form-data"):
+        raise HTTPException(status_code=422,
+                            detail="Expected a multipart/form-data upload with a 'file' field")
+    length = request.headers.get("content-length")
+    if length is not None and not (length.isascii() and length.isdigit()):
+        raise HTTPException(status_code=400, detail="Invalid Content-Length header")
+    if length is not None and int(length) > MAX_UPLOAD_BYTES:
+        raise UploadTooLarge()
+    headers = {"content-type": content_type}
+    if length is not None:
+        headers["content-length"] = length
+    return headers
+
+async def _stream_upload(request: Request, upstream: UpstreamClient, name: str) -> StreamingResponse:
+    headers = _upload_headers(request)
+    with phase("upstream"):
+        response = await upstream.open_stream(name, _limited_body(request), headers=headers)
+    if response.is_error:
+        try:
+            await response.aread()
+        finally:
+            await upstream.close_stream(name, response)
         response.raise_for_status()
-        return response.json()
+    passthrough = {k: v for k, v in response.headers.items() if k in ("content-encoding", "content-length")}
+
+    async def body() -> AsyncIterator[bytes]:
+        # Not a BackgroundTask: Starlette skips those when the body raises (the
+        # upstream drops mid-body, the client goes away) and the slot would leak.
+        try:
+            async for chunk in response.aiter_raw():
+                yield chunk
+        finally:
+            await upstream.close_stream(name, response)
+
+    return StreamingResponse(body(), status_code=response.status_code, headers=passthrough,
+                             media_type=response.headers.get("content-type"))
+
+# With `Prefer: respond-async` (RFC 7240) the core routes queue the call as a
+# background job instead: the body is spooled, the answer is 202 with the job
+# in the body and its URL in Location, and the result is read from /jobs/{id}.
+
+PREFER_DESCRIPTION = "`respond-async` to queue the call as a job and get 202 with its id"
+
+def _wants_async(prefer: Optional[str]) -> bool:
+    return prefer is not None and "respond-async" in (p.strip().lower() for p in prefer.split(","))
+
+async def _submit_job(request: Request, jobs: JobQueue, name: str, user: models.User,
+                      content_type: str) -> JSONResponse:
+    with phase("upload"):
+        job = await jobs.submit(name, user.id, _limited_body(request), content_type)
+    return JSONResponse(status_code=status.HTTP_202_ACCEPTED,
+                        content=schemas.Job(**job_payload(job)).model_dump(mode="json"),
+                        headers={"Location": f"/jobs/{job.id}", "Preference-Applied": "respond-async"})
+
+# Coalescing: when a class uploads the same syllabus at once, only the first
+# upload goes upstream and the others wait for its answer. The key is the
+# SHA-256 of the file itself (the raw multipart body differs per client by
+# its boundary), so the upload is received and spooled first (in memory up
+# to 1 MB, then on disk) and the upstream's answer is buffered to be handed
+# to every waiting caller.
+
+flights = SingleFlight("upstream")
+
+def _limited_request(request: Request) -> Request:
+    received = 0
+
+    async def receive():
+        nonlocal received
+        message = await request.receive()
+        received += len(message.get("body", b""))
+        if received > MAX_UPLOAD_BYTES:
+            raise UploadTooLarge()
+        return message
+
+    return Request(request.scope, receive)
+
+def _sha256(f) -> str:
+    digest = hashlib.sha256()
+    f.seek(0)
+    for chunk in iter(lambda: f.read(1024 * 1024), b""):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+def _shared_response(response: httpx.Response) -> Response:
+    response.raise_for_status()
+    return Response(content=response.content, status_code=response.status_code,
+                    media_type=response.headers.get("content-type"))
+
+async def _coalesced_upload(request: Request, upstream: UpstreamClient, name: str) -> Response:
+    _upload_headers(request)
+    with phase("upload"):
+        form = await _limited_request(request).form()
+    sent = False
+    try:
+        upload = form.get("file")
+        if not isinstance(upload, UploadFile):
+            raise HTTPException(status_code=422,
+                                detail="Expected a multipart/form-data upload with a 'file' field")
+        with phase("upload"):
+            digest = await run_in_threadpool(_sha256, upload.file)
+
+        async def send() -> httpx.Response:
+            # Runs on after the first caller disconnects, so it owns the spooled file
+            nonlocal sent
+            sent = True
+            try:
+                files = {"file": (upload.filename, upload.file, upload.content_type)}
+                return await upstream.post(name, files=files)
+            finally:
+                await form.close()
+
+        with phase("upstream"):
+            response, _ = await flights.do((name, digest), send)
+    finally:
+        if not sent:
+            await form.close()
+    return _shared_response(response)
+
+async def _proxy_upload(request: Request, upstream: UpstreamClient, name: str) -> Response:
+    if COALESCE_REQUESTS:
+        return await _coalesced_upload(request, upstream, name)
+    return await _stream_upload(request, upstream, name)
+
+@app.post("/parse-pdf/", tags=["Core Services"], openapi_extra=UPLOAD_OPENAPI)
+async def proxy_parse_pdf(request: Request, current_user: models.User = Depends(auth.get_current_user),
+                          upstream: UpstreamClient = Depends(get_upstream), jobs: JobQueue = Depends(get_jobs),
+                          prefer: Optional[str] = Header(None, description=PREFER_DESCRIPTION)):
+    if _wants_async(prefer):
+        headers = _upload_headers(request)
+        return await _submit_job(request, jobs, "pdf-parser", current_user, headers["content-type"])
+    return await _proxy_upload(request, upstream, "pdf-parser")
 
 @app.post("/invoke-bedrock/", tags=["Core Services"])
-async def proxy_invoke_bedrock(request: Request, current_user: models.User = Depends(auth.get_current_user)):
-    data = await request.json()
-    async with httpx.AsyncClient() as client:
-        response = await client.post(BEDROCK_CLIENT_URL, json=data)
-        response.raise_for_status()
-        return response.json()
+async def proxy_invoke_bedrock(request: Request, current_user: models.User = Depends(auth.get_current_user),
+                               upstream: UpstreamClient = Depends(get_upstream), jobs: JobQueue = Depends(get_jobs),
+                               prefer: Optional[str] = Header(None, description=PREFER_DESCRIPTION)):
+    if _wants_async(prefer):
+        return await _submit_job(request, jobs, "bedrock-client", current_user, "application/json")
+    with phase("upload"):
+        data = await request.json()
+    with phase("upstream"):
+        if COALESCE_REQUESTS:
+            digest = hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()
+            response, _ = await flights.do(("bedrock-client", digest),
+                                           lambda: upstream.post("bedrock-client", json=data))
+        else:
+            response = await upstream.post("bedrock-client", json=data)
+    response.raise_for_status()
+    return response.json()
         
-@app.post("/knowledge-graph/", tags=["Core Services"])
-async def proxy_knowledge_graph(file: UploadFile = File(...), current_user: models.User = Depends(auth.get_current_user)):
-    async with httpx.AsyncClient() as client:
-        files = {'file': (file.filename, await file.read(), file.content_type)}
-        response = await client.post(KNOWLEDGE_GRAPH_URL, files=files)
-        response.raise_for_status()
-        return response.json()
\ No newline at end of file
+@app.post("/knowledge-graph/", tags=["Core Services"], openapi_extra=UPLOAD_OPENAPI)
+async def proxy_knowledge_graph(request: Request, current_user: models.User = Depends(auth.get_current_user),
+                                upstream: UpstreamClient = Depends(get_upstream), jobs: JobQueue = Depends(get_jobs),
+                                prefer: Optional[str] = Header(None, description=PREFER_DESCRIPTION)):
+    if _wants_async(prefer):
+        headers = _upload_headers(request)
+        return await _submit_job(request, jobs, "knowledge-graph", current_user, headers["content-type"])
+    return await _proxy_upload(request, upstream, "knowledge-graph")
+
+# --- Jobs ---
+
+SSE_KEEPALIVE_SECONDS = 15
+
+async def _load_job(db: AsyncSession, job_id: str, user: models.User) -> models.Job:
+    job = await db.get(models.Job, job_id)
+    if job is None or job.user_id != user.id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return job
+
+@app.get("/jobs/{job_id}", response_model=schemas.Job, tags=["Jobs"])
+async def read_job(job_id: str, current_user: models.User = Depends(auth.get_current_user),
+                   db: AsyncSession = Depends(get_db)):
+    return job_payload(await _load_job(db, job_id, current_user))
+
+async def _job_events(jobs: JobQueue, job_id: str) -> AsyncIterator[str]:
+    last_status = None
+    while True:
+        changed = jobs.watch(job_id)
+        async with SessionLocal() as db:
+            job = await db.get(models.Job, job_id)
+        if job is None:
+            jobs.unwatch(job_id)
+            return
+        if job.status != last_status:
+            last_status = job.status
+            yield f"event: {job.status}\ndata: {schemas.Job(**job_payload(job)).model_dump_json()}\n\n"
+        if job.status in FINISHED:
+            jobs.unwatch(job_id)
+            return
+        try:
+            await asyncio.wait_for(changed.wait(), SSE_KEEPALIVE_SECONDS)
+        except asyncio.TimeoutError:
+            yield ": keep-alive\n\n"
+
+@app.get("/jobs/{job_id}/events", tags=["Jobs"], response_class=StreamingResponse)
+async def job_events(job_id: str, current_user: models.User = Depends(auth.get_current_user),
+                     db: AsyncSession = Depends(get_db), jobs: JobQueue = Depends(get_jobs)):
+    """Server-sent events: one event per status change (named after the status), ending once the job has finished."""
+    await _load_job(db, job_id, current_user)
+    return StreamingResponse(_job_events(jobs, job_id), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# --- Monitoring ---
+
+@REGISTRY.collector
+def _gateway_samples():
+    upstreams = app.state.upstream.stats()["upstreams"] if hasattr(app.state, "upstream") else {}
+    yield ("gateway_upstream_in_flight", "gauge", "Upstream calls in progress.",
+           [({"upstream": n}, u["in_flight"]) for n, u in upstreams.items()])
+    yield ("gateway_upstream_waiting", "gauge", "Calls waiting for a per-upstream slot.",
+           [({"upstream": n}, u["waiting"]) for n, u in upstreams.items()])
+    yield ("gateway_upstream_retries_total", "counter", "Upstream retries.",
+           [({"upstream": n}, u["retries"]) for n, u in upstreams.items()])
+    groups = flights.stats()["groups"]
+    yield ("gateway_upstream_calls_total", "counter", "Upstream calls made for proxied requests.",
+           [({"upstream": g}, c["calls"]) for g, c in groups.items()])
+    yield ("gateway_coalesced_requests_total", "counter", "Requests served by another request's upstream call.",
+           [({"upstream": g}, c["coalesced"]) for g, c in groups.items()])
+    job_types = app.state.jobs.stats()["types"] if hasattr(app.state, "jobs") else {}
+    yield ("gateway_jobs_queued", "gauge", "Jobs waiting for a worker.",
+           [({"job_type": t}, j["queued"]) for t, j in job_types.items()])
+    yield ("gateway_jobs_running", "gauge", "Jobs being run.",
+           [({"job_type": t}, j["running"]) for t, j in job_types.items()])
+    yield ("gateway_jobs_finished_total", "counter", "Finished jobs by result.",
+           [({"job_type": t, "status": st}, j[st]) for t, j in job_types.items() for st in ("succeeded", "failed")])
+    caches = auth.cache_stats()
+    yield ("gateway_auth_cache_hits_total", "counter", "Auth cache hits.",
+           [({"cache": n}, c["hits"]) for n, c in caches.items()])
+    yield ("gateway_auth_cache_misses_total", "counter", "Auth cache misses.",
+           [({"cache": n}, c["misses"]) for n, c in caches.items()])
+
+@app.get("/metrics", tags=["Monitoring"], response_class=PlainTextResponse)
+def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/stats/upstreams", tags=["Monitoring"])
+def upstream_pool_stats(request: Request):
+    return get_upstream(request).stats()
+
+@app.get("/stats/jobs", tags=["Monitoring"])
+def job_queue_stats(request: Request):
+    return get_jobs(request).stats()
+
+@app.get("/stats/coalescing", tags=["Monitoring"])
+def coalescing_stats():
+    return flights.stats()
+
+@app.get("/stats/auth", tags=["Monitoring"])
+def auth_cache_stats():
+    return auth.cache_stats()
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, Integer, String
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String, Text
 from .database import Base
 
 class User(Base):
@@ -7,4 +7,22 @@ class User(Base):
     id = Column(Integer, primary_key=True, index=True)
     email = Column(String, unique=True, index=True, nullable=False)
     hashed_password = Column(String, nullable=False)
-    is_active = Column(Boolean, default=True)
\ No newline at end of file
+    is_active = Column(Boolean, default=True)
+
+class Job(Base):
+    """A queued upstream call (see services/jobs.py); the request body is spooled to disk."""
+    __tablename__ = "jobs"
+
+    id = Column(String(32), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True, nullable=False)
+    job_type = Column(String, nullable=False)
+    status = Column(String, index=True, nullable=False)
+    content_type = Column(String)
+    attempts = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    started_at = Column(DateTime(timezone=True))
+    finished_at = Column(DateTime(timezone=True))
+    status_code = Column(Integer)
+    result_type = Column(String)
+    result = Column(Text)
+    error = Column(String)
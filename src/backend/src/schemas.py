@@ -1,5 +1,6 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional
+from datetime import datetime
+from typing import Any, Optional
 
 # --- User Schemas ---
 class UserBase(BaseModel):
@@ -21,4 +22,17 @@ class Token(BaseModel):
     token_type: str
 
 class TokenData(BaseModel):
-    email: Optional[str] = None
\ No newline at end of file
+    email: Optional[str] = None
+
+# --- Job Schemas ---
+class Job(BaseModel):
+    id: str
+    job_type: str
+    status: str
+    attempts: int
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    status_code: Optional[int] = None
+    error: Optional[str] = None
+    result: Optional[Any] = None
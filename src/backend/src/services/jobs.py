@@ -0,0 +1,293 @@
+"""
+Background jobs for long-running upstream calls.
+
+A proxy route called with `Prefer: respond-async` spools the request body to
+JOBS_DIR, records a job row and answers 202 right away. A bounded pool of
+worker tasks per job type (one type per upstream) sends the spooled body to
+the upstream and stores its answer on the job. Clients poll GET /jobs/{id}
+or follow GET /jobs/{id}/events (server-sent events) until the job has
+succeeded or failed.
+
+Jobs live in the gateway's database, so they survive restarts: on startup
+jobs still queued are put back on their queue, and jobs that were running
+when the process stopped are queued again (the spooled body is only deleted
+once a job has finished). The queue is in-process, so this assumes a single
+gateway process, as in docker-compose.
+
+Settings (env):
+  JOBS_DIR=./jobs            spooled request bodies
+  JOBS_CONCURRENCY=4         workers per job type; per type e.g.
+                             JOBS_CONCURRENCY_PDF_PARSER=8
+  JOBS_MAX_QUEUED=1000       per job type; beyond it submit() raises QueueFull
+  JOBS_RETENTION_HOURS=24    finished jobs older than this are purged at startup
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterable, AsyncIterator, Dict, List
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from ..models import Job
+from .upstream import UpstreamClient
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+FINISHED = (SUCCEEDED, FAILED)
+CHUNK_SIZE = 64 * 1024
+
+
+class QueueFull(Exception):
+    pass
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite hands back naive datetimes; they were stored as UTC
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def _env_name(job_type: str) -> str:
+    return "JOBS_CONCURRENCY_" + job_type.upper().replace("-", "_")
+
+
+async def _file_chunks(path: str) -> AsyncIterator[bytes]:
+    # Local page-cache reads of 64 KB; not worth a thread hop per chunk
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+
+def job_payload(job: Job) -> Dict[str, Any]:
+    """The API view of a job; JSON upstream answers are returned parsed."""
+    result: Any = job.result
+    if result is not None and (job.result_type or "").startswith("application/json"):
+        try:
+            result = json.loads(result)
+        except ValueError:
+            pass
+    return {
+        "id": job.id,
+        "job_type": job.job_type,
+        "status": job.status,
+        "attempts": job.attempts,
+        "created_at": _as_utc(job.created_at),
+        "started_at": job.started_at and _as_utc(job.started_at),
+        "finished_at": job.finished_at and _as_utc(job.finished_at),
+        "status_code": job.status_code,
+        "error": job.error,
+        "result": result,
+    }
+
+
+@dataclass
+class JobTypeStats:
+    concurrency: int
+    running: int = 0
+    submitted: int = 0
+    recovered: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    rejected: int = 0
+    max_queued: int = 0
+    wait_seconds: float = 0.0
+    run_seconds: float = 0.0
+
+
+class JobQueue:
+    def __init__(self, upstream: UpstreamClient, session_factory: async_sessionmaker, spool_dir: str,
+                 concurrency: Dict[str, int], max_queued: int = 1000, retention_hours: float = 24.0):
+        self.upstream = upstream
+        self.session_factory = session_factory
+        self.spool_dir = spool_dir
+        self.max_queued = max_queued
+        self.retention_hours = retention_hours
+        self._queues: Dict[str, "asyncio.Queue[str]"] = {t: asyncio.Queue() for t in concurrency}
+        self._stats = {t: JobTypeStats(concurrency=n) for t, n in concurrency.items()}
+        self._workers: List[asyncio.Task] = []
+        self._changed: Dict[str, asyncio.Event] = {}
+
+    @classmethod
+    def from_env(cls, upstream: UpstreamClient, session_factory: async_sessionmaker) -> "JobQueue":
+        default = int(os.getenv("JOBS_CONCURRENCY", "4"))
+        concurrency = {t: int(os.getenv(_env_name(t), str(default))) for t in upstream.upstreams}
+        return cls(upstream, session_factory,
+                   spool_dir=os.getenv("JOBS_DIR", "./jobs"),
+                   concurrency=concurrency,
+                   max_queued=int(os.getenv("JOBS_MAX_QUEUED", "1000")),
+                   retention_hours=float(os.getenv("JOBS_RETENTION_HOURS", "24")))
+
+    def _spool_path(self, job_id: str) -> str:
+        return os.path.join(self.spool_dir, job_id)
+
+    def _enqueue(self, job_type: str, job_id: str) -> None:
+        queue = self._queues[job_type]
+        queue.put_nowait(job_id)
+        stats = self._stats[job_type]
+        stats.max_queued = max(stats.max_queued, queue.qsize())
+
+    def _notify(self, job_id: str) -> None:
+        event = self._changed.pop(job_id, None)
+        if event is not None:
+            event.set()
+
+    def watch(self, job_id: str) -> asyncio.Event:
+        """An event set on the job's next status change.
+
+        Take it before reading the job, then wait on it, so a change in
+        between is not missed.
+        """
+        return self._changed.setdefault(job_id, asyncio.Event())
+
+    def unwatch(self, job_id: str) -> None:
+        # For watchers of a finished job: no further change will set the event
+        self._changed.pop(job_id, None)
+
+    async def start(self) -> None:
+        os.makedirs(self.spool_dir, exist_ok=True)
+        async with self.session_factory() as db:
+            if self.retention_hours > 0:
+                cutoff = _now() - timedelta(hours=self.retention_hours)
+                await db.execute(delete(Job).where(Job.status.in_(FINISHED), Job.finished_at < cutoff))
+            # Whatever was running when the last process stopped starts over
+            await db.execute(update(Job).where(Job.status == RUNNING).values(status=QUEUED, started_at=None))
+            pending = (await db.execute(
+                select(Job.id, Job.job_type).where(Job.status == QUEUED).order_by(Job.created_at))).all()
+            unknown = [job_id for job_id, job_type in pending if job_type not in self._queues]
+            if unknown:
+                await db.execute(update(Job).where(Job.id.in_(unknown)).values(
+                    status=FAILED, finished_at=_now(), error="Unknown job type"))
+            await db.commit()
+        for job_id, job_type in pending:
+            if job_type in self._queues:
+                self._enqueue(job_type, job_id)
+                self._stats[job_type].recovered += 1
+        for job_type, stats in self._stats.items():
+            for _ in range(stats.concurrency):
+                self._workers.append(asyncio.create_task(self._worker(job_type)))
+
+    async def stop(self) -> None:
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+
+    async def submit(self, job_type: str, user_id: int, body: AsyncIterable[bytes], content_type: str) -> Job:
+        """Spool the body and queue a job; the returned row is detached."""
+        if self._queues[job_type].qsize() >= self.max_queued:
+            self._stats[job_type].rejected += 1
+            raise QueueFull(job_type)
+        job_id = uuid.uuid4().hex
+        path = self._spool_path(job_id)
+        try:
+            with open(path, "wb") as f:
+                async for chunk in body:
+                    f.write(chunk)
+            job = Job(id=job_id, user_id=user_id, job_type=job_type, status=QUEUED,
+                      content_type=content_type, created_at=_now(), attempts=0)
+            async with self.session_factory() as db:
+                db.add(job)
+                await db.commit()
+        except BaseException:
+            _remove(path)
+            raise
+        self._stats[job_type].submitted += 1
+        self._enqueue(job_type, job_id)
+        return job
+
+    async def _worker(self, job_type: str) -> None:
+        queue = self._queues[job_type]
+        while True:
+            job_id = await queue.get()
+            try:
+                await self._run(job_type, job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Bookkeeping failed (e.g. the database); the job stays
+                # queued/running in its row and is picked up on restart
+                logger.exception("Job %s (%s) could not be run", job_id, job_type)
+            finally:
+                queue.task_done()
+
+    async def _run(self, job_type: str, job_id: str) -> None:
+        stats = self._stats[job_type]
+        async with self.session_factory() as db:
+            claimed = await db.execute(update(Job).where(Job.id == job_id, Job.status == QUEUED).values(
+                status=RUNNING, started_at=_now(), attempts=Job.attempts + 1))
+            await db.commit()
+            if claimed.rowcount != 1:
+                return
+            job = await db.get(Job, job_id)
+        self._notify(job_id)
+        stats.running += 1
+        stats.wait_seconds += max(0.0, (_as_utc(job.started_at) - _as_utc(job.created_at)).total_seconds())
+        start = time.perf_counter()
+        path = self._spool_path(job_id)
+        try:
+            headers = {"content-type": job.content_type or "application/octet-stream",
+                       "content-length": str(os.path.getsize(path))}
+            response = await self.upstream.open_stream(job_type, _file_chunks(path), headers=headers)
+            try:
+                body = await response.aread()
+            finally:
+                await self.upstream.close_stream(job_type, response)
+            outcome = {
+                "status": FAILED if response.is_error else SUCCEEDED,
+                "status_code": response.status_code,
+                "result_type": response.headers.get("content-type"),
+                "result": body.decode("utf-8", "replace"),
+                "error": f"Upstream returned {response.status_code}" if response.is_error else None,
+            }
+        except Exception as exc:
+            outcome = {"status": FAILED, "error": f"{type(exc).__name__}: {exc}"}
+        finally:
+            stats.running -= 1
+            stats.run_seconds += time.perf_counter() - start
+        async with self.session_factory() as db:
+            await db.execute(update(Job).where(Job.id == job_id).values(finished_at=_now(), **outcome))
+            await db.commit()
+        if outcome["status"] == SUCCEEDED:
+            stats.succeeded += 1
+        else:
+            stats.failed += 1
+        _remove(path)
+        self._notify(job_id)
+
+    def stats(self) -> Dict[str, Any]:
+        types = {}
+        for job_type, st in self._stats.items():
+            d = asdict(st)
+            d["queued"] = self._queues[job_type].qsize()
+            started = st.succeeded + st.failed + st.running
+            finished = st.succeeded + st.failed
+            d["mean_wait_seconds"] = st.wait_seconds / started if started else 0.0
+            d["mean_run_seconds"] = st.run_seconds / finished if finished else 0.0
+            types[job_type] = d
+        return {
+            "queued": sum(q.qsize() for q in self._queues.values()),
+            "running": sum(st.running for st in self._stats.values()),
+            "max_queued_per_type": self.max_queued,
+            "types": types,
+        }
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,247 @@
+"""
+Shared, pooled HTTP client for the gateway's upstream microservices.
+
+One httpx.AsyncClient is created in the app lifespan and reused by every
+proxy route, so connections to the PDF parser, Bedrock client and knowledge
+graph services are kept alive between requests instead of being opened (and
+resolved) per call.
+
+- Global pool limits and keep-alive come from httpx.Limits; on top of that
+  each upstream has its own concurrency limit (a semaphore), so one slow
+  service cannot take every connection in the pool.
+- Timeouts (connect/read/write/pool) are configurable and always set.
+- Failures are retried with exponential backoff and jitter. Errors raised
+  before the request reached the upstream (connect errors, pool timeouts) are
+  always retried; read timeouts, dropped connections and 502/503/504 answers
+  only for upstreams marked idempotent, since the others run paid LLM calls.
+- open_stream() sends a request body from an async iterator and returns the
+  response unread, for pass-through proxying with bounded memory. A streamed
+  body can be sent once, so it is retried only if it was never started.
+
+Settings (env):
+  UPSTREAM_CONNECT_TIMEOUT=5   UPSTREAM_READ_TIMEOUT=60
+  UPSTREAM_WRITE_TIMEOUT=60    UPSTREAM_POOL_TIMEOUT=10
+  UPSTREAM_MAX_CONNECTIONS=100 UPSTREAM_MAX_KEEPALIVE=20  UPSTREAM_KEEPALIVE_EXPIRY=30
+  UPSTREAM_MAX_PER_HOST=20     (concurrent requests per upstream)
+  UPSTREAM_RETRIES=2           UPSTREAM_RETRY_BACKOFF=0.2  (seconds, doubled per attempt)
+"""
+
+import asyncio
+import os
+import random
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Optional
+
+import httpx
+
+from ..utils.metrics import UPSTREAM_DURATION, outcome
+
+RETRY_STATUSES = {502, 503, 504}
+# Raised before the request was sent: safe to retry for any upstream
+_NOT_SENT = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+# The upstream may have started work: retried only when idempotent
+_MAYBE_SENT = (httpx.ReadTimeout, httpx.WriteTimeout, httpx.ReadError, httpx.WriteError, httpx.RemoteProtocolError)
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, str(default)))
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, str(default)))
+
+
+@dataclass(frozen=True)
+class Upstream:
+    name: str
+    url: str
+    idempotent: bool = False
+
+
+@dataclass
+class UpstreamStats:
+    requests: int = 0
+    retries: int = 0
+    failures: int = 0
+    in_flight: int = 0
+    waiting: int = 0
+    max_waiting: int = 0
+    total_seconds: float = 0.0
+
+
+class UpstreamClient:
+    def __init__(self, upstreams: Dict[str, Upstream], timeout: httpx.Timeout, limits: httpx.Limits,
+                 max_per_host: int = 20, retries: int = 2, backoff: float = 0.2):
+        self.upstreams = upstreams
+        self.timeout = timeout
+        self.limits = limits
+        self.max_per_host = max_per_host
+        self.retries = retries
+        self.backoff = backoff
+        self.client = httpx.AsyncClient(timeout=timeout, limits=limits)
+        self._slots = {name: asyncio.Semaphore(max_per_host) for name in upstreams}
+        self._stats = {name: UpstreamStats() for name in upstreams}
+
+    @classmethod
+    def from_env(cls, upstreams: Dict[str, Upstream]) -> "UpstreamClient":
+        timeout = httpx.Timeout(
+            connect=_env_float("UPSTREAM_CONNECT_TIMEOUT", 5.0),
+            read=_env_float("UPSTREAM_READ_TIMEOUT", 60.0),
+            write=_env_float("UPSTREAM_WRITE_TIMEOUT", 60.0),
+            pool=_env_float("UPSTREAM_POOL_TIMEOUT", 10.0),
+        )
+        limits = httpx.Limits(
+            max_connections=_env_int("UPSTREAM_MAX_CONNECTIONS", 100),
+            max_keepalive_connections=_env_int("UPSTREAM_MAX_KEEPALIVE", 20),
+            keepalive_expiry=_env_float("UPSTREAM_KEEPALIVE_EXPIRY", 30.0),
+        )
+        return cls(upstreams, timeout, limits,
+                   max_per_host=_env_int("UPSTREAM_MAX_PER_HOST", 20),
+                   retries=_env_int("UPSTREAM_RETRIES", 2),
+                   backoff=_env_float("UPSTREAM_RETRY_BACKOFF", 0.2))
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+    async def _sleep_before_retry(self, attempt: int) -> None:
+        await asyncio.sleep(self.backoff * (2 ** attempt) * random.uniform(0.5, 1.0))
+
+    async def _acquire(self, name: str) -> None:
+        stats = self._stats[name]
+        stats.waiting += 1
+        stats.max_waiting = max(stats.max_waiting, stats.waiting)
+        try:
+            await self._slots[name].acquire()
+        finally:  # also when cancelled while waiting (the client went away)
+            stats.waiting -= 1
+
+    async def post(self, name: str, **kwargs: Any) -> httpx.Response:
+        """POST to the named upstream with pooling, per-upstream limits and retries.
+
+        kwargs go to httpx.AsyncClient.post and must be replayable (bytes, not a
+        one-shot stream) for retries to resend them.
+        """
+        upstream = self.upstreams[name]
+        stats = self._stats[name]
+        await self._acquire(name)
+        try:
+            stats.in_flight += 1
+            stats.requests += 1
+            start = time.perf_counter()
+            status_code = None
+            try:
+                attempt = 0
+                while True:
+                    try:
+                        response = await self.client.post(upstream.url, **kwargs)
+                        if not (upstream.idempotent and response.status_code in RETRY_STATUSES
+                                and attempt < self.retries):
+                            status_code = response.status_code
+                            return response
+                        await response.aclose()
+                    except _NOT_SENT:
+                        if attempt >= self.retries:
+                            raise
+                    except _MAYBE_SENT:
+                        if not upstream.idempotent or attempt >= self.retries:
+                            raise
+                    stats.retries += 1
+                    await self._sleep_before_retry(attempt)
+                    attempt += 1
+            except Exception:
+                stats.failures += 1
+                raise
+            finally:
+                elapsed = time.perf_counter() - start
+                stats.in_flight -= 1
+                stats.total_seconds += elapsed
+                UPSTREAM_DURATION.observe(elapsed, upstream=name, outcome=outcome(status_code))
+        finally:
+            self._slots[name].release()
+
+    async def open_stream(self, name: str, body: AsyncIterable[bytes],
+                          headers: Optional[Dict[str, str]] = None) -> httpx.Response:
+        """POST a streamed body; the response comes back with its body unread.
+
+        Holds one of the upstream's slots until close_stream(name, response),
+        which the caller must call once it has finished with the response.
+        """
+        upstream = self.upstreams[name]
+        stats = self._stats[name]
+        await self._acquire(name)
+        stats.in_flight += 1
+        stats.requests += 1
+        start = time.perf_counter()
+        started = False
+
+        async def tracked() -> AsyncIterator[bytes]:
+            nonlocal started
+            started = True
+            async for chunk in body:
+                yield chunk
+
+        try:
+            attempt = 0
+            while True:
+                request = self.client.build_request("POST", upstream.url, content=tracked(), headers=headers)
+                try:
+                    response = await self.client.send(request, stream=True)
+                    response.extensions["gateway_started_at"] = start
+                    return response
+                except _NOT_SENT:
+                    if started or attempt >= self.retries:
+                        raise
+                stats.retries += 1
+                await self._sleep_before_retry(attempt)
+                attempt += 1
+        except BaseException:
+            stats.failures += 1
+            self._release(name, start, None)
+            raise
+
+    async def close_stream(self, name: str, response: httpx.Response) -> None:
+        try:
+            await response.aclose()
+        finally:
+            self._release(name, response.extensions.get("gateway_started_at", time.perf_counter()),
+                          response.status_code)
+
+    def _release(self, name: str, start: float, status_code: Optional[int]) -> None:
+        elapsed = time.perf_counter() - start
+        stats = self._stats[name]
+        stats.in_flight -= 1
+        stats.total_seconds += elapsed
+        UPSTREAM_DURATION.observe(elapsed, upstream=name, outcome=outcome(status_code))
+        self._slots[name].release()
+
+    def _pool_connections(self) -> Dict[str, int]:
+        # httpcore's pool is not public API; report what it exposes, if anything
+        pool = getattr(getattr(self.client, "_transport", None), "_pool", None)
+        conns = list(getattr(pool, "connections", []) or [])
+        if not conns:
+            return {"open": 0, "idle": 0}
+        idle = sum(1 for c in conns if getattr(c, "is_idle", lambda: False)())
+        return {"open": len(conns), "idle": idle}
+
+    def stats(self) -> Dict[str, Any]:
+        upstreams = {}
+        for name, st in self._stats.items():
+            d = asdict(st)
+            d["mean_seconds"] = st.total_seconds / st.requests if st.requests else 0.0
+            d["url"] = self.upstreams[name].url
+            d["idempotent"] = self.upstreams[name].idempotent
+            upstreams[name] = d
+        return {
+            "limits": {
+                "max_connections": self.limits.max_connections,
+                "max_keepalive_connections": self.limits.max_keepalive_connections,
+                "keepalive_expiry": self.limits.keepalive_expiry,
+                "max_per_host": self.max_per_host,
+            },
+            "timeouts": {"connect": self.timeout.connect, "read": self.timeout.read,
+                         "write": self.timeout.write, "pool": self.timeout.pool},
+            "retries": self.retries,
+            "pool": self._pool_connections(),
+            "upstreams": upstreams,
+        }
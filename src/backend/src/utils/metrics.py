@@ -0,0 +1,274 @@
+"""
+Request metrics for the gateway: Prometheus text exposition and Server-Timing.
+
+A small in-process registry of labelled counters, gauges and histograms,
+rendered at /metrics in the Prometheus text format (version 0.0.4). Values
+that already live elsewhere (job queue depth, cache hit counts, ...) are
+exported through collectors: callables returning samples at scrape time.
+
+MetricsMiddleware records, per route template and method, request counts by
+status, latency, request/response body sizes, in-flight requests and 5xx
+errors. It also times the phases of each request: code wraps work in
+`with phase("auth"):` (or calls add_phase) and the per-request totals go to
+a histogram and to the response's Server-Timing header, e.g.
+`auth;dur=0.4, db;dur=1.9, upstream;dur=812.3, total;dur=815.0`. Phases are
+only recorded inside a request; elsewhere (job workers) they are no-ops.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from starlette.datastructures import MutableHeaders
+from starlette.routing import Match
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+INF_LE = 'le="+Inf"'
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864, 268435456)
+
+# A sample from a collector: (metric name, type, help, [(labels, value), ...])
+Sample = Tuple[str, str, str, Iterable[Tuple[Dict[str, str], float]]]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, k)} {_number(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1.0, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, (list(s[0]), s[1], s[2])) for k, s in self._values.items())
+        lines = []
+        for key, (counts, total, n) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, INF_LE)} {n}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {n}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], Iterable[Sample]]] = []
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._add(Gauge(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, fn: Callable[[], Iterable[Sample]]) -> Callable[[], Iterable[Sample]]:
+        """Register fn (usable as a decorator); it is called on every scrape."""
+        self._collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines += metric.header() + metric.render()
+        for fn in self._collectors:
+            for name, kind, help, samples in fn():
+                lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+                for labels, value in samples:
+                    lines.append(f"{name}{_labels(list(labels), list(labels.values()))} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.counter(
+    "gateway_http_requests_total", "HTTP requests by route, method and status.", ("method", "route", "status"))
+HTTP_ERRORS = REGISTRY.counter(
+    "gateway_http_errors_total", "HTTP requests answered with a 5xx or an unhandled error.", ("method", "route"))
+HTTP_IN_FLIGHT = REGISTRY.gauge(
+    "gateway_http_in_flight_requests", "HTTP requests currently being served.", ("method", "route"))
+HTTP_DURATION = REGISTRY.histogram(
+    "gateway_http_request_duration_seconds", "Time until the response body was sent.", ("method", "route"))
+HTTP_REQUEST_BYTES = REGISTRY.histogram(
+    "gateway_http_request_size_bytes", "Request body size.", ("method", "route"), SIZE_BUCKETS)
+HTTP_RESPONSE_BYTES = REGISTRY.histogram(
+    "gateway_http_response_size_bytes", "Response body size.", ("method", "route"), SIZE_BUCKETS)
+HTTP_PHASE = REGISTRY.histogram(
+    "gateway_http_phase_duration_seconds", "Time per request spent in auth, db, upload and upstream phases.",
+    ("route", "phase"))
+UPSTREAM_DURATION = REGISTRY.histogram(
+    "gateway_upstream_request_duration_seconds", "Upstream calls, including retries, by outcome.",
+    ("upstream", "outcome"))
+
+_phases: ContextVar[Optional[Dict[str, float]]] = ContextVar("gateway_phases", default=None)
+
+
+def add_phase(name: str, seconds: float) -> None:
+    phases = _phases.get()
+    if phases is not None:
+        phases[name] = phases.get(name, 0.0) + seconds
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_phase(name, time.perf_counter() - start)
+
+
+def outcome(status_code: Optional[int]) -> str:
+    """Label for an upstream answer: 2xx/3xx/4xx/5xx, or error when there was none."""
+    return "error" if status_code is None else f"{status_code // 100}xx"
+
+
+def server_timing(phases: Dict[str, float], total: float) -> str:
+    entries = [f"{name};dur={seconds * 1e3:.1f}" for name, seconds in phases.items()]
+    entries.append(f"total;dur={total * 1e3:.1f}")
+    return ", ".join(entries)
+
+
+def _route_template(scope) -> str:
+    # The route is not known before routing; match it here so in-flight
+    # counts can carry it. Labels use the template, never the raw path.
+    partial = None
+    app = scope.get("app")
+    for route in getattr(getattr(app, "router", None), "routes", ()):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+        if match == Match.PARTIAL and partial is None:
+            partial = route.path
+    return partial or "<unmatched>"
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware, so streamed responses are neither buffered nor cut short."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        method, route = scope["method"], _route_template(scope)
+        phases: Dict[str, float] = {}
+        token = _phases.set(phases)
+        start = time.perf_counter()
+        status, received, sent = 500, 0, 0
+
+        async def counting_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+            return message
+
+        async def timing_send(message):
+            nonlocal status, sent
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", server_timing(phases, time.perf_counter() - start))
+            elif message["type"] == "http.response.body":
+                sent += len(message.get("body", b""))
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc(method=method, route=route)
+        try:
+            await self.app(scope, counting_receive, timing_send)
+        finally:
+            elapsed = time.perf_counter() - start
+            HTTP_IN_FLIGHT.dec(method=method, route=route)
+            HTTP_REQUESTS.inc(method=method, route=route, status=status)
+            if status >= 500:
+                HTTP_ERRORS.inc(method=method, route=route)
+            HTTP_DURATION.observe(elapsed, method=method, route=route)
+            HTTP_REQUEST_BYTES.observe(received, method=method, route=route)
+            HTTP_RESPONSE_BYTES.observe(sent, method=method, route=route)
+            for name, seconds in phases.items():
+                HTTP_PHASE.observe(seconds, route=route, phase=name)
+            _phases.reset(token)
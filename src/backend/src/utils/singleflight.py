@@ -0,0 +1,71 @@
+"""
+Single-flight call coalescing for asyncio.
+
+do(key, fn) runs fn() once per key at a time: callers arriving while a call
+for the same key is in flight wait for that call and get its result (or its
+exception) instead of starting their own. The call runs in its own task, so
+the first caller going away (a client disconnect) does not cancel it for the
+others. Nothing is cached once the call has finished.
+
+stats() reports, per key group (the first element of tuple keys), how many
+calls were made, how many callers were coalesced onto an in-flight call and
+how many calls are in flight now.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+def _group(key: Hashable) -> Hashable:
+    return key[0] if isinstance(key, tuple) and key else key
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, "asyncio.Task[Any]"] = {}
+        self._counts: Dict[Hashable, Dict[str, int]] = {}
+
+    def _count(self, key: Hashable, field: str) -> None:
+        counts = self._counts.setdefault(_group(key), {"calls": 0, "coalesced": 0})
+        counts[field] += 1
+
+    def _finished(self, key: Hashable, task: "asyncio.Task[Any]") -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # retrieved, even if every caller has gone away
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Result of fn() or of the in-flight call for key; True if it was shared."""
+        task = self._calls.get(key)
+        shared = task is not None
+        if shared:
+            self._count(key, "coalesced")
+        else:
+            self._count(key, "calls")
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._finished(key, t))
+        return await asyncio.shield(task), shared
+
+    def stats(self) -> Dict[str, Any]:
+        in_flight: Dict[Hashable, int] = {}
+        for key in self._calls:
+            in_flight[_group(key)] = in_flight.get(_group(key), 0) + 1
+        groups = {}
+        for group, counts in self._counts.items():
+            calls, coalesced = counts["calls"], counts["coalesced"]
+            groups[str(group)] = {
+                "calls": calls,
+                "coalesced": coalesced,
+                "in_flight": in_flight.get(group, 0),
+                "coalesced_ratio": coalesced / (calls + coalesced) if calls + coalesced else 0.0,
+            }
+        return {
+            "name": self.name,
+            "calls": sum(c["calls"] for c in self._counts.values()),
+            "coalesced": sum(c["coalesced"] for c in self._counts.values()),
+            "in_flight": len(self._calls),
+            "groups": groups,
+        }
@@ -0,0 +1,244 @@
+"""
+Map-reduce quiz and topic extraction for documents of any length.
+
+The document text is split into overlapping sections of at most
+BEDROCK_CHUNK_TOKENS tokens (estimated at 4 characters per token; sections end
+at a sentence or paragraph break where one is near). Every section is sent to
+the model on its own (map), asking for 5 quiz questions and 5 topics of that
+section. At most BEDROCK_MAX_CONCURRENCY calls are in flight at a time in the
+whole process, across all documents, not per document. The answers are then
+merged (reduce) into exactly 5 of each:
+
+  topics  the same topic (case, spacing and punctuation ignored) found in
+          several sections is merged: relevances add up, key terms are
+          united, the summary of its most relevant occurrence is kept. The 5
+          with the highest total relevance are returned.
+  quiz    malformed questions (not 4 options, answer not among them) and
+          duplicates (same normalised question, or mostly the same words) are
+          dropped, then questions are taken from each section in turn, so the
+          quiz covers the whole document rather than its first pages.
+
+A document that fits in one section is sent as before, in one call. Sections
+that fail are reported and skipped; the call fails only if all of them do. If
+the model gave fewer than 5 distinct usable items of a kind, the ones there
+are are returned and the report says so.
+
+run() also returns a report: the time spent splitting, in the map and in the
+reduce stage, and per section its size, time waiting for a call slot, call
+latency, cost and item counts.
+
+Settings (env):
+  BEDROCK_CHUNK_TOKENS=3000
+  BEDROCK_CHUNK_OVERLAP_TOKENS=200
+  BEDROCK_MAX_CONCURRENCY=4
+"""
+
+import math
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Tuple
+
+CHUNK_TOKENS = int(os.getenv("BEDROCK_CHUNK_TOKENS", "3000"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("BEDROCK_CHUNK_OVERLAP_TOKENS", "200"))
+MAX_CONCURRENCY = int(os.getenv("BEDROCK_MAX_CONCURRENCY", "4"))
+ITEMS = 5
+CHARS_PER_TOKEN = 4
+
+# shared by every run(), so concurrent uploads do not multiply the limit
+_call_slots = threading.BoundedSemaphore(MAX_CONCURRENCY)
+
+# invoke(prompt) -> (parsed JSON answer, cost of the call)
+Invoke = Callable[[str], Tuple[Dict[str, Any], float]]
+
+_SENTENCE_END = re.compile(r"([.!?][\"')\]]?\s+|\n\s*\n)$")
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def split_text(text: str, max_tokens: int = CHUNK_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS) -> List[str]:
+    """Sections of at most max_tokens, each repeating the last overlap_tokens of the one before."""
+    if max_tokens <= 0 or not 0 <= overlap_tokens <= max_tokens // 2:
+        raise ValueError("need max_tokens > 0 and 0 <= overlap_tokens <= max_tokens / 2")
+    max_chars, overlap_chars = max_tokens * CHARS_PER_TOKEN, overlap_tokens * CHARS_PER_TOKEN
+    # words, with runs longer than a quarter section (no whitespace) cut up
+    words = re.findall(r"\S{1,%d}\s*" % max(1, max_chars // 4), text)
+    sizes = [len(w) for w in words]  # budgets are kept in characters
+    chunks, start = [], 0
+    while start < len(words):
+        stop, chars = start, 0
+        while stop < len(words) and (chars + sizes[stop] <= max_chars or stop == start):
+            chars += sizes[stop]
+            stop += 1
+        if stop < len(words):
+            # end at a sentence or paragraph break in the last quarter, if there is one
+            floor, back = stop, 0
+            while floor > start + 1 and back < max_chars // 4:
+                if _SENTENCE_END.search(words[floor - 1]):
+                    stop = floor
+                    break
+                floor -= 1
+                back += sizes[floor]
+        chunks.append("".join(words[start:stop]).strip())
+        if stop >= len(words):
+            break
+        next_start, back = stop, 0
+        while next_start > start + 1 and back + sizes[next_start - 1] <= overlap_chars:
+            next_start -= 1
+            back += sizes[next_start]
+        start = next_start
+    return [c for c in chunks if c]
+
+
+def build_prompt(text: str, part: int = 1, parts: int = 1) -> str:
+    source = "document text" if parts == 1 else f"section {part} of {parts} of a longer document"
+    return (
+        "You are an assistant that outputs only strict JSON.\n"
+        f"Given the following {source}, produce an object with two keys:\n"
+        f"1) 'quiz': A list of EXACTLY {ITEMS} multiple-choice questions (MCQ). "
+        "   Each item must be: "
+        "{\"question\": str, \"options\": [str, str, str, str], \"correct_answer\": str}\n"
+        f"2) 'topics': A list of EXACTLY {ITEMS} items capturing the main topics of the "
+        f"{'paper' if parts == 1 else 'section'}, each: "
+        "{\"topic\": str, \"relevance\": float, \"summary\": str, \"key_terms\": [str, ...]}\n"
+        "Return valid JSON only with keys 'quiz' and 'topics'. No extra commentary.\n\n"
+        f"{'Document text' if parts == 1 else 'Section text'}:\n{text}"
+    )
+
+
+def _normalise(text: Any) -> str:
+    return " ".join(re.sub(r"[^\w\s]", " ", str(text).lower()).split())
+
+
+def _valid_question(item: Any) -> bool:
+    if not isinstance(item, dict) or not str(item.get("question", "")).strip():
+        return False
+    options = item.get("options")
+    return (isinstance(options, list) and len(options) == 4
+            and _normalise(item.get("correct_answer", "")) in {_normalise(o) for o in options})
+
+
+def _similar(a: str, b: str, threshold: float = 0.8) -> bool:
+    x, y = set(a.split()), set(b.split())
+    return bool(x and y) and len(x & y) / len(x | y) >= threshold
+
+
+def merge_quiz(per_chunk: List[List[Any]], n: int = ITEMS) -> List[Dict[str, Any]]:
+    """n distinct well-formed questions, taken from each section in turn."""
+    queues, seen = [], []
+    for items in per_chunk:
+        queue = []
+        for item in items:
+            if not _valid_question(item):
+                continue
+            key = _normalise(item["question"])
+            if any(key == s or _similar(key, s) for s in seen):
+                continue
+            seen.append(key)
+            queue.append(item)
+        queues.append(queue)
+    quiz: List[Dict[str, Any]] = []
+    while len(quiz) < n and any(queues):
+        for queue in queues:
+            if queue and len(quiz) < n:
+                quiz.append(queue.pop(0))
+    return quiz
+
+
+def _relevance(item: Dict[str, Any]) -> float:
+    try:
+        return float(item.get("relevance", 0.0))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def merge_topics(per_chunk: List[List[Any]], n: int = ITEMS) -> List[Dict[str, Any]]:
+    """The n topics with the highest relevance summed over the sections that name them."""
+    merged: Dict[str, Dict[str, Any]] = {}
+    for items in per_chunk:
+        for item in items:
+            if not isinstance(item, dict) or not _normalise(item.get("topic", "")):
+                continue
+            key, relevance = _normalise(item["topic"]), _relevance(item)
+            terms = item.get("key_terms")
+            # only a list: a string (a common slip) would be split into characters
+            terms = [t for t in terms if isinstance(t, str)] if isinstance(terms, list) else []
+            entry = merged.get(key)
+            if entry is None:
+                merged[key] = {"item": dict(item, key_terms=terms), "best": relevance, "total": relevance}
+                continue
+            entry["total"] += relevance
+            known = {_normalise(t) for t in entry["item"]["key_terms"]}
+            entry["item"]["key_terms"] += [t for t in terms if _normalise(t) not in known]
+            if relevance > entry["best"]:
+                entry["best"] = relevance
+                entry["item"].update(topic=item["topic"], summary=item.get("summary", ""))
+    ranked = sorted(merged.values(), key=lambda e: e["total"], reverse=True)[:n]
+    if not ranked:
+        return []
+    # relevances stay on the model's scale: the top topic keeps its best score
+    scale = ranked[0]["best"] / ranked[0]["total"] if ranked[0]["total"] else 0.0
+    return [dict(e["item"], relevance=round(e["total"] * scale, 4)) for e in ranked]
+
+
+def _map_chunk(invoke: Invoke, text: str, part: int, parts: int) -> Dict[str, Any]:
+    report: Dict[str, Any] = {"chunk": part, "chars": len(text), "tokens": estimate_tokens(text)}
+    prompt = build_prompt(text, part, parts)
+    queued = time.perf_counter()
+    with _call_slots:
+        start = time.perf_counter()
+        try:
+            payload, cost = invoke(prompt)
+            quiz, topics = payload.get("quiz") or [], payload.get("topics") or []
+            report.update(cost=cost, quiz_items=len(quiz), topics=len(topics))
+        except Exception as e:
+            quiz, topics = [], []
+            report.update(cost=0.0, error=str(e))
+    report["wait_s"] = round(start - queued, 4)
+    report["latency_s"] = round(time.perf_counter() - start, 4)
+    return {"quiz": quiz, "topics": topics, "report": report}
+
+
+def run(text: str, invoke: Invoke, max_tokens: int = CHUNK_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+        concurrency: int = MAX_CONCURRENCY) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], float,
+                                                   Dict[str, Any]]:
+    """(quiz, topics, total cost, report) for the whole document.
+
+    concurrency sizes this document's thread pool; the calls themselves also
+    wait for the process-wide BEDROCK_MAX_CONCURRENCY slots.
+    """
+    start = time.perf_counter()
+    chunks = split_text(text, max_tokens, overlap_tokens)
+    split_s = time.perf_counter() - start
+
+    map_start = time.perf_counter()
+    with ThreadPoolExecutor(max(1, min(concurrency, len(chunks)))) as pool:
+        results = list(pool.map(lambda args: _map_chunk(invoke, *args),
+                                [(chunk, i + 1, len(chunks)) for i, chunk in enumerate(chunks)]))
+    map_s = time.perf_counter() - map_start
+
+    reduce_start = time.perf_counter()
+    quiz = merge_quiz([r["quiz"] for r in results])
+    topics = merge_topics([r["topics"] for r in results])
+    reduce_s = time.perf_counter() - reduce_start
+
+    chunk_reports = [r["report"] for r in results]
+    cost = sum(r["cost"] for r in chunk_reports)
+    report = {
+        "chunks": len(chunks),
+        "concurrency": concurrency,
+        "stages": {"split_s": round(split_s, 4), "map_s": round(map_s, 4), "reduce_s": round(reduce_s, 4),
+                   "total_s": round(time.perf_counter() - start, 4)},
+        "cost": cost,
+        "per_chunk": chunk_reports,
+    }
+    failed = [r for r in chunk_reports if "error" in r]
+    if chunks and len(failed) == len(chunks):
+        raise Exception(f"every section failed, first error: {failed[0]['error']}")
+    if len(quiz) < ITEMS or len(topics) < ITEMS:
+        report["shortfall"] = {"quiz": ITEMS - len(quiz), "topics": ITEMS - len(topics)}
+    return quiz, topics, cost, report
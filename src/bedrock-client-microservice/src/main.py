@@ -1,8 +1,11 @@
 from fastapi import FastAPI, UploadFile, File, Request
+from fastapi.concurrency import run_in_threadpool
 import requests
 import os
 import json
 
+from . import chunking
+
 app = FastAPI()
 
 PDF_PARSER_URL = os.getenv("PDF_PARSER_URL", "http://localhost:8002/parse-pdf/")
@@ -20,12 +23,10 @@ def read_apikey():
         return None
     return None
 
-def call_bedrock_for_quiz_and_topics(text: str, apikey: str = None):
+def bedrock_invoker(apikey: str = None):
     # Use boto3 for Bedrock LLM calls, passing API key if possible (mock: use as AWS_ACCESS_KEY_ID)
     import boto3
     import botocore
-    import base64
-    import tempfile
 
     # If apikey is provided, set it as AWS_ACCESS_KEY_ID (mock)
     # In real AWS, you would use AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY
@@ -35,41 +36,39 @@ def call_bedrock_for_quiz_and_topics(text: str, apikey: str = None):
         aws_secret_access_key="dummy-secret-key",
         region_name="us-east-1"
     )
+    # Clients are thread-safe: one is shared by the concurrent section calls
     client = session.client("bedrock-runtime")
 
-    prompt = (
-        "You are an assistant that outputs only strict JSON.\n"
-        "Given the following document text, produce an object with two keys:\n"
-        "1) 'quiz': A list of EXACTLY 5 multiple-choice questions (MCQ). "
-        "   Each item must be: "
-        "{\"question\": str, \"options\": [str, str, str, str], \"correct_answer\": str}\n"
-        "2) 'topics': A list of EXACTLY 5 items capturing the main topics of the paper, each: "
-        "{\"topic\": str, \"relevance\": float, \"summary\": str, \"key_terms\": [str, ...]}\n"
-        "Return valid JSON only with keys 'quiz' and 'topics'. No extra commentary.\n\n"
-        f"Document text:\n{text}"
-    )
-    body = json.dumps({"input": prompt})
-    try:
-        resp = client.invoke_model(
-            modelId="your-bedrock-model-id",
-            contentType="application/json",
-            accept="application/json",
-            body=body
-        )
-        raw = resp.get("body")
-        if hasattr(raw, "read"):
-            raw = raw.read()
-        if isinstance(raw, (bytes, bytearray)):
-            raw = raw.decode("utf-8")
-        payload = json.loads(raw)
-        quiz = payload.get("quiz", [])
-        topics = payload.get("topics", [])
-        cost = float(resp.get("cost", 0.0))
-        return quiz, topics, cost
-    except botocore.exceptions.BotoCoreError as e:
-        raise Exception(f"Bedrock boto3 error: {e}")
-    except Exception as e:
-        raise Exception(f"Bedrock call failed: {e}")
+    def invoke(prompt: str):
+        body = json.dumps({"input": prompt})
+        try:
+            resp = client.invoke_model(
+                modelId="your-bedrock-model-id",
+                contentType="application/json",
+                accept="application/json",
+                body=body
+            )
+            raw = resp.get("body")
+            if hasattr(raw, "read"):
+                raw = raw.read()
+            if isinstance(raw, (bytes, bytearray)):
+                raw = raw.decode("utf-8")
+            return json.loads(raw), float(resp.get("cost", 0.0))
+        except botocore.exceptions.BotoCoreError as e:
+            raise Exception(f"Bedrock boto3 error: {e}")
+        except Exception as e:
+            raise Exception(f"Bedrock call failed: {e}")
+
+    return invoke
+
+def call_bedrock_for_quiz_and_topics(text: str, apikey: str = None):
+    # Long documents are split into sections that are sent concurrently and
+    # merged into 5 quiz items and 5 topics (see chunking.py)
+    quiz, topics, cost, report = chunking.run(text, bedrock_invoker(apikey))
+    stages = report["stages"]
+    print(f"Bedrock: {report['chunks']} section(s), split {stages['split_s']:.3f}s, map {stages['map_s']:.3f}s, "
+          f"reduce {stages['reduce_s']:.3f}s, cost {cost:.6f}")
+    return quiz, topics, cost, report
 
 
 @app.post("/quiz-from-pdf/")
@@ -93,7 +92,8 @@ async def quiz_from_pdf(request: Request, file: UploadFile = File(...)):
 
     # Bedrock: quiz + topics
     try:
-        quiz, topics, bedrock_cost = call_bedrock_for_quiz_and_topics(text, apikey=apikey)
+        quiz, topics, bedrock_cost, report = await run_in_threadpool(call_bedrock_for_quiz_and_topics, text,
+                                                                     apikey=apikey)
     except Exception as e:
         return {"error": "Bedrock call failed", "details": str(e)}
 
@@ -122,4 +122,4 @@ async def quiz_from_pdf(request: Request, file: UploadFile = File(...)):
         print(f"Failed to forward interests to Interest Monitor: {e}")
 
     # Return to client
-    return {"quiz": quiz, "topics": topics, "source_text": text, "cost": bedrock_cost}
+    return {"quiz": quiz, "topics": topics, "source_text": text, "cost": bedrock_cost, "report": report}
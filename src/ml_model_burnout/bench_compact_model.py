@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Parity check and per-call latency for the compact (numpy) model path.
+
+Usage:
+  python bench_compact_model.py --model-dir ./out [--users 2000] \
+    [--points-per-user 12] [--repeat 500] [--seed 0]
+
+Loads <model-dir>/model.pkl and <model-dir>/model.json as written by
+burnout_timeseries_pipeline.py, builds features for a synthetic scores table
+and checks that both give identical probabilities, both for the whole table
+at once and row by row (the /predict path). Then prints the median time of a
+single-row prediction the way predict_service makes it: DataFrame +
+Pipeline.predict_proba versus CompactModel.predict_one.
+
+Exits with status 1 if any probability differs.
+"""
+
+import argparse, os, sys, time
+import joblib
+import numpy as np
+import pandas as pd
+
+from bench_feature_table import synthetic_scores
+from burnout_features import FEATURE_NAMES
+from burnout_model import CompactModel
+from burnout_timeseries_pipeline import build_feature_table
+
+
+def _median_call(fn, arg, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(arg)
+        times.append(time.perf_counter() - t0)
+    return float(np.median(times))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Compare the compact model with the sklearn pipeline.")
+    ap.add_argument("--model-dir", required=True, help="Directory with model.pkl and model.json.")
+    ap.add_argument("--users", type=int, default=2000)
+    ap.add_argument("--points-per-user", type=int, default=12)
+    ap.add_argument("--repeat", type=int, default=500, help="Timed single-row calls per path.")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    pipe = joblib.load(os.path.join(args.model_dir, "model.pkl"))
+    compact = CompactModel.load(os.path.join(args.model_dir, "model.json"))
+    X = build_feature_table(synthetic_scores(args.users, args.points_per_user, args.seed))[FEATURE_NAMES]
+
+    batch_ref = pipe.predict_proba(X)[:, 1]
+    batch_new = compact.predict_proba(X)[:, 1]
+    rows = X.to_dict("records")
+    row_ref = np.array([pipe.predict_proba(pd.DataFrame([r]))[0, 1] for r in rows])
+    row_new = np.array([compact.predict_one(r) for r in rows])
+    failures = 0
+    for name, a, b in [("batch", batch_new, batch_ref), ("single-row", row_new, row_ref)]:
+        n_diff = int(np.count_nonzero(a != b))
+        failures += n_diff
+        print(f"{name:>10}: {len(a)} probabilities, {n_diff} differ (max |diff| {np.max(np.abs(a - b)):.3g})")
+
+    t_ref = _median_call(lambda r: pipe.predict_proba(pd.DataFrame([r]))[0, 1], rows[0], args.repeat)
+    t_new = _median_call(compact.predict_one, rows[0], args.repeat)
+    print(f"single-row latency: sklearn {t_ref * 1e6:.1f}us, compact {t_new * 1e6:.1f}us ({t_ref / t_new:.1f}x)")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
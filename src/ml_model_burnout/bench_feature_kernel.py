@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Parity check and per-call latency benchmark for the shared feature kernel.
+
+Usage:
+  python bench_feature_kernel.py [--lengths 5 20 100 1000 5000] \
+    [--cases 200] [--repeat 200] [--tol 1e-8] [--seed 0]
+
+Parity: random series (sorted and shuffled input, duplicated dates, intra-day
+timestamps, constant scores, NaN scores, a single date) are run through
+burnout_features.features_from_arrays, features_from_records and
+features_for_groups, and compared with the original pandas implementation
+(features_from_timeseries_reference). Every feature must agree within --tol
+(absolute or relative). Dates are unique per series except in the
+single-date case, which is capped at 10 points: the reference sort is not
+stable for ties in longer series, so their order there is arbitrary.
+
+Latency: median time per call for the reference and the kernel at each
+series length.
+
+Exits with status 1 if any parity check fails. test_feature_parity.py runs the
+parity part under pytest.
+"""
+
+import argparse, sys, time, warnings
+import numpy as np
+import pandas as pd
+
+from burnout_features import DAY_NS, FEATURE_NAMES, features_for_groups, features_from_arrays, features_from_records
+from burnout_timeseries_pipeline import features_from_timeseries_reference
+
+KINDS = ("daily", "sparse", "intraday", "constant", "nan_scores", "single_date", "shuffled")
+
+
+def random_series(rng: np.random.Generator, n: int, kind: str) -> pd.DataFrame:
+    start = np.datetime64("2025-01-01", "ns").astype("int64")
+    if kind == "single_date":
+        n = min(n, 10)
+        dates = np.full(n, start)
+    elif kind == "intraday":
+        dates = start + np.sort(rng.choice(n * 30, size=n, replace=False)) * (DAY_NS // 24)
+    else:
+        gaps = rng.integers(1, 4 if kind == "daily" else 15, size=n)
+        dates = start + np.cumsum(gaps) * DAY_NS
+    scores = rng.integers(0, 100, size=n).astype("float64") + rng.choice([0.0, 0.25, 0.5], size=n)
+    if kind == "constant":
+        scores[:] = 70.0
+    if kind == "nan_scores":
+        scores[rng.random(n) < 0.2] = np.nan
+    df = pd.DataFrame({"date": dates.astype("datetime64[ns]"), "score": scores})
+    if kind == "shuffled":
+        df = df.sample(frac=1.0, random_state=int(rng.integers(1 << 31))).reset_index(drop=True)
+    return df
+
+
+def _close(a: float, b: float, tol: float) -> bool:
+    return abs(a - b) <= tol or abs(a - b) <= tol * abs(b)
+
+
+def check_parity(lengths, cases: int, tol: float, rng: np.random.Generator) -> int:
+    failures = 0
+    checked = 0
+    batch, batch_ref = [], []
+    for n in sorted(set([1, 2, 3, 4] + list(lengths))):
+        for i in range(max(1, cases // len(lengths))):
+            kind = KINDS[i % len(KINDS)]
+            df = random_series(rng, n, kind)
+            ref = features_from_timeseries_reference(df)
+            dates_ns = df["date"].to_numpy().astype("int64")
+            candidates = {
+                "arrays": features_from_arrays(dates_ns, df["score"].to_numpy()),
+                "records": (features_from_records([{"date": str(d), "score": (None if np.isnan(s) else s)}
+                                                   for d, s in zip(df["date"], df["score"])])
+                            if df["score"].notna().any() else None),
+            }
+            for name, got in candidates.items():
+                if got is None:
+                    continue
+                for k in FEATURE_NAMES:
+                    checked += 1
+                    if not _close(got[k], ref[k], tol):
+                        failures += 1
+                        if failures <= 10:
+                            print(f"MISMATCH {name} n={n} kind={kind} {k}: {got[k]!r} != {ref[k]!r}")
+            batch.append(df)
+            batch_ref.append(ref)
+
+    # The columnar engine on all series at once
+    codes = np.concatenate([np.full(len(df), i) for i, df in enumerate(batch)])
+    allrows = pd.concat(batch, ignore_index=True)
+    cols = features_for_groups(codes, allrows["date"], allrows["score"], len(batch))
+    for i, ref in enumerate(batch_ref):
+        for k in FEATURE_NAMES:
+            checked += 1
+            if not _close(float(cols[k][i]), ref[k], tol):
+                failures += 1
+                if failures <= 10:
+                    print(f"MISMATCH groups series={i} {k}: {cols[k][i]!r} != {ref[k]!r}")
+    print(f"parity: {checked} feature values checked, {failures} mismatches (tol={tol})")
+    return failures
+
+
+def _per_call(fn, args, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(*args)
+        times.append(time.perf_counter() - t0)
+    return float(np.median(times))
+
+
+def bench_latency(lengths, repeat: int, rng: np.random.Generator) -> None:
+    print(f"{'length':>7} {'reference_us':>13} {'kernel_us':>10} {'speedup':>8}")
+    for n in lengths:
+        df = random_series(rng, n, "daily")
+        dates_ns, scores = df["date"].to_numpy().astype("int64"), df["score"].to_numpy()
+        reps = max(5, repeat // max(1, n // 100))
+        t_ref = _per_call(features_from_timeseries_reference, (df,), reps)
+        t_new = _per_call(features_from_arrays, (dates_ns, scores), repeat)
+        print(f"{n:>7} {t_ref * 1e6:>13.1f} {t_new * 1e6:>10.1f} {t_ref / t_new:>7.1f}x")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Parity check and latency benchmark for burnout_features.")
+    ap.add_argument("--lengths", type=int, nargs="+", default=[5, 20, 100, 1000, 5000])
+    ap.add_argument("--cases", type=int, default=200, help="Random series per parity run (spread over lengths).")
+    ap.add_argument("--repeat", type=int, default=200, help="Timed calls per length.")
+    ap.add_argument("--tol", type=float, default=1e-8)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")  # np.polyfit RankWarning in the reference for single-date series
+        failures = check_parity(args.lengths, args.cases, args.tol, rng)
+        bench_latency(args.lengths, args.repeat, rng)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
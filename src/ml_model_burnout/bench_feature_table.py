@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Benchmark: vectorized build_feature_table vs. the per-user reference loop.
+
+Usage:
+  python bench_feature_table.py [--users 10000 100000 1000000] \
+    [--points-per-user 12] [--reference-max-users 10000] [--seed 0]
+
+For each user count a synthetic scores table is generated (random dates over
+~6 months, one quiz every few days, scores 0-100). The vectorized engine is
+timed on the full table. The per-user reference is timed on at most
+--reference-max-users users and extrapolated linearly above that (marked with
+'~'), since it scales with the number of groups. The feature tables produced
+on the reference sample are compared and the max absolute difference printed.
+"""
+
+import argparse, time
+import numpy as np
+import pandas as pd
+
+from burnout_timeseries_pipeline import FEATURE_NAMES, build_feature_table, build_feature_table_per_user
+
+
+def synthetic_scores(n_users: int, points_per_user: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    counts = rng.integers(1, 2 * points_per_user, size=n_users)
+    user_idx = np.repeat(np.arange(n_users), counts)
+    # Distinct days per user: cumulative gaps of 1-7 days from a random start
+    gaps = rng.integers(1, 8, size=len(user_idx))
+    first = np.r_[0, np.cumsum(counts)[:-1]]
+    day = np.cumsum(gaps)
+    day -= np.repeat(day[first] - gaps[first], counts)
+    day += np.repeat(rng.integers(0, 60, size=n_users), counts)
+    dates = np.datetime64("2025-01-01") + day.astype("timedelta64[D]")
+    scores = np.clip(rng.normal(75, 12, size=len(user_idx)), 0, 100).round(1)
+    df = pd.DataFrame({
+        "user_id": pd.Categorical.from_codes(user_idx, [f"u{i:07d}" for i in range(n_users)]).astype(str),
+        "date": dates.astype("datetime64[ns]"),
+        "score": scores,
+    })
+    return df.sample(frac=1.0, random_state=seed).reset_index(drop=True)
+
+
+def _timed(fn, *args):
+    t0 = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - t0
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark the vectorized feature engine against the per-user loop.")
+    ap.add_argument("--users", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    ap.add_argument("--points-per-user", type=int, default=12, help="Average number of scores per user.")
+    ap.add_argument("--reference-max-users", type=int, default=10_000,
+                    help="Run the per-user reference on at most this many users and extrapolate.")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    print(f"{'users':>10} {'rows':>11} {'vectorized_s':>13} {'per_user_s':>12} {'speedup':>9} {'max_abs_diff':>13}")
+    for n_users in args.users:
+        df = synthetic_scores(n_users, args.points_per_user, args.seed)
+        fast, t_fast = _timed(build_feature_table, df)
+
+        n_ref = min(n_users, args.reference_max_users)
+        ref_users = fast["user_id"].iloc[:n_ref]
+        ref_df = df[df["user_id"].isin(ref_users)]
+        ref, t_ref = _timed(build_feature_table_per_user, ref_df)
+        t_ref_full = t_ref * n_users / n_ref
+        approx = "~" if n_ref < n_users else " "
+
+        sub = fast[fast["user_id"].isin(ref_users)].reset_index(drop=True)
+        max_diff = float((sub[FEATURE_NAMES] - ref[FEATURE_NAMES]).abs().to_numpy().max())
+
+        print(f"{n_users:>10} {len(df):>11} {t_fast:>13.3f} {approx}{t_ref_full:>11.3f} "
+              f"{t_ref_full / t_fast:>8.1f}x {max_diff:>13.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+"""
+Burnout time-series features, shared by training and serving.
+
+Both burnout_timeseries_pipeline.py and predict_service.py import this module,
+so the features a model is trained on and the features it is served with come
+from the same code.
+
+- features_from_arrays: one series given as numpy arrays (int64 nanoseconds
+  since the epoch, i.e. datetime64[ns] ordinals, and float scores). Pure numpy,
+  no per-feature pandas objects; this is the per-request path.
+- features_for_groups: many series at once (rows labelled with group codes),
+  computed column-wise in a few whole-array passes; used for feature tables
+  and batch scoring.
+
+The reference semantics are the original pandas implementation, kept as
+burnout_timeseries_pipeline.features_from_timeseries_reference;
+bench_feature_kernel.py checks parity against it.
+"""
+
+import hashlib
+import math
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+FEATURE_NAMES: List[str] = [
+    "count_points", "span_days", "mean_score", "std_score", "min_score", "max_score",
+    "last_score", "last_minus_ema7", "last_minus_ema14", "last_minus_ema28",
+    "slope_all", "slope_14d", "slope_28d", "slope_56d",
+    "rolling3_std", "recent_mean_3", "recent_std_3",
+    "mean_change_per_day", "median_change_per_day",
+    "max_drawdown", "cadence_mean_days", "cadence_cv",
+    "last2_diff", "last3_diff",
+]
+
+DAY_NS = 24 * 3600 * 10**9
+_NAT = np.iinfo("int64").min
+
+
+# ---------- Single-series kernel ----------
+#
+# Written for short series: plain ufunc reductions and dot products instead
+# of ndarray.mean/std/np.median, whose Python-level wrappers dominate the
+# cost at ~20 points.
+
+def _mean(v: np.ndarray) -> float:
+    return float(v.sum()) / len(v)
+
+
+def _std(v: np.ndarray) -> float:
+    """Sample std (ddof=1), two-pass like pandas."""
+    dv = v - _mean(v)
+    return math.sqrt(float(dv @ dv) / (len(v) - 1))
+
+
+def _median(v: np.ndarray) -> float:
+    s = np.sort(v)
+    m = len(s)
+    return float(s[(m - 1) // 2] + s[m // 2]) / 2
+
+
+def _slope(x: np.ndarray, y: np.ndarray, x_abs: float) -> float:
+    """np.polyfit(x, y, 1)[0] with the reference edge cases.
+
+    0 for fewer than two points or a constant y. x should be shifted (e.g. to
+    the last date) for stability; x_abs is the unshifted value, needed only
+    when all x are equal, where polyfit returns its minimum-norm solution.
+    """
+    n = len(y)
+    if n < 2 or y.min() == y.max():
+        return 0.0
+    dx = x - _mean(x)
+    my = _mean(y)
+    sxx = float(dx @ dx)
+    if sxx == 0:
+        return float(my / (2 * x_abs))
+    return float(dx @ (y - my)) / sxx
+
+
+def features_from_arrays(dates_ns: np.ndarray, scores: np.ndarray) -> Dict[str, float]:
+    """Compute every feature for one series.
+
+    dates_ns: int64 nanoseconds since the epoch (datetime64[ns] viewed as int64).
+    scores:   float scores; NaN scores and NaT dates are dropped.
+    Rows are sorted by date (stable) unless already in order.
+    """
+    d = np.asarray(dates_ns, dtype="int64")
+    y = np.asarray(scores, dtype="float64")
+    keep = ~np.isnan(y) & (d != _NAT)
+    if not keep.all():
+        d, y = d[keep], y[keep]
+    if len(d) > 1 and (d[1:] < d[:-1]).any():
+        order = np.argsort(d, kind="stable")
+        d, y = d[order], y[order]
+
+    n = len(y)
+    if n == 0:
+        return {k: 0.0 for k in FEATURE_NAMES}
+
+    last = float(y[-1])
+    x_last = d[-1] / DAY_NS
+    x = (d - d[-1]) / DAY_NS
+
+    f: Dict[str, float] = {
+        "count_points": float(n),
+        "span_days": float((d[-1] - d[0]) // DAY_NS) if n >= 2 else 0.0,
+        "mean_score": _mean(y),
+        "std_score": _std(y) if n > 1 else 0.0,
+        "min_score": float(y.min()),
+        "max_score": float(y.max()),
+        "last_score": last,
+    }
+
+    # EMA(adjust=False) at the last point, in closed form
+    from_end = np.arange(n - 1, -1, -1)
+    for span in (7, 14, 28):
+        a = 2.0 / (span + 1)
+        w = a * np.power(1.0 - a, from_end)
+        w[0] = (1.0 - a) ** (n - 1)
+        f[f"last_minus_ema{span}"] = last - float(w @ y)
+
+    f["slope_all"] = _slope(x, y, x_last)
+    for days in (14, 28, 56):
+        i = int(np.searchsorted(d, d[-1] - days * DAY_NS, side="left"))
+        f[f"slope_{days}d"] = _slope(x[i:], y[i:], x_last)
+
+    if n >= 3:
+        roll = np.empty(n - 1)
+        roll[0] = (y[0] + y[1]) / 2
+        roll[1:] = (y[:-2] + y[1:-1] + y[2:]) / 3
+        f["rolling3_std"] = _std(roll)
+    else:
+        f["rolling3_std"] = 0.0
+    tail = y[-3:]
+    f["recent_mean_3"] = _mean(tail)
+    f["recent_std_3"] = _std(tail) if n >= 2 else 0.0
+
+    if n > 1:
+        days_between = np.diff(d) // DAY_NS
+        moving = days_between != 0
+        cpd = np.diff(y)[moving] / days_between[moving]
+        f["mean_change_per_day"] = _mean(cpd) if len(cpd) else 0.0
+        f["median_change_per_day"] = _median(cpd) if len(cpd) else 0.0
+        days_between = days_between.astype("float64")
+        cad_mean = _mean(days_between)
+        cad_std = _std(days_between) if n > 2 else 0.0
+    else:
+        f["mean_change_per_day"] = f["median_change_per_day"] = 0.0
+        cad_mean = cad_std = 0.0
+
+    f["max_drawdown"] = float((y - np.maximum.accumulate(y)).min())
+    f["cadence_mean_days"] = cad_mean
+    f["cadence_cv"] = cad_std / cad_mean if cad_mean else 0.0
+
+    f["last2_diff"] = last - float(y[-2]) if n >= 2 else 0.0
+    f["last3_diff"] = last - float(y[-3]) if n >= 3 else 0.0
+
+    return {k: (f[k] if math.isfinite(f[k]) else 0.0) for k in FEATURE_NAMES}
+
+
+def parse_dates(values: Sequence[Any]) -> np.ndarray:
+    """Dates -> int64 ns ordinals (NaT for missing). ISO strings take a numpy fast path."""
+    try:
+        return np.array(values, dtype="datetime64[ns]").astype("int64")
+    except (ValueError, TypeError):
+        return pd.to_datetime(pd.Series(values, dtype="object")).to_numpy().astype("datetime64[ns]").astype("int64")
+
+
+def parse_scores(values: Sequence[Any]) -> np.ndarray:
+    """Scores -> float64 (NaN for missing or non-numeric)."""
+    try:
+        return np.array([math.nan if v is None else v for v in values], dtype="float64")
+    except (ValueError, TypeError):
+        return pd.to_numeric(pd.Series(values, dtype="object"), errors="coerce").to_numpy(dtype="float64")
+
+
+def features_from_records(records: List[Dict[str, Any]]) -> Dict[str, float]:
+    """features_from_arrays for a list of {"date", "score"} dicts (the serving payload)."""
+    if not records or not any("date" in r for r in records) or not any("score" in r for r in records):
+        raise ValueError("Each record must include 'date' and 'score'.")
+    d = parse_dates([r.get("date") for r in records])
+    y = parse_scores([r.get("score") for r in records])
+    if not (~np.isnan(y) & (d != _NAT)).any():
+        raise ValueError("No valid rows after parsing date/score.")
+    return features_from_arrays(d, y)
+
+
+def series_fingerprint(records: List[Dict[str, Any]]) -> Optional[str]:
+    """Hash of the parsed (date, score) pairs in date order, or None if unparseable.
+
+    Two payloads with the same fingerprint have the same features: input order
+    is irrelevant except among equal dates, whose order the stable sort keeps
+    (as features_from_arrays does), and formatting differences that parse to
+    the same values ("2025-01-05" vs "2025-01-05T00:00:00", 82 vs "82") vanish.
+    """
+    try:
+        d = parse_dates([r.get("date") for r in records])
+        y = parse_scores([r.get("score") for r in records])
+    except (AttributeError, ValueError, TypeError, OverflowError):
+        return None
+    order = np.argsort(d, kind="stable")
+    h = hashlib.blake2b(digest_size=16)
+    h.update(d[order].tobytes())
+    h.update(y[order].tobytes())
+    return h.hexdigest()
+
+
+# ---------- Vectorized (columnar) feature engine ----------
+#
+# Rows are sorted once by (user, date) so that every user is a contiguous
+# segment. Each feature is then a handful of whole-array numpy passes using
+# np.bincount / np.*.reduceat as segment reductions, instead of one pandas
+# round trip per user. Semantics follow features_from_arrays exactly.
+
+def _seg_sum(codes: np.ndarray, values: np.ndarray, n_groups: int) -> np.ndarray:
+    return np.bincount(codes, weights=values, minlength=n_groups)
+
+
+def _seg_mean_std(codes: np.ndarray, values: np.ndarray, n_groups: int):
+    """Per-segment count, mean and sample std (ddof=1), two-pass for accuracy."""
+    cnt = np.bincount(codes, minlength=n_groups).astype("float64")
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = _seg_sum(codes, values, n_groups) / cnt
+        dev = values - mean[codes]
+        std = np.sqrt(_seg_sum(codes, dev * dev, n_groups) / (cnt - 1))
+    return cnt, mean, std
+
+
+def _seg_median(codes: np.ndarray, values: np.ndarray, n_groups: int) -> np.ndarray:
+    order = np.lexsort((values, codes))
+    v = values[order]
+    cnt = np.bincount(codes, minlength=n_groups)
+    start = np.cumsum(cnt) - cnt
+    out = np.full(n_groups, np.nan)
+    has = cnt > 0
+    lo = start[has] + (cnt[has] - 1) // 2
+    hi = start[has] + cnt[has] // 2
+    out[has] = (v[lo] + v[hi]) / 2
+    return out
+
+
+def _seg_slope(codes: np.ndarray, x: np.ndarray, y: np.ndarray, x_ref: np.ndarray,
+               starts: np.ndarray, ends: np.ndarray, n_groups: int) -> np.ndarray:
+    """Least-squares slope of y on x over the rows [starts, ends) of each segment.
+
+    Mirrors _slope: 0 for fewer than two points or a constant y. x is shifted by
+    the per-segment x_ref for numerical stability; when every x in a segment is
+    identical, np.polyfit returns its minimum-norm solution, which we reproduce.
+    """
+    cnt = ends - starts
+    in_win = np.arange(len(y)) >= starts[codes]
+    c, xw, yw = codes[in_win], x[in_win] - x_ref[codes[in_win]], y[in_win]
+    slope = np.zeros(n_groups)
+    ok = cnt >= 2
+    if not ok.any():
+        return slope
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mx = _seg_sum(c, xw, n_groups) / cnt
+        my = _seg_sum(c, yw, n_groups) / cnt
+        dx = xw - mx[c]
+        sxx = _seg_sum(c, dx * dx, n_groups)
+        sxy = _seg_sum(c, dx * (yw - my[c]), n_groups)
+
+    # Windows are not back to back, so reduce over interleaved [start, end) pairs
+    nonempty = np.flatnonzero(cnt > 0)
+    bounds = np.column_stack([starts[nonempty], ends[nonempty]]).ravel()
+    y_pad = np.append(y, 0.0)
+    y_min = np.full(n_groups, np.nan)
+    y_max = np.full(n_groups, np.nan)
+    y_min[nonempty] = np.minimum.reduceat(y_pad, bounds)[::2]
+    y_max[nonempty] = np.maximum.reduceat(y_pad, bounds)[::2]
+    ok &= y_min != y_max
+
+    regular = ok & (sxx > 0)
+    slope[regular] = sxy[regular] / sxx[regular]
+    degenerate = ok & (sxx == 0)
+    slope[degenerate] = my[degenerate] / (2 * x_ref[degenerate])
+    return slope
+
+
+def _columnar_features(codes: np.ndarray, dates_ns: np.ndarray, y: np.ndarray,
+                       n_groups: int) -> Dict[str, np.ndarray]:
+    """Compute every feature for all segments at once.
+
+    codes, dates_ns and y must be sorted by (codes, dates_ns) and free of NaNs.
+    Returns one float64 array of length n_groups per feature name.
+    """
+    N = len(y)
+    if N == 0:
+        return {k: np.zeros(n_groups) for k in FEATURE_NAMES}
+    cnt_i = np.bincount(codes, minlength=n_groups)
+    ends = np.cumsum(cnt_i)
+    starts = ends - cnt_i
+    cnt = cnt_i.astype("float64")
+    has = cnt_i > 0
+    pos = np.arange(N) - starts[codes]
+    from_end = cnt_i[codes] - 1 - pos
+    last_idx = np.where(has, ends - 1, 0)
+    first_idx = np.where(has, starts, 0)
+
+    x = dates_ns / DAY_NS
+    last = y[last_idx]
+
+    f: Dict[str, np.ndarray] = {}
+    f["count_points"] = cnt
+    f["span_days"] = np.where(
+        cnt_i >= 2, (dates_ns[last_idx] - dates_ns[first_idx]) // DAY_NS, 0
+    ).astype("float64")
+
+    _, mean, std = _seg_mean_std(codes, y, n_groups)
+    f["mean_score"] = mean
+    f["std_score"] = np.where(cnt_i > 1, std, 0.0)
+    nz = np.flatnonzero(has)
+    f["min_score"] = np.zeros(n_groups)
+    f["max_score"] = np.zeros(n_groups)
+    f["min_score"][nz] = np.minimum.reduceat(y, starts[nz])
+    f["max_score"][nz] = np.maximum.reduceat(y, starts[nz])
+    f["last_score"] = last
+
+    # EMA(adjust=False) at the last point, in closed form:
+    #   ema = (1-a)^(n-1) * y_0 + sum_{i>=1} a * (1-a)^(n-1-i) * y_i
+    for span in (7, 14, 28):
+        a = 2.0 / (span + 1)
+        w = np.where(pos == 0, 1.0, a) * np.power(1.0 - a, from_end)
+        f[f"last_minus_ema{span}"] = last - _seg_sum(codes, w * y, n_groups)
+
+    # Trend slopes; the windows are suffixes of each (date-sorted) segment.
+    x_last = x[last_idx]
+    f["slope_all"] = _seg_slope(codes, x, y, x_last, starts, ends, n_groups)
+    for days in (14, 28, 56):
+        cutoff = dates_ns[last_idx] - days * DAY_NS
+        outside = np.bincount(codes[dates_ns < cutoff[codes]], minlength=n_groups)
+        f[f"slope_{days}d"] = _seg_slope(codes, x, y, x_last, starts + outside, ends, n_groups)
+
+    # Deltas & cadence between consecutive points of the same user
+    prev1 = np.empty_like(y)
+    prev1[1:], prev1[:1] = y[:-1], np.nan
+    prev2 = np.empty_like(y)
+    prev2[2:], prev2[:2] = y[:-2], np.nan
+    step = pos >= 1
+    sc = codes[step]
+
+    roll3 = np.where(pos[step] >= 2, (prev2[step] + prev1[step] + y[step]) / 3,
+                     (prev1[step] + y[step]) / 2)
+    _, _, roll3_std = _seg_mean_std(sc, roll3, n_groups)
+    f["rolling3_std"] = np.where(cnt_i > 2, roll3_std, 0.0)
+
+    tail = from_end < 3
+    _, tail_mean, tail_std = _seg_mean_std(codes[tail], y[tail], n_groups)
+    f["recent_mean_3"] = tail_mean
+    f["recent_std_3"] = np.where(cnt_i >= 2, tail_std, 0.0)
+
+    days_between = (dates_ns[1:] - dates_ns[:-1])[step[1:]] // DAY_NS
+    delta = (y[1:] - y[:-1])[step[1:]]
+    moving = days_between != 0
+    cpd = delta[moving] / days_between[moving]
+    cpd_codes = sc[moving]
+    f["mean_change_per_day"] = _seg_mean_std(cpd_codes, cpd, n_groups)[1]
+    f["median_change_per_day"] = _seg_median(cpd_codes, cpd, n_groups)
+
+    peak = pd.Series(y).groupby(codes).cummax().to_numpy()
+    f["max_drawdown"] = np.zeros(n_groups)
+    f["max_drawdown"][nz] = np.minimum.reduceat(y - peak, starts[nz])
+
+    _, cad_mean, cad_std = _seg_mean_std(sc, days_between.astype("float64"), n_groups)
+    cad_mean = np.where(cnt_i > 1, cad_mean, 0.0)
+    cad_std = np.where(cnt_i > 2, cad_std, 0.0)
+    f["cadence_mean_days"] = cad_mean
+    with np.errstate(invalid="ignore", divide="ignore"):
+        f["cadence_cv"] = np.where(cad_mean != 0, cad_std / cad_mean, 0.0)
+
+    f["last2_diff"] = np.where(cnt_i >= 2, last - y[np.maximum(last_idx - 1, 0)], 0.0)
+    f["last3_diff"] = np.where(cnt_i >= 3, last - y[np.maximum(last_idx - 2, 0)], 0.0)
+
+    # Replace infinities / NaNs and blank out users without valid rows
+    for k, v in f.items():
+        f[k] = np.where(np.isfinite(v) & has, v, 0.0).astype("float64")
+    return {k: f[k] for k in FEATURE_NAMES}
+
+
+
+def features_for_groups(codes: np.ndarray, dates: pd.Series, scores: pd.Series,
+                        n_groups: int) -> Dict[str, np.ndarray]:
+    """Vectorized features for rows labelled with group codes 0..n_groups-1.
+
+    Rows may come in any order; NaN scores and NaT dates are dropped. Groups
+    left without rows get all-zero features (count_points == 0).
+    """
+    dates_ns = pd.to_datetime(dates).to_numpy().astype("datetime64[ns]").astype("int64")
+    y = pd.to_numeric(scores, errors="coerce").to_numpy(dtype="float64")
+    keep = ~np.isnan(y) & (dates_ns != np.iinfo("int64").min)
+    codes, dates_ns, y = codes[keep], dates_ns[keep], y[keep]
+
+    order = np.lexsort((dates_ns, codes))  # stable: ties keep input order
+    return _columnar_features(codes[order], dates_ns[order], y[order], n_groups)
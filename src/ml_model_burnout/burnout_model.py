@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Compact, sklearn-free form of the trained burnout model.
+
+The model trained by burnout_timeseries_pipeline.py is a StandardScaler +
+LogisticRegression pipeline, i.e. one standardization and one dot product.
+export_compact_model() pulls the fitted numbers out of it into a small JSON
+artifact (model.json, next to model.pkl):
+
+{
+  "format": "burnout-logreg-v1",
+  "feature_names": ["count_points", ...],
+  "mean": [...],        # scaler mean_ (null when fitted with_mean=False)
+  "scale": [...],       # scaler scale_ (null when fitted with_std=False)
+  "coef": [...],
+  "intercept": -0.42
+}
+
+CompactModel scores it with numpy only, so predict_service can serve it
+without importing sklearn. Floats are written with repr() and read back
+bit-exactly, and the arithmetic follows sklearn's order of operations, so
+both paths return the same probabilities; maybe_train() checks this on the
+training rows before writing the artifact.
+"""
+
+import json
+import math
+from typing import Any, Dict, List, Mapping, Optional
+
+import numpy as np
+
+COMPACT_FORMAT = "burnout-logreg-v1"
+_MAX_EXP = 709.0  # math.exp overflows just above this; 1 / (1 + e**709) is 0 in practice
+
+
+def export_compact_model(pipe: Any, feature_names: List[str]) -> Dict[str, Any]:
+    """Artifact dict for a fitted scaler + binary logistic regression pipeline."""
+    steps = dict(pipe.named_steps)
+    scaler, clf = steps.get("scaler"), steps.get("clf")
+    if clf is None or not hasattr(clf, "coef_") or clf.coef_.shape[0] != 1:
+        raise ValueError("Compact export needs a pipeline ending in a binary LogisticRegression step 'clf'.")
+    if len(steps) != (2 if scaler is not None else 1):
+        raise ValueError(f"Compact export supports only 'scaler' and 'clf' steps, got: {list(steps)}")
+    with_mean = scaler is not None and scaler.with_mean
+    with_std = scaler is not None and scaler.with_std
+    return {
+        "format": COMPACT_FORMAT,
+        "feature_names": [str(c) for c in feature_names],
+        "mean": scaler.mean_.tolist() if with_mean else None,
+        "scale": scaler.scale_.tolist() if with_std else None,
+        "coef": clf.coef_[0].tolist(),
+        "intercept": float(clf.intercept_[0]),
+    }
+
+
+class CompactModel:
+    """Numpy scorer for an exported artifact; quacks like the sklearn pipeline
+    where predict_service needs it (predict_proba, feature_names_in_)."""
+
+    def __init__(self, feature_names: List[str], coef: np.ndarray, intercept: float,
+                 mean: Optional[np.ndarray] = None, scale: Optional[np.ndarray] = None):
+        self.feature_names_in_ = np.asarray(feature_names, dtype=object)
+        self.coef = np.asarray(coef, dtype="float64")
+        self.intercept = float(intercept)
+        self.mean = None if mean is None else np.asarray(mean, dtype="float64")
+        self.scale = None if scale is None else np.asarray(scale, dtype="float64")
+        self._names = list(feature_names)
+
+    @classmethod
+    def from_dict(cls, d: Mapping[str, Any]) -> "CompactModel":
+        if d.get("format") != COMPACT_FORMAT:
+            raise ValueError(f"Unsupported compact model format: {d.get('format')!r}")
+        return cls(d["feature_names"], d["coef"], d["intercept"], d.get("mean"), d.get("scale"))
+
+    @classmethod
+    def load(cls, path: str) -> "CompactModel":
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    def _proba(self, X: np.ndarray) -> np.ndarray:
+        X = np.array(X, dtype="float64")  # copy; StandardScaler.transform order: -= mean, /= scale
+        if self.mean is not None:
+            X -= self.mean
+        if self.scale is not None:
+            X /= self.scale
+        z = X @ self.coef + self.intercept
+        # libm exp (as in scipy's expit) rather than numpy's SIMD exp, which can
+        # differ in the last bit
+        e = np.fromiter(map(math.exp, np.minimum(-z, _MAX_EXP)), dtype="float64", count=len(z))
+        return 1.0 / (1.0 + e)
+
+    def predict_proba(self, X: Any) -> np.ndarray:
+        """(n, 2) class probabilities for a DataFrame (columns matched by name;
+        missing ones are 0.0) or a 2-D array already in feature order."""
+        if hasattr(X, "columns"):
+            X = X.reindex(columns=self._names, fill_value=0.0).to_numpy(dtype="float64")
+        p = self._proba(X)
+        return np.column_stack([1.0 - p, p])
+
+    def predict_one(self, feats: Mapping[str, float]) -> float:
+        """Probability of the positive class for a single feature dict."""
+        x = np.fromiter((feats.get(c, 0.0) for c in self._names), dtype="float64", count=len(self._names))
+        if self.mean is not None:
+            x -= self.mean
+        if self.scale is not None:
+            x /= self.scale
+        z = float(x @ self.coef) + self.intercept
+        return 1.0 / (1.0 + math.exp(min(-z, _MAX_EXP)))
@@ -7,7 +7,11 @@ Usage:
     --scores scores.json \
     --labels labels.json \
     --outdir ./out \
-    [--user-id SINGLE_USER_ID]
+    [--user-id SINGLE_USER_ID] \
+    [--engine vectorized|per-user] [--as-of] \
+    [--workers N] [--grid] \
+    [--scores-format json|ndjson|csv|parquet] [--stream] [--chunksize ROWS] \
+    [--cache-dir DIR [--evict-missing]]
 
 Input formats
 -------------
@@ -25,6 +29,14 @@ B) List of dicts without user_id (single user file): provide --user-id
      {"date": "2025-01-12", "score": 78}
    ]
 
+The same rows may also come as NDJSON (one object per line), CSV or Parquet
+with user_id/date/score columns; other columns are ignored. User ids are
+loaded as a categorical and scores as float64, as predict_service and the
+online features use. With --stream the features are built chunk by chunk,
+which requires the rows to be grouped by user_id, and scores are kept as
+float32 to halve their memory; features then differ from the default path in
+about the fifth significant digit.
+
 labels.json :
    [
      {"user_id": "u1", "close_to_burnout": true},
@@ -34,8 +46,12 @@ labels.json :
 Outputs
 -------
 - <outdir>/features.csv      : feature table per user_id
+- <outdir>/features_asof.parquet : point-in-time features per (user_id, as_of date) (with --as-of)
 - <outdir>/model.pkl         : trained model (if labels provided)
-- <outdir>/metrics.txt       : CV metrics (if labels provided)
+- <outdir>/model.json        : the same model as plain numbers, scored without sklearn (see burnout_model.py);
+                               not written if its probabilities differ from the pipeline's by more than 1e-9
+- <outdir>/metrics.txt       : CV metrics and per-stage timings (if labels provided)
+- <cache-dir>/feature_cache.pkl : per-user content hash + features (with --cache-dir)
 
 Notes
 -----
@@ -43,19 +59,24 @@ Notes
 - We perform GroupKFold CV by user to avoid leakage across a user's time slices.
 """
 
-import argparse, json, math, os, sys
+import argparse, json, math, os, sys, time
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, Iterator, List, Optional
 import numpy as np
 import pandas as pd
+from pandas.api.types import union_categoricals
 
 from sklearn.linear_model import LogisticRegression
 from sklearn.preprocessing import StandardScaler
 from sklearn.pipeline import Pipeline
-from sklearn.model_selection import GroupKFold, cross_validate
+from sklearn.model_selection import GridSearchCV, GroupKFold, cross_validate
 from sklearn.metrics import roc_auc_score, average_precision_score, classification_report
 import joblib
 
+from burnout_features import DAY_NS, FEATURE_NAMES, features_for_groups, features_from_arrays
+from burnout_model import CompactModel, export_compact_model
+
 
 def _ensure_cols(df: pd.DataFrame) -> pd.DataFrame:
     missing = [c for c in ["date", "score"] if c not in df.columns]
@@ -66,7 +87,7 @@ def _ensure_cols(df: pd.DataFrame) -> pd.DataFrame:
 
 def _as_day_index(series_datetime: pd.Series) -> np.ndarray:
     # Convert datetime to float number of days since epoch (for stable regression)
-    return series_datetime.view("int64") / (24*3600*1e9)
+    return series_datetime.astype("int64") / (24*3600*1e9)
 
 
 def _slope(y: pd.Series, x: Optional[pd.Series] = None) -> float:
@@ -113,6 +134,13 @@ def _ema(x: pd.Series, span: int) -> pd.Series:
 
 def features_from_timeseries(df_user: pd.DataFrame) -> Dict[str, float]:
     """Compute a robust set of features from one user's time series."""
+    dates_ns = pd.to_datetime(df_user["date"]).to_numpy().astype("datetime64[ns]").astype("int64")
+    scores = pd.to_numeric(df_user["score"], errors="coerce").to_numpy(dtype="float64")
+    return features_from_arrays(dates_ns, scores)
+
+
+def features_from_timeseries_reference(df_user: pd.DataFrame) -> Dict[str, float]:
+    """Original pandas implementation; the parity reference for burnout_features."""
     df = df_user.copy()
     df["date"] = pd.to_datetime(df["date"])
     df = df.sort_values("date").dropna(subset=["score"])
@@ -198,30 +226,410 @@ def features_from_timeseries(df_user: pd.DataFrame) -> Dict[str, float]:
     return f
 
 
-def load_scores(scores_path: str, single_user_id: Optional[str]) -> pd.DataFrame:
-    df = pd.read_json(scores_path)
+# ---------- Point-in-time (as-of) features ----------
+#
+# One feature row per (user, score date), using only that user's scores up to
+# and including the date -- the features a model would have seen at the time.
+# Instead of recomputing every prefix (O(n^2) per user), expanding statistics
+# come from per-user cumulative sums, EMAs from their recursion stepped one
+# series position at a time across all users, and each row's trailing slope
+# window from a vectorized binary search over its own prefix. The expanding
+# median is pandas' skiplist-based groupby median (O(n log n)).
+
+def _grouped(values: np.ndarray, codes: np.ndarray):
+    return pd.Series(values).groupby(codes, sort=False)
+
+
+def _window_starts(dates_ns: np.ndarray, row_start: np.ndarray, cutoff: np.ndarray) -> np.ndarray:
+    """First row of each row's own segment prefix with date >= cutoff (binary search, all rows at once)."""
+    lo = row_start.copy()
+    hi = np.arange(len(dates_ns))
+    active = lo < hi
+    while active.any():
+        mid = (lo + hi) // 2
+        ge = dates_ns[mid] >= cutoff
+        hi = np.where(active & ge, mid, hi)
+        lo = np.where(active & ~ge, mid + 1, lo)
+        active = lo < hi
+    return lo
+
+
+def _prefix_slope(n: np.ndarray, sx: np.ndarray, sy: np.ndarray, sxx: np.ndarray, sxy: np.ndarray,
+                  y_mean: np.ndarray, x_abs: np.ndarray, constant_y: np.ndarray,
+                  constant_x: np.ndarray) -> np.ndarray:
+    """Slopes from window sums, with the same edge cases as _slope / np.polyfit."""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        slope = (sxy - sx * sy / n) / (sxx - sx * sx / n)
+        slope = np.where(constant_x, y_mean / (2 * x_abs), slope)
+    return np.where((n >= 2) & ~constant_y, slope, 0.0)
+
+
+def _asof_columns(codes: np.ndarray, dates_ns: np.ndarray, y: np.ndarray,
+                  n_groups: int):
+    """Per-row expanding features for rows sorted by (codes, dates_ns).
+
+    Returns (emit, features): emit marks the last row of every (user, date),
+    i.e. the rows that become as-of feature rows.
+    """
+    N = len(y)
+    cnt_i = np.bincount(codes, minlength=n_groups)
+    row_start = (np.cumsum(cnt_i) - cnt_i)[codes]
+    pos = np.arange(N) - row_start
+    n = (pos + 1).astype("float64")
+    step = pos >= 1
+
+    emit = np.ones(N, dtype=bool)
+    emit[:-1] = (codes[1:] != codes[:-1]) | (dates_ns[1:] != dates_ns[:-1])
+
+    def cum(v):
+        return _grouped(v, codes).cumsum().to_numpy()
+
+    prev1 = np.r_[np.nan, y[:-1]][:N]
+    prev2 = np.r_[np.nan, np.nan, y[:-2]][:N]
+    y0 = y[row_start]
+    yc = y - y0  # shift by the user's first score to limit cancellation in the sums
+    x = (dates_ns - dates_ns[row_start]) / DAY_NS
+    x_abs = dates_ns / DAY_NS
+
+    f: Dict[str, np.ndarray] = {}
+    f["count_points"] = n
+    f["span_days"] = ((dates_ns - dates_ns[row_start]) // DAY_NS).astype("float64")
+
+    c_y, c_yy = cum(yc), cum(yc * yc)
+    f["mean_score"] = c_y / n + y0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        f["std_score"] = np.where(step, np.sqrt(np.maximum(c_yy - c_y * c_y / n, 0) / (n - 1)), 0.0)
+    f["min_score"] = _grouped(y, codes).cummin().to_numpy()
+    f["max_score"] = _grouped(y, codes).cummax().to_numpy()
+    f["last_score"] = y
+
+    # EMA recursion, one series position at a time for all users at once
+    by_pos = np.argsort(pos, kind="stable")
+    pos_bounds = np.cumsum(np.bincount(pos)) if N else np.zeros(0, dtype=int)
+    for span in (7, 14, 28):
+        a = 2.0 / (span + 1)
+        ema = y.copy()
+        for k in range(1, len(pos_bounds)):
+            rows = by_pos[pos_bounds[k - 1]:pos_bounds[k]]
+            ema[rows] = (1 - a) * ema[rows - 1] + a * y[rows]
+        f[f"last_minus_ema{span}"] = y - ema
+
+    # Slopes: overall (expanding) and trailing windows, from per-user prefix sums
+    changes = cum((step & (y != prev1)).astype("float64"))
+    c_x, c_xx, c_xy = cum(x), cum(x * x), cum(x * yc)
+    f["slope_all"] = _prefix_slope(n, c_x, c_y, c_xx, c_xy, f["mean_score"], x_abs,
+                                   changes == 0, dates_ns == dates_ns[row_start])
+    for days in (14, 28, 56):
+        s = _window_starts(dates_ns, row_start, dates_ns - days * DAY_NS)
+        before = s > row_start
+
+        def win(c):
+            return c - np.where(before, c[np.maximum(s - 1, 0)], 0.0)
+
+        nw = (pos - (s - row_start) + 1).astype("float64")
+        wy = win(c_y)
+        f[f"slope_{days}d"] = _prefix_slope(nw, win(c_x), wy, win(c_xx), win(c_xy), wy / nw + y0, x_abs,
+                                            changes == changes[s], dates_ns == dates_ns[s])
+
+    # Rolling-3 means (from position 1 on) and their expanding std
+    r = np.where(pos >= 2, (prev2 + prev1 + y) / 3, (prev1 + y) / 2)
+    rc = np.where(step, r - y0, 0.0)
+    c_r, c_rr, m = cum(rc), cum(rc * rc), pos.astype("float64")
+    with np.errstate(invalid="ignore", divide="ignore"):
+        f["rolling3_std"] = np.where(pos > 1, np.sqrt(np.maximum(c_rr - c_r * c_r / m, 0) / (m - 1)), 0.0)
+
+    k = np.minimum(n, 3)
+    p1 = np.where(pos >= 1, prev1, 0.0)
+    p2 = np.where(pos >= 2, prev2, 0.0)
+    recent_mean = (y + p1 + p2) / k
+    dev2 = (y - recent_mean) ** 2 + np.where(pos >= 1, (p1 - recent_mean) ** 2, 0) \
+        + np.where(pos >= 2, (p2 - recent_mean) ** 2, 0)
+    f["recent_mean_3"] = recent_mean
+    with np.errstate(invalid="ignore", divide="ignore"):
+        f["recent_std_3"] = np.where(step, np.sqrt(dev2 / (k - 1)), 0.0)
+
+    days_between = np.where(step, (dates_ns - np.r_[0, dates_ns[:-1]][:N]) // DAY_NS, 0).astype("float64")
+    moving = step & (days_between != 0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cpd = np.where(moving, (y - prev1) / days_between, np.nan)
+        f["mean_change_per_day"] = cum(np.where(moving, cpd, 0.0)) / cum(moving.astype("float64"))
+    f["median_change_per_day"] = (_grouped(cpd, codes).expanding(min_periods=1).median()
+                                  .reset_index(level=0, drop=True).sort_index().to_numpy())
+
+    f["max_drawdown"] = _grouped(y - f["max_score"], codes).cummin().to_numpy()
+
+    c_d, c_dd = cum(days_between), cum(days_between * days_between)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cad_mean = np.where(step, c_d / m, 0.0)
+        cad_std = np.where(pos > 1, np.sqrt(np.maximum(c_dd - c_d * c_d / m, 0) / (m - 1)), 0.0)
+        f["cadence_mean_days"] = cad_mean
+        f["cadence_cv"] = np.where(cad_mean != 0, cad_std / cad_mean, 0.0)
+
+    f["last2_diff"] = np.where(pos >= 1, y - prev1, 0.0)
+    f["last3_diff"] = np.where(pos >= 2, y - prev2, 0.0)
+
+    for key, v in f.items():
+        f[key] = np.where(np.isfinite(v), v, 0.0).astype("float64")
+    return emit, {key: f[key] for key in FEATURE_NAMES}
+
+
+SCORE_COLUMNS = ["user_id", "date", "score"]
+SCORE_FORMATS = ("json", "ndjson", "csv", "parquet")
+_FORMAT_BY_EXT = {".ndjson": "ndjson", ".jsonl": "ndjson", ".csv": "csv", ".parquet": "parquet", ".pq": "parquet"}
+
+
+def _scores_format(scores_path: str, fmt: Optional[str]) -> str:
+    return fmt or _FORMAT_BY_EXT.get(os.path.splitext(scores_path)[1].lower(), "json")
+
+
+def _normalize_scores(df: pd.DataFrame, single_user_id: Optional[str],
+                      score_dtype: str = "float64") -> pd.DataFrame:
+    """Project to user_id/date/score with compact dtypes and drop unusable rows."""
     _ensure_cols(df)
     if "user_id" not in df.columns:
         if not single_user_id:
             raise ValueError("scores JSON is missing user_id; provide --user-id for single-user files.")
         df["user_id"] = single_user_id
+    df = df[SCORE_COLUMNS].copy()
     df["date"] = pd.to_datetime(df["date"])
-    df["score"] = pd.to_numeric(df["score"], errors="coerce")
+    df["score"] = pd.to_numeric(df["score"], errors="coerce").astype(score_dtype)
     df = df.dropna(subset=["date", "score"])
-    return df[["user_id", "date", "score"]]
+    df["user_id"] = df["user_id"].astype("category")
+    return df.reset_index(drop=True)
+
+
+def iter_score_chunks(scores_path: str, single_user_id: Optional[str], fmt: Optional[str] = None,
+                      chunksize: int = 500_000, score_dtype: str = "float64") -> Iterator[pd.DataFrame]:
+    """Yield normalized score frames of at most ~chunksize rows.
+
+    NDJSON, CSV and Parquet are read incrementally (Parquet only loads the
+    three score columns); a JSON array has to be parsed whole and comes back
+    as a single chunk.
+    """
+    fmt = _scores_format(scores_path, fmt)
+    if fmt == "json":
+        yield _normalize_scores(pd.read_json(scores_path), single_user_id, score_dtype)
+    elif fmt == "ndjson":
+        with pd.read_json(scores_path, lines=True, chunksize=chunksize) as reader:
+            for chunk in reader:
+                yield _normalize_scores(chunk, single_user_id, score_dtype)
+    elif fmt == "csv":
+        for chunk in pd.read_csv(scores_path, usecols=lambda c: c in SCORE_COLUMNS, chunksize=chunksize):
+            yield _normalize_scores(chunk, single_user_id, score_dtype)
+    elif fmt == "parquet":
+        import pyarrow.parquet as pq
+        pf = pq.ParquetFile(scores_path)
+        columns = [c for c in SCORE_COLUMNS if c in pf.schema_arrow.names]
+        for batch in pf.iter_batches(batch_size=chunksize, columns=columns):
+            yield _normalize_scores(batch.to_pandas(), single_user_id, score_dtype)
+    else:
+        raise ValueError(f"Unsupported scores format: {fmt} (expected one of {', '.join(SCORE_FORMATS)})")
+
+
+def load_scores(scores_path: str, single_user_id: Optional[str], fmt: Optional[str] = None,
+                chunksize: int = 500_000) -> pd.DataFrame:
+    chunks = list(iter_score_chunks(scores_path, single_user_id, fmt, chunksize))
+    if len(chunks) == 1:
+        return chunks[0]
+    if not chunks:
+        return pd.DataFrame({"user_id": pd.Categorical([]), "date": pd.to_datetime([]),
+                             "score": np.array([], dtype="float64")})
+    user_ids = union_categoricals([c["user_id"] for c in chunks])
+    df = pd.concat([c[["date", "score"]] for c in chunks], ignore_index=True)
+    df.insert(0, "user_id", user_ids)
+    return df
+
+
+def build_feature_table(scores_df: pd.DataFrame, workers: int = 1) -> pd.DataFrame:
+    """Feature table (one row per user_id) using the vectorized engine.
+
+    With workers > 1 the users are sharded across a process pool.
+    """
+    codes, uniques = pd.factorize(scores_df["user_id"], sort=False)
+    if workers > 1 and len(uniques) >= 2 * workers:
+        shards = [scores_df[codes % workers == i] for i in range(workers)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(build_feature_table, shards))
+        return pd.concat(parts).sort_values("user_id", kind="mergesort").reset_index(drop=True)
+    feats = features_for_groups(codes, scores_df["date"], scores_df["score"], len(uniques))
+
+    feat_df = pd.DataFrame(feats, index=pd.Index(np.asarray(uniques), name="user_id")).sort_index()
+    return feat_df.reset_index()
+
+
+def build_feature_table_streaming(chunks: Iterable[pd.DataFrame]) -> pd.DataFrame:
+    """Feature table from score chunks whose rows are grouped by user_id.
+
+    Only one chunk (plus the possibly unfinished last user of the previous
+    one) is held at a time, so peak memory is bounded by the chunk size and
+    the longest single history rather than by the input size.
+    """
+    parts: List[pd.DataFrame] = []
+    seen: set = set()
+    carry: Optional[pd.DataFrame] = None
+
+    def emit(rows: pd.DataFrame) -> None:
+        feats = build_feature_table(rows)
+        if seen.intersection(feats["user_id"]):
+            raise ValueError("scores are not grouped by user_id; sort the input or run without --stream.")
+        seen.update(feats["user_id"])
+        parts.append(feats)
+
+    for chunk in chunks:
+        if carry is not None:
+            chunk = pd.concat([carry, chunk], ignore_index=True)
+        if chunk.empty:
+            continue
+        # The chunk's last user may continue in the next chunk
+        is_last = (chunk["user_id"] == chunk["user_id"].iloc[-1]).to_numpy()
+        carry = chunk[is_last]
+        if not is_last.all():
+            emit(chunk[~is_last])
+    if carry is not None and len(carry):
+        emit(carry)
+    if not parts:
+        return pd.DataFrame(columns=["user_id"] + FEATURE_NAMES)
+    return pd.concat(parts).sort_values("user_id", kind="mergesort").reset_index(drop=True)
+
+
+# Bump when feature semantics change so cached rows from older code are recomputed
+FEATURE_CACHE_VERSION = 1
+FEATURE_CACHE_FILE = "feature_cache.pkl"
+
+
+def _user_content_hashes(codes: np.ndarray, scores_df: pd.DataFrame, n_groups: int) -> np.ndarray:
+    """Order-independent 64-bit hash of each user's (date, score) rows."""
+    rows = pd.DataFrame({
+        "date": pd.to_datetime(scores_df["date"]).to_numpy().astype("datetime64[ns]").astype("int64"),
+        "score": pd.to_numeric(scores_df["score"], errors="coerce").to_numpy(dtype="float64"),
+    })
+    row_hash = pd.util.hash_pandas_object(rows, index=False).to_numpy()
+    order = np.argsort(codes, kind="stable")
+    counts = np.bincount(codes, minlength=n_groups)
+    starts = np.cumsum(counts) - counts
+    hashes = np.zeros(n_groups, dtype="uint64")
+    nz = counts > 0
+    with np.errstate(over="ignore"):
+        # Sum of row hashes (mod 2**64) is a multiset hash; mix in the count and cache version
+        hashes[nz] = np.add.reduceat(row_hash[order], starts[nz])
+        hashes ^= counts.astype("uint64") * np.uint64(0x9E3779B97F4A7C15) + np.uint64(FEATURE_CACHE_VERSION)
+    return hashes
+
+
+def build_feature_table_cached(scores_df: pd.DataFrame, cache_dir: str, workers: int = 1,
+                               evict_missing: bool = False):
+    """build_feature_table that only recomputes users whose score rows changed.
+
+    The cache under `cache_dir` maps user_id -> (content hash, features). Users
+    absent from `scores_df` stay cached unless `evict_missing` is set.
+    Returns (feature table for the users in scores_df, stats dict).
+    """
+    codes, uniques = pd.factorize(scores_df["user_id"], sort=False)
+    user_ids = pd.Index(np.asarray(uniques), name="user_id")
+    hashes = pd.Series(_user_content_hashes(codes, scores_df, len(uniques)), index=user_ids)
+
+    cache_path = os.path.join(cache_dir, FEATURE_CACHE_FILE)
+    if os.path.exists(cache_path):
+        cache = pd.read_pickle(cache_path)
+    else:
+        cache = pd.DataFrame(columns=["hash"] + FEATURE_NAMES, index=pd.Index([], name="user_id"))
+
+    cached_hash = cache["hash"].reindex(user_ids)
+    hit = (cached_hash.to_numpy() == hashes.to_numpy())
+    miss_rows = ~hit[codes]
+    fresh = build_feature_table(scores_df[miss_rows], workers=workers).set_index("user_id") \
+        if miss_rows.any() else cache.iloc[:0][FEATURE_NAMES]
+    fresh.insert(0, "hash", hashes.reindex(fresh.index).to_numpy())
+
+    missing = cache.index.difference(user_ids)
+    kept = cache.drop(index=missing) if evict_missing else cache
+    cache = pd.concat([kept.drop(index=fresh.index, errors="ignore"), fresh])
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = cache_path + ".tmp"
+    cache.to_pickle(tmp)
+    os.replace(tmp, cache_path)
+
+    feat_df = cache.loc[user_ids, FEATURE_NAMES].astype("float64").sort_index().reset_index()
+    stats = {
+        "hits": int(hit.sum()),
+        "misses": int((~hit).sum()),
+        "evicted": int(len(missing)) if evict_missing else 0,
+        "stale": 0 if evict_missing else int(len(missing)),
+    }
+    return feat_df, stats
 
 
-def build_feature_table(scores_df: pd.DataFrame) -> pd.DataFrame:
+def build_feature_table_per_user(scores_df: pd.DataFrame) -> pd.DataFrame:
+    """Reference implementation: features_from_timeseries_reference called once per user."""
     feats = []
-    for uid, g in scores_df.groupby("user_id", sort=False):
-        f = features_from_timeseries(g)
+    for uid, g in scores_df.groupby("user_id", sort=False, observed=True):
+        f = features_from_timeseries_reference(g)
         f["user_id"] = uid
         feats.append(f)
     feat_df = pd.DataFrame(feats).set_index("user_id").sort_index()
     return feat_df.reset_index()
 
 
-def maybe_train(feat_df: pd.DataFrame, labels_path: Optional[str], outdir: str) -> None:
+def write_asof_features(scores_df: pd.DataFrame, path: str, batch_rows: int = 1_000_000) -> int:
+    """Write one as-of feature row per (user, score date) to a Parquet file.
+
+    Users are processed in batches of about `batch_rows` score rows and each
+    batch is written as its own row group, so the output never has to exist
+    as a single in-memory frame. Returns the number of rows written.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError("--as-of output requires pyarrow (pip install pyarrow)") from e
+
+    codes, uniques = pd.factorize(scores_df["user_id"], sort=False)
+    dates_ns = pd.to_datetime(scores_df["date"]).to_numpy().astype("datetime64[ns]").astype("int64")
+    y = pd.to_numeric(scores_df["score"], errors="coerce").to_numpy(dtype="float64")
+    keep = ~np.isnan(y) & (dates_ns != np.iinfo("int64").min)
+    codes, dates_ns, y = codes[keep], dates_ns[keep], y[keep]
+    order = np.lexsort((dates_ns, codes))
+    codes, dates_ns, y = codes[order], dates_ns[order], y[order]
+    user_ids = np.asarray(uniques, dtype=object)
+
+    group_ends = np.cumsum(np.bincount(codes, minlength=len(uniques)))
+    writer = None
+    written = 0
+    lo = 0
+    while lo < len(y) or writer is None:
+        hi = int(group_ends[min(np.searchsorted(group_ends, lo + batch_rows), len(group_ends) - 1)]) \
+            if len(y) else 0
+        c = codes[lo:hi]
+        base = c[0] if len(c) else 0
+        emit, feats = _asof_columns(c - base, dates_ns[lo:hi], y[lo:hi], int(c[-1] - base + 1) if len(c) else 0)
+        table = pa.table({
+            "user_id": pa.array(user_ids[c[emit]]) if len(c) else pa.array([], pa.string()),
+            "as_of": pa.array(dates_ns[lo:hi][emit].astype("datetime64[ns]")),
+            **{k: pa.array(v[emit]) for k, v in feats.items()},
+        })
+        if writer is None:
+            writer = pq.ParquetWriter(path, table.schema)
+        writer.write_table(table)
+        written += table.num_rows
+        lo = hi
+    writer.close()
+    return written
+
+
+COMPACT_MODEL_FILE = "model.json"
+COMPACT_MAX_DIFF = 1e-9  # compact vs sklearn probabilities; float rounding only is ~1e-15
+
+# Small grid searched with --grid; everything else matches the default pipeline
+PARAM_GRID = {
+    "clf__C": [0.01, 0.1, 1.0, 10.0],
+    "clf__class_weight": ["balanced", None],
+}
+
+
+def maybe_train(feat_df: pd.DataFrame, labels_path: Optional[str], outdir: str,
+                workers: int = 1, grid: bool = False,
+                timings: Optional[Dict[str, float]] = None) -> None:
+    timings = dict(timings or {})
     if not labels_path:
         print("No labels provided; skipping model training.")
         return
@@ -246,45 +654,138 @@ def maybe_train(feat_df: pd.DataFrame, labels_path: Optional[str], outdir: str)
 
     cv = GroupKFold(n_splits=min(5, len(np.unique(groups))))
     scoring = {"roc_auc": "roc_auc", "pr_auc": "average_precision"}
-    cv_res = cross_validate(pipe, X, y, groups=groups, cv=cv, scoring=scoring, return_estimator=True)
-    mean_roc = float(np.mean(cv_res["test_roc_auc"]))
-    mean_pr = float(np.mean(cv_res["test_pr_auc"]))
-
-    # Fit final on all data
-    pipe.fit(X, y)
+    n_jobs = workers if workers > 1 else None
+    best_params = None
+    t0 = time.perf_counter()
+    if grid:
+        # Folds x grid points run concurrently; refit on all data with the best ROC-AUC
+        search = GridSearchCV(pipe, PARAM_GRID, scoring=scoring, refit="roc_auc", cv=cv, n_jobs=n_jobs)
+        search.fit(X, y, groups=groups)
+        best_params = search.best_params_
+        mean_roc = float(search.cv_results_["mean_test_roc_auc"][search.best_index_])
+        mean_pr = float(search.cv_results_["mean_test_pr_auc"][search.best_index_])
+        pipe = search.best_estimator_
+        timings["grid_search_cv"] = time.perf_counter() - t0
+    else:
+        cv_res = cross_validate(pipe, X, y, groups=groups, cv=cv, scoring=scoring,
+                                return_estimator=True, n_jobs=n_jobs)
+        mean_roc = float(np.mean(cv_res["test_roc_auc"]))
+        mean_pr = float(np.mean(cv_res["test_pr_auc"]))
+        timings["cross_validate"] = time.perf_counter() - t0
+
+        # Fit final on all data
+        t0 = time.perf_counter()
+        pipe.fit(X, y)
+        timings["fit_final"] = time.perf_counter() - t0
+
+    # Compact artifact for sklearn-free serving, checked against the pipeline
+    # on the training rows after a round trip through JSON
+    compact = export_compact_model(pipe, list(X.columns))
+    compact_model = CompactModel.from_dict(json.loads(json.dumps(compact)))
+    compact_diff = float(np.max(np.abs(compact_model.predict_proba(X)[:, 1] - pipe.predict_proba(X)[:, 1])))
+    compact_ok = compact_diff <= COMPACT_MAX_DIFF
+    if not compact_ok:
+        # The sklearn model is still good; only the compact copy is not trusted
+        print(f"Warning: compact model disagrees with the sklearn pipeline (max |diff| {compact_diff:.3g}); "
+              f"not writing {COMPACT_MODEL_FILE}.", file=sys.stderr)
 
     os.makedirs(outdir, exist_ok=True)
     joblib.dump(pipe, os.path.join(outdir, "model.pkl"))
+    compact_path = os.path.join(outdir, COMPACT_MODEL_FILE)
+    if compact_ok:
+        with open(compact_path, "w") as f:
+            json.dump(compact, f, indent=2)
+    elif os.path.exists(compact_path):
+        os.remove(compact_path)  # from an earlier run: it no longer matches model.pkl
     with open(os.path.join(outdir, "metrics.txt"), "w") as f:
         f.write(f"ROC-AUC (GroupKFold mean): {mean_roc:.4f}\n")
         f.write(f"PR-AUC  (GroupKFold mean): {mean_pr:.4f}\n")
+        f.write(f"Compact model max |prob diff| vs pipeline: {compact_diff:.3g}"
+                f"{'' if compact_ok else f' (over {COMPACT_MAX_DIFF:g}; {COMPACT_MODEL_FILE} not written)'}\n")
+        if best_params is not None:
+            f.write("\nBest parameters (grid search):\n")
+            for k, v in best_params.items():
+                f.write(f"- {k}: {v}\n")
         f.write("\nFeatures used:\n")
         for c in X.columns:
             f.write(f"- {c}\n")
+        f.write(f"\nStage timings (seconds, workers={workers}):\n")
+        for stage, secs in timings.items():
+            f.write(f"- {stage}: {secs:.3f}\n")
 
-    print(f"Saved model to {os.path.join(outdir, 'model.pkl')}")
+    print(f"Saved model to {os.path.join(outdir, 'model.pkl')}"
+          + (f" (compact: {COMPACT_MODEL_FILE})" if compact_ok else ""))
     print(f"CV ROC-AUC: {mean_roc:.4f} | PR-AUC: {mean_pr:.4f}")
     print(f"Metrics written to {os.path.join(outdir, 'metrics.txt')}")
 
 
 def main():
     ap = argparse.ArgumentParser(description="Extract time-series features from scores and train burnout risk model.")
-    ap.add_argument("--scores", required=True, help="Path to scores.json (per-row: date, score, optional user_id).")
+    ap.add_argument("--scores", required=True,
+                    help="Path to scores (JSON array, NDJSON, CSV or Parquet; per-row: date, score, optional user_id).")
+    ap.add_argument("--scores-format", choices=SCORE_FORMATS,
+                    help="Scores file format (default: from the extension; .ndjson/.jsonl, .csv, .parquet, else json).")
+    ap.add_argument("--stream", action="store_true",
+                    help="Build features chunk by chunk with bounded memory; input rows must be grouped by user_id.")
+    ap.add_argument("--chunksize", type=int, default=500_000, help="Rows per chunk for NDJSON/CSV/Parquet input.")
     ap.add_argument("--labels", required=False, help="Path to labels.json (per-row: user_id, close_to_burnout).")
     ap.add_argument("--outdir", required=True, help="Output directory for features and model.")
     ap.add_argument("--user-id", required=False, help="User id to assign if scores.json lacks user_id.")
+    ap.add_argument("--engine", choices=["vectorized", "per-user"], default="vectorized",
+                    help="Feature engine: columnar over all users (default) or the per-user reference loop.")
+    ap.add_argument("--workers", type=int, default=1,
+                    help="Worker processes for feature building, CV folds and grid search (default: 1, serial).")
+    ap.add_argument("--grid", action="store_true",
+                    help="Search a small grid over LogisticRegression C and class_weight (uses --workers).")
+    ap.add_argument("--cache-dir", help="Per-user feature cache; only users whose score rows changed are recomputed.")
+    ap.add_argument("--evict-missing", action="store_true",
+                    help="Drop cached users that are no longer present in the scores input.")
+    ap.add_argument("--as-of", action="store_true",
+                    help="Also write features_asof.parquet: one row per (user_id, score date) using only prior scores.")
     args = ap.parse_args()
 
-    scores_df = load_scores(args.scores, args.user_id)
-    feat_df = build_feature_table(scores_df)
+    if args.stream and (args.as_of or args.engine == "per-user" or args.cache_dir):
+        ap.error("--stream cannot be combined with --as-of, --cache-dir or --engine per-user")
+    if args.evict_missing and not args.cache_dir:
+        ap.error("--evict-missing requires --cache-dir")
+
+    timings: Dict[str, float] = {}
+    t0 = time.perf_counter()
+    if args.stream:
+        chunks = iter_score_chunks(args.scores, args.user_id, args.scores_format, args.chunksize,
+                                   score_dtype="float32")
+        feat_df = build_feature_table_streaming(chunks)
+        timings["load_and_build_features"] = time.perf_counter() - t0
+    else:
+        scores_df = load_scores(args.scores, args.user_id, args.scores_format, args.chunksize)
+        timings["load_scores"] = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        if args.engine == "per-user":
+            feat_df = build_feature_table_per_user(scores_df)
+        elif args.cache_dir:
+            feat_df, stats = build_feature_table_cached(scores_df, args.cache_dir, workers=args.workers,
+                                                        evict_missing=args.evict_missing)
+            total = stats["hits"] + stats["misses"]
+            print(f"Feature cache: {stats['hits']} hits, {stats['misses']} misses "
+                  f"(hit ratio {stats['hits'] / total if total else 0.0:.1%}), "
+                  f"{stats['evicted']} evicted, {stats['stale']} cached users not in input")
+        else:
+            feat_df = build_feature_table(scores_df, workers=args.workers)
+        timings["build_features"] = time.perf_counter() - t0
 
     os.makedirs(args.outdir, exist_ok=True)
     feat_path = os.path.join(args.outdir, "features.csv")
     feat_df.to_csv(feat_path, index=False)
     print(f"Wrote features to {feat_path} (rows={len(feat_df)})")
 
+    if args.as_of:
+        asof_path = os.path.join(args.outdir, "features_asof.parquet")
+        n_rows = write_asof_features(scores_df, asof_path)
+        print(f"Wrote as-of features to {asof_path} (rows={n_rows})")
+
     # Train if labels provided
-    maybe_train(feat_df, args.labels, args.outdir)
+    maybe_train(feat_df, args.labels, args.outdir, workers=args.workers, grid=args.grid, timings=timings)
 
 
 if __name__ == "__main__":
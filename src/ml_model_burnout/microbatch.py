@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Dynamic micro-batching for request/response scoring.
+
+Request threads submit one item at a time and block on a Future. A collector
+thread takes the first queued item, keeps collecting until `window_s` has
+passed since that item arrived or `max_items` are waiting, groups the
+collected items by key (e.g. the pinned model entry) and hands each group to
+a worker pool as one call to `process(key, items)`. The collector goes
+straight back to the queue, so the next batch forms while the previous one
+is being scored.
+
+`process` returns one result per item, in order; a result that is an
+exception instance is raised in that item's caller only. If `process` itself
+raises, every item in the group gets the exception.
+
+stats() reports queue depth, batch sizes and per-item queue wait, which is
+what to look at when tuning the window: batches of 1 mean the window buys
+nothing, waits close to the window with full batches mean max_items is the
+limit.
+"""
+
+import queue, threading, time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+class MicroBatcher:
+    def __init__(self, process: Callable[[Any, List[Any]], List[Any]], window_s: float = 0.002,
+                 max_items: int = 64, workers: int = 2, name: str = "microbatch", recent: int = 2048):
+        if window_s < 0 or max_items < 1 or workers < 1:
+            raise ValueError("MicroBatcher needs window_s >= 0, max_items >= 1 and workers >= 1.")
+        self.process = process
+        self.window_s = window_s
+        self.max_items = max_items
+        self.workers = workers
+        self.name = name
+        self._queue: "queue.Queue[Tuple[Hashable, Any, Future, float]]" = queue.Queue()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{name}-worker")
+        self._stop = threading.Event()
+        self._collector: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._batches = 0
+        self._items = 0
+        self._errors = 0
+        self._max_batch = 0
+        self._size_hist = [0] * (len(BATCH_SIZE_BUCKETS) + 1)
+        self._waits: Deque[float] = deque(maxlen=recent)
+        self._process_times: Deque[float] = deque(maxlen=recent)
+
+    def start(self) -> None:
+        if self._collector is not None:
+            return
+        self._collector = threading.Thread(target=self._collect, name=f"{self.name}-collector", daemon=True)
+        self._collector.start()
+
+    def stop(self, wait: bool = True) -> None:
+        self._stop.set()
+        if self._collector is not None and wait:
+            self._collector.join()
+        self._pool.shutdown(wait=wait)
+
+    def submit(self, key: Hashable, item: Any) -> Future:
+        if self._stop.is_set():
+            raise RuntimeError(f"{self.name} is stopped.")
+        fut: Future = Future()
+        self._queue.put((key, item, fut, time.perf_counter()))
+        return fut
+
+    def _collect(self) -> None:
+        while not self._stop.is_set():
+            try:
+                first = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            batch = [first]
+            deadline = first[3] + self.window_s
+            while len(batch) < self.max_items:
+                remaining = deadline - time.perf_counter()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._dispatch(batch)
+        # Drain on stop so no caller waits forever
+        leftover = []
+        while True:
+            try:
+                leftover.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if leftover:
+            self._dispatch(leftover)
+
+    def _dispatch(self, batch: List[Tuple[Hashable, Any, Future, float]]) -> None:
+        now = time.perf_counter()
+        groups: Dict[Hashable, List[Tuple[Any, Future]]] = {}
+        for key, item, fut, _ in batch:
+            groups.setdefault(key, []).append((item, fut))
+        with self._lock:
+            self._waits.extend(now - t_in for _, _, _, t_in in batch)
+            self._in_flight += len(groups)
+        for key, entries in groups.items():
+            self._pool.submit(self._run, key, entries)
+
+    def _run(self, key: Hashable, entries: List[Tuple[Any, Future]]) -> None:
+        t0 = time.perf_counter()
+        try:
+            results = self.process(key, [item for item, _ in entries])
+            if len(results) != len(entries):
+                raise RuntimeError(f"{self.name}: process returned {len(results)} results for {len(entries)} items.")
+        except Exception as e:
+            results = [e] * len(entries)
+        failed = 0
+        for (_, fut), res in zip(entries, results):
+            if isinstance(res, BaseException):
+                failed += 1
+                fut.set_exception(res)
+            else:
+                fut.set_result(res)
+        n = len(entries)
+        with self._lock:
+            self._in_flight -= 1
+            self._batches += 1
+            self._items += n
+            self._errors += failed
+            self._max_batch = max(self._max_batch, n)
+            self._size_hist[sum(1 for b in BATCH_SIZE_BUCKETS if n > b)] += 1
+            self._process_times.append(time.perf_counter() - t0)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            waits = np.fromiter(self._waits, dtype="float64") * 1e3
+            proc = np.fromiter(self._process_times, dtype="float64") * 1e3
+            return {
+                "enabled": True,
+                "window_ms": self.window_s * 1e3,
+                "max_items": self.max_items,
+                "workers": self.workers,
+                "queue_depth": self._queue.qsize(),
+                "batches_in_flight": self._in_flight,
+                "batches": self._batches,
+                "items": self._items,
+                "item_errors": self._errors,
+                "batch_size_mean": self._items / self._batches if self._batches else 0.0,
+                "batch_size_max": self._max_batch,
+                # Batches with size <= le (le=None: larger than the last bucket)
+                "batch_size_histogram": [{"le": le, "count": c} for le, c in
+                                         zip(list(BATCH_SIZE_BUCKETS) + [None], self._size_hist)],
+                # Over the most recent items / batches
+                "queue_wait_ms": _summary(waits),
+                "process_ms": _summary(proc),
+            }
+
+
+def _summary(v: np.ndarray) -> Dict[str, float]:
+    if not len(v):
+        return {"n": 0}
+    p50, p95, p99 = np.percentile(v, [50, 95, 99])
+    return {"n": int(len(v)), "mean": float(v.mean()), "p50": float(p50), "p95": float(p95),
+            "p99": float(p99), "max": float(v.max())}
@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+"""
+Online (incremental) burnout features.
+
+UserFeatureState keeps a compact summary of one user's score history and
+updates it in O(1) per new quiz score, so a prediction no longer needs the
+full series. Its features() matches features_from_timeseries on the same
+history to floating-point tolerance.
+
+State per user:
+- count, Welford mean/M2, min, max, first/last date
+- EMA-7/14/28 accumulators, running peak and worst drawdown
+- cadence (days between scores) and change-per-day statistics
+- running sums for the overall slope
+- the last 3 scores and a ring buffer of the points in the last 56 days
+  (the longest slope window)
+
+median_change_per_day is the one feature with no O(1) form: its values are
+kept in a sorted list (O(log n) search, one float per score).
+
+Scores must arrive in date order per user (equal dates are fine); FeatureStore
+rejects older ones rather than silently diverging from the batch features.
+
+FeatureStore holds the states for all users. With a directory it persists
+them as a JSON snapshot plus an append-only NDJSON log of updates that is
+replayed on start-up and folded into the snapshot every `compact_every`
+updates. Each log starts with a header giving its generation, and the snapshot
+records the generation it covers, so a crash between writing the snapshot and
+starting the next log does not replay the old log on top of it.
+"""
+
+import bisect, json, math, os, threading
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from burnout_features import DAY_NS, FEATURE_NAMES
+EMA_SPANS = (7, 14, 28)
+SLOPE_WINDOWS = (14, 28, 56)
+
+
+def _to_ns(date: Any) -> int:
+    ts = pd.Timestamp(date)
+    if ts is pd.NaT:
+        raise ValueError(f"Could not parse date: {date!r}")
+    return int(ts.as_unit("ns").value)
+
+
+def _welford(n: int, mean: float, m2: float, x: float) -> Tuple[float, float]:
+    delta = x - mean
+    mean += delta / n
+    return mean, m2 + delta * (x - mean)
+
+
+def _slope(xs: List[float], ys: List[float], x_abs: float) -> float:
+    """Least-squares slope with the same edge cases as the batch _slope."""
+    n = len(ys)
+    if n < 2 or min(ys) == max(ys):
+        return 0.0
+    mx, my = sum(xs) / n, sum(ys) / n
+    sxx = sum((x - mx) ** 2 for x in xs)
+    if sxx == 0:
+        return my / (2 * x_abs)  # np.polyfit's minimum-norm solution for identical x
+    return sum((x - mx) * (y - my) for x, y in zip(xs, ys)) / sxx
+
+
+class UserFeatureState:
+    __slots__ = (
+        "n", "mean", "m2", "min", "max", "first_ns", "last_ns",
+        "ema", "peak", "max_dd",
+        "roll_n", "roll_mean", "roll_m2",
+        "cad_mean", "cad_m2",
+        "cpd_n", "cpd_sum", "cpd_sorted",
+        "sx", "sy", "sxx", "sxy",
+        "last3", "window",
+    )
+
+    def __init__(self) -> None:
+        self.n = 0
+        self.mean = self.m2 = 0.0
+        self.min = self.max = math.nan
+        self.first_ns = self.last_ns = 0
+        self.ema: Dict[int, float] = {}
+        self.peak = -math.inf
+        self.max_dd = 0.0
+        self.roll_n, self.roll_mean, self.roll_m2 = 0, 0.0, 0.0
+        self.cad_mean = self.cad_m2 = 0.0
+        self.cpd_n, self.cpd_sum = 0, 0.0
+        self.cpd_sorted: List[float] = []
+        # Overall slope: sums over x = days since first score
+        self.sx = self.sy = self.sxx = self.sxy = 0.0
+        self.last3: Deque[float] = deque(maxlen=3)
+        self.window: Deque[Tuple[int, float]] = deque()  # (date_ns, score) within max(SLOPE_WINDOWS) days
+
+    def update(self, date_ns: int, score: float) -> None:
+        score = float(score)
+        if math.isnan(score):
+            return
+        if self.n and date_ns < self.last_ns:
+            raise ValueError("Scores must be added in date order; got a date before the latest score.")
+
+        prev_ns = self.last_ns
+        prev = self.last3[-1] if self.last3 else math.nan
+        self.n += 1
+        if self.n == 1:
+            self.first_ns = date_ns
+        self.last_ns = date_ns
+        self.mean, self.m2 = _welford(self.n, self.mean, self.m2, score)
+        self.min = score if self.n == 1 else min(self.min, score)
+        self.max = score if self.n == 1 else max(self.max, score)
+
+        for span in EMA_SPANS:
+            a = 2.0 / (span + 1)
+            self.ema[span] = score if self.n == 1 else (1 - a) * self.ema[span] + a * score
+
+        self.peak = max(self.peak, score)
+        self.max_dd = min(self.max_dd, score - self.peak)
+
+        self.last3.append(score)
+        if self.n >= 2:
+            r = sum(self.last3) / len(self.last3)
+            self.roll_n += 1
+            self.roll_mean, self.roll_m2 = _welford(self.roll_n, self.roll_mean, self.roll_m2, r)
+
+            days = (date_ns - prev_ns) // DAY_NS
+            self.cad_mean, self.cad_m2 = _welford(self.n - 1, self.cad_mean, self.cad_m2, float(days))
+            if days != 0:
+                cpd = (score - prev) / days
+                self.cpd_n += 1
+                self.cpd_sum += cpd
+                bisect.insort(self.cpd_sorted, cpd)
+
+        x = (date_ns - self.first_ns) / DAY_NS
+        self.sx += x
+        self.sy += score
+        self.sxx += x * x
+        self.sxy += x * score
+
+        self.window.append((date_ns, score))
+        cutoff = date_ns - max(SLOPE_WINDOWS) * DAY_NS
+        while self.window[0][0] < cutoff:
+            self.window.popleft()
+
+    def _slope_all(self) -> float:
+        n = self.n
+        if n < 2 or self.min == self.max:
+            return 0.0
+        sxx = self.sxx - self.sx * self.sx / n
+        if sxx <= 0:
+            return (self.sy / n) / (2 * self.first_ns / DAY_NS)
+        return (self.sxy - self.sx * self.sy / n) / sxx
+
+    def features(self) -> Dict[str, float]:
+        n = self.n
+        if n == 0:
+            return {k: 0.0 for k in FEATURE_NAMES}
+        last = self.last3[-1]
+        x_last = self.last_ns / DAY_NS
+        recent = list(self.last3)
+        recent_mean = sum(recent) / len(recent)
+
+        f: Dict[str, float] = {
+            "count_points": float(n),
+            "span_days": float((self.last_ns - self.first_ns) // DAY_NS) if n >= 2 else 0.0,
+            "mean_score": self.mean,
+            "std_score": math.sqrt(self.m2 / (n - 1)) if n > 1 else 0.0,
+            "min_score": self.min,
+            "max_score": self.max,
+            "last_score": last,
+        }
+        for span in EMA_SPANS:
+            f[f"last_minus_ema{span}"] = last - self.ema[span]
+
+        f["slope_all"] = self._slope_all()
+        for days in SLOPE_WINDOWS:
+            cutoff = self.last_ns - days * DAY_NS
+            pts = [(d, s) for d, s in self.window if d >= cutoff]
+            # Shift x to the last date for stability; the slope is shift-invariant
+            f[f"slope_{days}d"] = _slope([d / DAY_NS - x_last for d, _ in pts], [s for _, s in pts], x_last)
+
+        f["rolling3_std"] = math.sqrt(self.roll_m2 / (self.roll_n - 1)) if self.roll_n > 1 else 0.0
+        f["recent_mean_3"] = recent_mean
+        f["recent_std_3"] = (math.sqrt(sum((v - recent_mean) ** 2 for v in recent) / (len(recent) - 1))
+                             if n >= 2 else 0.0)
+
+        m = self.cpd_n
+        f["mean_change_per_day"] = self.cpd_sum / m if m else 0.0
+        f["median_change_per_day"] = (self.cpd_sorted[(m - 1) // 2] + self.cpd_sorted[m // 2]) / 2 if m else 0.0
+
+        f["max_drawdown"] = self.max_dd
+        cad_mean = self.cad_mean if n > 1 else 0.0
+        cad_std = math.sqrt(self.cad_m2 / (n - 2)) if n > 2 else 0.0
+        f["cadence_mean_days"] = cad_mean
+        f["cadence_cv"] = cad_std / cad_mean if cad_mean else 0.0
+
+        f["last2_diff"] = last - recent[-2] if n >= 2 else 0.0
+        f["last3_diff"] = last - recent[-3] if n >= 3 else 0.0
+
+        return {k: (float(f[k]) if np.isfinite(f[k]) else 0.0) for k in FEATURE_NAMES}
+
+    def to_dict(self) -> Dict[str, Any]:
+        d = {k: getattr(self, k) for k in self.__slots__}
+        d["ema"] = {str(k): v for k, v in self.ema.items()}
+        d["last3"] = list(self.last3)
+        d["window"] = [list(p) for p in self.window]
+        return d
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "UserFeatureState":
+        st = cls()
+        for k in cls.__slots__:
+            setattr(st, k, d[k])
+        st.ema = {int(k): v for k, v in d["ema"].items()}
+        st.last3 = deque(d["last3"], maxlen=3)
+        st.window = deque(tuple(p) for p in d["window"])
+        return st
+
+
+class FeatureStore:
+    """Per-user UserFeatureState, optionally persisted under `directory`."""
+
+    SNAPSHOT = "state.json"
+    LOG = "updates.ndjson"
+
+    def __init__(self, directory: Optional[str] = None, compact_every: int = 10000):
+        self.directory = directory
+        self.compact_every = compact_every
+        self._states: Dict[str, UserFeatureState] = {}
+        self._lock = threading.Lock()
+        self._log = None
+        self._log_lines = 0
+        self._generation = 0  # of the current log; a log without a header is 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._load()
+            self._log = open(os.path.join(directory, self.LOG), "a")
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def get(self, user_id: str) -> Optional[UserFeatureState]:
+        return self._states.get(str(user_id))
+
+    def features(self, user_id: str) -> Optional[Dict[str, float]]:
+        """The user's features, computed under the lock so no update interleaves; None if no scores."""
+        with self._lock:
+            st = self._states.get(str(user_id))
+            return st.features() if st is not None and st.n else None
+
+    def update(self, user_id: str, date: Any, score: Any) -> UserFeatureState:
+        """Apply one score; raises ValueError for unparseable or out-of-order rows."""
+        uid = str(user_id)
+        date_ns = _to_ns(date)
+        score = float(score)
+        with self._lock:
+            st = self._states.get(uid) or UserFeatureState()
+            if math.isnan(score):
+                return st
+            st.update(date_ns, score)
+            self._states[uid] = st
+            self._append({"user_id": uid, "date_ns": date_ns, "score": score})
+        return st
+
+    def update_many(self, user_id: str, series: List[Dict[str, Any]], reset: bool = False) -> UserFeatureState:
+        """Apply a series (sorted by date here); reset=True rebuilds the user's state from it."""
+        rows = sorted(((_to_ns(r.get("date")), float(r["score"])) for r in series if r.get("score") is not None),
+                      key=lambda p: p[0])
+        rows = [(d, s) for d, s in rows if not math.isnan(s)]
+        uid = str(user_id)
+        with self._lock:
+            st = UserFeatureState() if reset else (self._states.get(uid) or UserFeatureState())
+            if rows and st.n and rows[0][0] < st.last_ns:
+                raise ValueError("Scores must be added in date order; got a date before the latest score.")
+            if reset:
+                self._append({"user_id": uid, "reset": True})
+            for date_ns, score in rows:
+                st.update(date_ns, score)
+                self._append({"user_id": uid, "date_ns": date_ns, "score": score})
+            self._states[uid] = st
+        return st
+
+    def _append(self, rec: Dict[str, Any]) -> None:
+        if self._log is None:
+            return
+        self._log.write(json.dumps(rec) + "\n")
+        self._log.flush()
+        self._log_lines += 1
+        if self._log_lines >= self.compact_every:
+            self._compact()
+
+    def _load(self) -> None:
+        snap = os.path.join(self.directory, self.SNAPSHOT)
+        covers = -1  # generation of the last log folded into the snapshot
+        if os.path.exists(snap):
+            with open(snap) as f:
+                data = json.load(f)
+            if "states" in data and "covers" in data:
+                covers, data = data["covers"], data["states"]
+            self._states = {uid: UserFeatureState.from_dict(d) for uid, d in data.items()}
+        log = os.path.join(self.directory, self.LOG)
+        if not os.path.exists(log) or not os.path.getsize(log):
+            self._start_log(covers + 1)
+            return
+        good = 0  # offset just past the last complete record
+        with open(log, "rb") as f:
+            first = f.readline()
+            try:
+                header = json.loads(first)
+            except ValueError:
+                header = {}
+            if "generation" in header:
+                self._generation = header["generation"]
+                good = len(first)
+            else:
+                f.seek(0)  # a log from before generations: 0
+            if self._generation <= covers:
+                # Crashed after the snapshot was written but before the log was
+                # replaced: these records are already in the snapshot.
+                self._start_log(covers + 1)
+                return
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    break  # torn last line from a crash mid-write
+                good += len(line)
+                if rec.get("reset"):
+                    self._states[rec["user_id"]] = UserFeatureState()
+                    continue
+                st = self._states.setdefault(rec["user_id"], UserFeatureState())
+                try:
+                    st.update(rec["date_ns"], rec["score"])
+                except ValueError:
+                    pass
+                self._log_lines += 1
+        # Cut off a torn line (and end a record that lost only its newline)
+        # so that records appended from now on start on a line of their own.
+        with open(log, "r+b") as f:
+            f.truncate(good)
+            if good:
+                f.seek(good - 1)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")
+
+    def _start_log(self, generation: int) -> None:
+        """Atomically replace the log with an empty one of the given generation."""
+        log = os.path.join(self.directory, self.LOG)
+        tmp = log + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(json.dumps({"generation": generation}) + "\n")
+        os.replace(tmp, log)
+        self._generation = generation
+        self._log_lines = 0
+
+    def _compact(self) -> None:
+        """Write a snapshot atomically, then start a new update log (caller holds the lock)."""
+        snap = os.path.join(self.directory, self.SNAPSHOT)
+        tmp = snap + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"covers": self._generation,
+                       "states": {uid: st.to_dict() for uid, st in self._states.items()}}, f)
+        os.replace(tmp, snap)
+        if self._log is not None:
+            self._log.close()
+        self._start_log(self._generation + 1)
+        self._log = open(os.path.join(self.directory, self.LOG), "a")
+
+    def save(self) -> None:
+        if self.directory:
+            with self._lock:
+                self._compact()
@@ -6,7 +6,28 @@ Start:
   flask --app predict_service run --host=0.0.0.0 --port=8000
 
 Env:
-  MODEL_PATH=/path/to/model.pkl  (default: ./model.pkl)
+  MODEL_PATH=/path/to/model.pkl  (default: ./model.pkl; a .json path loads the compact
+                                  export from training and scores with numpy only)
+  MODEL_PATHS=b=/path/b.pkl,c=/path/c.json  (optional extra named models for A/B scoring)
+  MODEL_RELOAD_INTERVAL=5  (seconds between checks for changed model files; 0 disables)
+  FEATURE_STORE_DIR=./feature_store  (persisted per-user online feature state; empty = memory only)
+  MICROBATCH_WINDOW_MS=0  (>0 enables micro-batching of /predict and /predict/<id>, see below)
+  MICROBATCH_MAX_ITEMS=64  (max requests per micro-batch)
+  MICROBATCH_WORKERS=2  (threads extracting features and scoring micro-batches)
+  PREDICTION_CACHE_SIZE=10000  (cached /predict results, LRU; 0 disables)
+  PREDICTION_CACHE_TTL=300  (seconds a cached result stays valid)
+  BATCH_CHUNK_SIZE=1024  (items per predict_proba call when streaming NDJSON batches)
+
+Models are loaded once at startup and kept in memory. A model's version is the
+content of '<model path>.version' if present, otherwise the file's mtime;
+when either changes the model is reloaded in the background and swapped in
+atomically. Write new models to a temp file and rename them into place.
+Select a model per request with ?model=<name> (or "model" in the JSON body);
+the default model is named "default".
+
+Compact models (model.json, see burnout_model.py) give the same probabilities
+as the pickled sklearn pipeline without its per-call overhead, and a service
+that serves only compact models never imports sklearn or joblib.
 
 Request (JSON):
 {
@@ -22,173 +43,474 @@ Response:
 {
   "user_id": "u1",
   "prob_close_to_burnout": 0.78,
+  "model": "default",
+  "model_version": "mtime-1736035200",
   "features": {...}
 }
+
+Batch request (POST /predict/batch):
+  JSON:   {"items": [{"user_id": "u1", "series": [...]}, ...]}  (or a bare list)
+  NDJSON: Content-Type: application/x-ndjson, one {"user_id", "series"} object per line
+
+Batch response: one result per item, in request order. Items that fail carry
+an "error" instead of a probability; the rest of the batch is still scored.
+  JSON:   {"count": 2, "errors": 1, "results": [{"index": 0, "user_id": "u1",
+           "prob_close_to_burnout": 0.78, "features": {...}},
+           {"index": 1, "user_id": "u2", "error": "..."}]}
+  NDJSON: (when the request is NDJSON or Accept: application/x-ndjson)
+          one result object per line, streamed as chunks are scored
+
+Online scoring (features kept incrementally per user, see online_features.py):
+  POST /scores            {"user_id": "u1", "date": "2025-01-27", "score": 70}
+                          or {"user_id": "u1", "series": [...], "reset": true}
+                          Scores must not be older than the user's latest one.
+  GET|POST /predict/<id>  scores the stored state; same response as /predict
+
+Micro-batching (MICROBATCH_WINDOW_MS > 0, see microbatch.py): concurrent
+/predict and /predict/<id> calls are queued instead of scored one by one.
+Requests arriving within the window of the first one (or until
+MICROBATCH_MAX_ITEMS are waiting) are scored together by a worker thread:
+features per request, then one predict_proba / numpy pass per model. Run the
+app with a threaded server (flask run, gunicorn --threads) so requests can
+wait concurrently. Each caller gets its own result or error; responses are
+unchanged apart from timing.
+
+Prediction cache: /predict results are cached per (model, model version,
+series fingerprint); the fingerprint hashes the parsed (date, score) pairs in
+date order, so re-sent or reordered copies of a series hit. A model swap drops
+that model's entries. "Cache-Control: no-cache" recomputes and refreshes the
+entry, "no-store" bypasses the cache entirely; the X-Cache response header
+says hit, miss or bypass.
+
+  GET /stats  micro-batcher queue depth, batch sizes and queue wait;
+              prediction cache hit ratio, evictions and expirations
 """
 
-from flask import Flask, request, jsonify
-from typing import List, Optional, Dict, Any
+from flask import Flask, request, jsonify, Response, stream_with_context
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable, Iterable, Iterator, List, Optional, Dict, Any, Tuple
+import atexit
+import json
+import logging
 import os
+import threading
 import numpy as np
 import pandas as pd
-import joblib
 
-# ---------- Feature extraction (must match training pipeline) ----------
+from burnout_features import FEATURE_NAMES, features_for_groups, features_from_records, series_fingerprint
+from burnout_model import CompactModel
+from microbatch import MicroBatcher
+from online_features import FeatureStore
+from ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# ---------- Batch feature extraction ----------
+
+def _parse_batch_dates(raw_dates: pd.Series) -> pd.Series:
+    """Naive datetimes in UTC (offsets converted, as burnout_features.parse_dates does); NaT if unparseable."""
+    parsed = pd.to_datetime(raw_dates, errors="coerce", format="ISO8601", utc=True)
+    retry = parsed.isna() & raw_dates.notna()
+    if retry.any():
+        parsed[retry] = pd.to_datetime(raw_dates[retry], errors="coerce", format="mixed", utc=True)
+    return parsed.dt.tz_localize(None)
 
-def _as_day_index(series_datetime: pd.Series) -> np.ndarray:
-    return series_datetime.view("int64") / (24*3600*1e9)
+def _batch_frame(items: List[Any]):
+    """Flatten many {user_id, series} items into one long frame of rows.
 
-def _slope(y: pd.Series, x: Optional[pd.Series] = None) -> float:
-    if len(y) < 2 or y.std(skipna=True) == 0:
-        return 0.0
-    if x is None:
-        x = pd.Series(np.arange(len(y)), index=y.index)
-    msk = np.isfinite(y.values) & np.isfinite(x.values)
-    if msk.sum() < 2:
-        return 0.0
+    Returns (frame with item/date/score columns, {item index: error message}).
+    Items that are malformed contribute no rows and get an error instead.
+    """
+    errors: Dict[int, str] = {}
+    item_idx: List[int] = []
+    dates: List[Any] = []
+    scores: List[Any] = []
+    for i, item in enumerate(items):
+        if isinstance(item, ValueError):  # undecodable NDJSON line
+            errors[i] = str(item)
+            continue
+        series = item.get("series", []) if isinstance(item, dict) else None
+        if not isinstance(series, list) or not all(isinstance(r, dict) for r in series):
+            errors[i] = "Each item must be an object with a 'series' list of records."
+            continue
+        if not any("date" in r for r in series) or not any("score" in r for r in series):
+            errors[i] = "Each record must include 'date' and 'score'."
+            continue
+        item_idx.extend([i] * len(series))
+        dates.extend(r.get("date") for r in series)
+        scores.extend(r.get("score") for r in series)
+
+    raw_dates = pd.Series(dates, dtype="object")
     try:
-        return float(np.polyfit(x.values[msk], y.values[msk], 1)[0])
-    except Exception:
-        return 0.0
-
-def _window_slope(df: pd.DataFrame, days: int) -> float:
-    if df.empty:
-        return 0.0
-    cutoff = df["date"].max() - pd.Timedelta(days=days)
-    sub = df[df["date"] >= cutoff]
-    if len(sub) < 2:
-        return 0.0
-    return _slope(sub["score"], _as_day_index(sub["date"]))
-
-def _max_drawdown(values: pd.Series) -> float:
-    if values.empty:
-        return 0.0
-    peak = values.cummax()
-    drawdown = values - peak
-    return float(drawdown.min())
-
-def _safe_std(x: pd.Series) -> float:
-    return float(x.std()) if len(x) > 1 else 0.0
-
-def _ema(x: pd.Series, span: int) -> pd.Series:
-    return x.ewm(span=span, adjust=False).mean()
-
-def features_from_timeseries(records: List[Dict[str, Any]]) -> Dict[str, float]:
-    df = pd.DataFrame(records)
-    if "date" not in df or "score" not in df:
-        raise ValueError("Each record must include 'date' and 'score'.")
-    df["date"] = pd.to_datetime(df["date"])
-    df = df.sort_values("date").dropna(subset=["score"])
-    df["score"] = pd.to_numeric(df["score"], errors="coerce")
-    df = df.dropna(subset=["score"])
-
-    df["delta_score"] = df["score"].diff()
-    df["days_between"] = df["date"].diff().dt.days
-    df["change_per_day"] = df["delta_score"] / df["days_between"].replace(0, np.nan)
-
-    n = len(df)
-    if n == 0:
-        raise ValueError("No valid rows after parsing date/score.")
-
-    span_days = (df["date"].iloc[-1] - df["date"].iloc[0]).days if n >= 2 else 0
-
-    slope_all = _slope(df["score"], _as_day_index(df["date"]))
-    slope_14 = _window_slope(df, 14)
-    slope_28 = _window_slope(df, 28)
-    slope_56 = _window_slope(df, 56)
-
-    rolling3_std = _safe_std(df["score"].rolling(3, min_periods=2).mean().dropna())
-    recent_mean_3 = df["score"].tail(3).mean() if n >= 1 else np.nan
-    recent_std_3 = df["score"].tail(3).std() if n >= 2 else 0.0
-
-    ema_7 = _ema(df["score"], 7)
-    ema_14 = _ema(df["score"], 14)
-    ema_28 = _ema(df["score"], 28)
-
-    last = df["score"].iloc[-1] if n else np.nan
-    max_dd = _max_drawdown(df["score"])
-
-    cadence_mean = float(df["days_between"].dropna().mean()) if n > 1 else 0.0
-    cadence_std = float(df["days_between"].dropna().std()) if n > 2 else 0.0
-    cadence_cv = (cadence_std / cadence_mean) if cadence_mean else 0.0
-
-    last_2 = df["score"].iloc[-2] if n >= 2 else np.nan
-    last_3 = df["score"].iloc[-3] if n >= 3 else np.nan
-
-    f: Dict[str, float] = {
-        "count_points": float(n),
-        "span_days": float(span_days),
-        "mean_score": float(df["score"].mean()) if n else np.nan,
-        "std_score": float(df["score"].std()) if n > 1 else 0.0,
-        "min_score": float(df["score"].min()) if n else np.nan,
-        "max_score": float(df["score"].max()) if n else np.nan,
-        "last_score": float(last) if n else np.nan,
-        "last_minus_ema7": float(last - ema_7.iloc[-1]) if n else 0.0,
-        "last_minus_ema14": float(last - ema_14.iloc[-1]) if n else 0.0,
-        "last_minus_ema28": float(last - ema_28.iloc[-1]) if n else 0.0,
-        "slope_all": float(slope_all),
-        "slope_14d": float(slope_14),
-        "slope_28d": float(slope_28),
-        "slope_56d": float(slope_56),
-        "rolling3_std": float(rolling3_std),
-        "recent_mean_3": float(recent_mean_3) if not np.isnan(recent_mean_3) else 0.0,
-        "recent_std_3": float(recent_std_3),
-        "mean_change_per_day": float(df["change_per_day"].mean(skipna=True)) if n > 1 else 0.0,
-        "median_change_per_day": float(df["change_per_day"].median(skipna=True)) if n > 1 else 0.0,
-        "max_drawdown": float(max_dd),
-        "cadence_mean_days": float(cadence_mean),
-        "cadence_cv": float(cadence_cv),
-        "last2_diff": float(last - last_2) if n >= 2 else 0.0,
-        "last3_diff": float(last - last_3) if n >= 3 else 0.0,
-    }
-    for k, v in list(f.items()):
-        if isinstance(v, float) and (not np.isfinite(v)):
-            f[k] = 0.0
-    return f
+        parsed = _parse_batch_dates(raw_dates)
+    except (ValueError, TypeError, OverflowError):
+        # one item's dates must not fail the whole batch: parse item by item
+        parsed = pd.Series(pd.NaT, index=raw_dates.index, dtype="datetime64[ns]")
+        idx = np.asarray(item_idx, dtype="int64")
+        for i in np.unique(idx):
+            mask = idx == i
+            try:
+                parsed[mask] = _parse_batch_dates(raw_dates[mask]).to_numpy()
+            except (ValueError, TypeError, OverflowError):
+                errors[int(i)] = "Could not parse one or more 'date' values."
+    frame = pd.DataFrame({"item": np.asarray(item_idx, dtype="int64"), "date": parsed, "score": scores})
+    for i in frame.loc[frame["date"].isna() & raw_dates.notna().to_numpy(), "item"].unique():
+        errors[int(i)] = "Could not parse one or more 'date' values."
+    return frame, errors
+
+
+def batch_features(items: List[Any]):
+    """Features for many series in one vectorized pass.
+
+    Returns (DataFrame of FEATURE_NAMES with one row per item, {index: error}).
+    Rows of failed items are present but must not be used.
+    """
+    frame, errors = _batch_frame(items)
+    feats = features_for_groups(frame["item"].to_numpy(), frame["date"], frame["score"], len(items))
+    X = pd.DataFrame(feats, columns=FEATURE_NAMES)
+    for i in np.flatnonzero(X["count_points"].to_numpy() == 0):
+        errors.setdefault(int(i), "No valid rows after parsing date/score.")
+    return X, errors
+
+# ---------- Model registry ----------
+
+def _load_model(path: str) -> Any:
+    if path.endswith(".json"):
+        return CompactModel.load(path)
+    import joblib  # sklearn pickles only; keeps sklearn out of compact-only services
+    return joblib.load(path)
+
+@dataclass(frozen=True)
+class LoadedModel:
+    name: str
+    path: str
+    model: Any
+    version: str
+    mtime: float
+    loaded_at: float
+
+class ModelRegistry:
+    """Named models kept resident in memory and hot-swapped when their files change.
+
+    Loads happen under a lock, off to the side; the new entry replaces the old
+    one with a single dict assignment, so requests that already hold a
+    LoadedModel finish with it and no request ever sees a half-loaded model.
+    """
+
+    def __init__(self, paths: Dict[str, str], default: str = "default", reload_interval: float = 5.0):
+        self.paths = dict(paths)
+        self.default = default
+        self.reload_interval = reload_interval
+        self._models: Dict[str, LoadedModel] = {}
+        self._errors: Dict[str, str] = {}
+        self._load_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+        self._on_swap: List[Callable[[LoadedModel], None]] = []
+
+    def on_swap(self, callback: Callable[[LoadedModel], None]) -> None:
+        """Call `callback(new_entry)` whenever a model is (re)loaded."""
+        self._on_swap.append(callback)
+
+    @staticmethod
+    def _fingerprint(path: str) -> Optional[Tuple[float, str]]:
+        if not os.path.exists(path):
+            return None
+        mtime = os.path.getmtime(path)
+        version_file = path + ".version"
+        if os.path.exists(version_file):
+            with open(version_file) as f:
+                return mtime, f.read().strip()
+        return mtime, f"mtime-{int(mtime)}"
+
+    def refresh(self, name: Optional[str] = None) -> List[str]:
+        """(Re)load models whose file or version changed; returns the swapped names."""
+        swapped = []
+        with self._load_lock:
+            for n in [name] if name else list(self.paths):
+                path = self.paths[n]
+                try:
+                    fp = self._fingerprint(path)
+                except OSError as e:  # removed or replaced between the checks
+                    self._errors[n] = f"{type(e).__name__}: {e}"
+                    continue
+                current = self._models.get(n)
+                if fp is None or (current and (current.mtime, current.version) == fp):
+                    continue
+                try:
+                    model = _load_model(path)
+                except Exception as e:
+                    # Keep serving the previous model; retried on the next check
+                    self._errors[n] = f"{type(e).__name__}: {e}"
+                    continue
+                self._models[n] = LoadedModel(n, path, model, fp[1], fp[0], datetime.now(timezone.utc).timestamp())
+                self._errors.pop(n, None)
+                swapped.append(n)
+                for callback in self._on_swap:
+                    try:
+                        callback(self._models[n])
+                    except Exception:
+                        logger.exception("on_swap callback failed for model %r", n)
+        return swapped
+
+    def get(self, name: Optional[str] = None) -> LoadedModel:
+        name = name or self.default
+        if name not in self.paths:
+            raise ValueError(f"Unknown model: {name}")
+        entry = self._models.get(name)
+        if entry is None:
+            self.refresh(name)
+            entry = self._models.get(name)
+        if entry is None:
+            raise FileNotFoundError(f"Model '{name}' not available: {self.paths[name]}")
+        return entry
+
+    def start(self) -> None:
+        if self.reload_interval <= 0 or self._watcher is not None:
+            return
+        self._watcher = threading.Thread(target=self._watch, name="model-registry-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _watch(self) -> None:
+        # Nothing may escape: an exception would end the thread and hot reload with it
+        while not self._stop.wait(self.reload_interval):
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception("Model reload check failed; retrying in %.1fs", self.reload_interval)
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        out = {}
+        for n, path in self.paths.items():
+            entry = self._models.get(n)
+            out[n] = {
+                "path": path,
+                "exists": os.path.exists(path),
+                "loaded": entry is not None,
+                "version": entry.version if entry else None,
+                "loaded_at": datetime.fromtimestamp(entry.loaded_at, timezone.utc).isoformat() if entry else None,
+                "error": self._errors.get(n),
+            }
+        return out
+
+def _model_paths() -> Dict[str, str]:
+    paths = {"default": MODEL_PATH}
+    for spec in filter(None, (p.strip() for p in os.getenv("MODEL_PATHS", "").split(","))):
+        name, _, path = spec.partition("=")
+        if not path:
+            raise ValueError(f"MODEL_PATHS entries must look like name=/path/model.pkl, got: {spec}")
+        paths[name.strip()] = path.strip()
+    return paths
 
 # ---------- Flask app ----------
 
 MODEL_PATH = os.getenv("MODEL_PATH", "./model.pkl")
+MODEL_RELOAD_INTERVAL = float(os.getenv("MODEL_RELOAD_INTERVAL", "5"))
+BATCH_CHUNK_SIZE = int(os.getenv("BATCH_CHUNK_SIZE", "1024"))  # items per predict_proba call when streaming
+FEATURE_STORE_DIR = os.getenv("FEATURE_STORE_DIR", "./feature_store")
+MICROBATCH_WINDOW_MS = float(os.getenv("MICROBATCH_WINDOW_MS", "0"))
+MICROBATCH_MAX_ITEMS = int(os.getenv("MICROBATCH_MAX_ITEMS", "64"))
+MICROBATCH_WORKERS = int(os.getenv("MICROBATCH_WORKERS", "2"))
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "10000"))
+PREDICTION_CACHE_TTL = float(os.getenv("PREDICTION_CACHE_TTL", "300"))
+NDJSON = "application/x-ndjson"
 
-app = Flask(__name__)
+registry = ModelRegistry(_model_paths(), reload_interval=MODEL_RELOAD_INTERVAL)
+prediction_cache: Optional[TTLCache] = None
+if PREDICTION_CACHE_SIZE > 0:
+    prediction_cache = TTLCache(PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL)
+    registry.on_swap(lambda entry: prediction_cache.invalidate(lambda key: key[0] == entry.name))
+registry.refresh()
+registry.start()
 
-def _load_model():
-    if not os.path.exists(MODEL_PATH):
-        raise FileNotFoundError(f"MODEL_PATH not found: {MODEL_PATH}")
-    return joblib.load(MODEL_PATH)
+feature_store = FeatureStore(FEATURE_STORE_DIR or None)
+atexit.register(feature_store.save)
+
+app = Flask(__name__)
 
 @app.route("/health", methods=["GET"])
 def health():
+    models = registry.status()
     return jsonify({
         "status": "ok",
         "model_path": MODEL_PATH,
-        "model_exists": os.path.exists(MODEL_PATH)
+        "model_exists": os.path.exists(MODEL_PATH),
+        "model_version": models["default"]["version"],
+        "model_loaded_at": models["default"]["loaded_at"],
+        "models": models,
+    })
+
+@app.route("/stats", methods=["GET"])
+def stats():
+    return jsonify({
+        "batching": batcher.stats() if batcher is not None else {"enabled": False},
+        "prediction_cache": prediction_cache.stats() if prediction_cache is not None else {"enabled": False},
     })
 
+def _predict_proba(model, X: pd.DataFrame) -> np.ndarray:
+    try:
+        return model.predict_proba(X)[:, 1]
+    except Exception:
+        if hasattr(model, "feature_names_in_"):
+            cols_needed = list(model.feature_names_in_)
+            for c in cols_needed:
+                if c not in X.columns:
+                    X[c] = 0.0
+            X = X[cols_needed]
+            return model.predict_proba(X)[:, 1]
+        raise
+
+def _predict_one(model, feats: Dict[str, float]) -> float:
+    if isinstance(model, CompactModel):
+        return model.predict_one(feats)
+    return float(_predict_proba(model, pd.DataFrame([feats]))[0])
+
+def _score_requests(entry: "LoadedModel", items: List[Tuple[str, Any]]) -> List[Any]:
+    """Micro-batch worker: items are ("series", records) or ("features", dict).
+
+    Returns (features, probability) per item, or the exception that item raised.
+    """
+    feats: List[Any] = []
+    for kind, payload in items:
+        try:
+            feats.append(features_from_records(payload) if kind == "series" else payload)
+        except Exception as e:
+            feats.append(e)
+    ok = [i for i, f in enumerate(feats) if not isinstance(f, Exception)]
+    probs = _predict_proba(entry.model, pd.DataFrame([feats[i] for i in ok])) if ok else []
+    out: List[Any] = list(feats)
+    for i, p in zip(ok, probs):
+        out[i] = (feats[i], float(p))
+    return out
+
+def _score_one(entry: "LoadedModel", kind: str, payload: Any) -> Tuple[Dict[str, float], float]:
+    if batcher is not None:
+        return batcher.submit(entry, (kind, payload)).result()
+    feats = features_from_records(payload) if kind == "series" else payload
+    return feats, _predict_one(entry.model, feats)
+
+def _score_items(model, items: List[Any], offset: int = 0) -> List[Dict[str, Any]]:
+    """Score a batch with a single predict_proba call; per-item errors are reported inline."""
+    X, errors = batch_features(items)
+    ok = [i for i in range(len(items)) if i not in errors]
+    probs = _predict_proba(model, X.iloc[ok].reset_index(drop=True)) if ok else []
+    prob_by_item = dict(zip(ok, probs))
+    results = []
+    for i, item in enumerate(items):
+        res: Dict[str, Any] = {
+            "index": offset + i,
+            "user_id": item.get("user_id") if isinstance(item, dict) else None,
+        }
+        if i in errors:
+            res["error"] = errors[i]
+        else:
+            res["prob_close_to_burnout"] = float(prob_by_item[i])
+            res["features"] = {k: float(v) for k, v in X.iloc[i].items()}
+        results.append(res)
+    return results
+
+def _ndjson_items(lines: Iterable[bytes]) -> Iterator[Any]:
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            yield ValueError(f"Invalid JSON line: {e}")
+
+def _score_stream(model, items: Iterable[Any]) -> Iterator[str]:
+    """Score NDJSON items in chunks of BATCH_CHUNK_SIZE, yielding one line per result."""
+    chunk: List[Any] = []
+    offset = 0
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= BATCH_CHUNK_SIZE:
+            for r in _score_items(model, chunk, offset):
+                yield json.dumps(r) + "\n"
+            offset += len(chunk)
+            chunk = []
+    for r in _score_items(model, chunk, offset):
+        yield json.dumps(r) + "\n"
+
+batcher: Optional[MicroBatcher] = None
+if MICROBATCH_WINDOW_MS > 0:
+    batcher = MicroBatcher(_score_requests, window_s=MICROBATCH_WINDOW_MS / 1e3,
+                           max_items=MICROBATCH_MAX_ITEMS, workers=MICROBATCH_WORKERS, name="predict-batcher")
+    batcher.start()
+    atexit.register(batcher.stop)
+
 @app.route("/predict", methods=["POST"])
 def predict():
     try:
         payload = request.get_json(force=True)
         user_id = payload.get("user_id")
         series = payload.get("series", [])
-        feats = features_from_timeseries(series)
-        model = _load_model()
-        X = pd.DataFrame([feats])
-        try:
-            prob = float(model.predict_proba(X)[0, 1])
-        except Exception as e:
-            if hasattr(model, "feature_names_in_"):
-                cols_needed = list(model.feature_names_in_)
-                for c in cols_needed:
-                    if c not in X.columns:
-                        X[c] = 0.0
-                X = X[cols_needed]
-                prob = float(model.predict_proba(X)[0, 1])
-            else:
-                raise
+        entry = registry.get(request.args.get("model") or payload.get("model"))
+        cc = request.cache_control
+        key = None
+        if prediction_cache is not None and not cc.no_store:
+            fp = series_fingerprint(series) if isinstance(series, list) else None
+            key = (entry.name, entry.version, fp) if fp else None
+        cached = prediction_cache.get(key) if key and not cc.no_cache else None
+        if cached is not None:
+            feats, prob = cached
+        else:
+            feats, prob = _score_one(entry, "series", series)
+            if key:
+                prediction_cache.put(key, (feats, prob))
+        resp = jsonify({
+            "user_id": user_id,
+            "prob_close_to_burnout": prob,
+            "model": entry.name,
+            "model_version": entry.version,
+            "features": feats
+        })
+        resp.headers["X-Cache"] = "hit" if cached is not None else ("miss" if key else "bypass")
+        return resp
+    except FileNotFoundError as e:
+        return jsonify({"error": str(e)}), 503
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": f"Unhandled error: {type(e).__name__}: {str(e)}"}), 500
+
+@app.route("/scores", methods=["POST"])
+def add_scores():
+    try:
+        payload = request.get_json(force=True)
+        user_id = payload.get("user_id")
+        if user_id is None:
+            raise ValueError("'user_id' is required.")
+        if "series" in payload:
+            st = feature_store.update_many(user_id, payload["series"], reset=bool(payload.get("reset")))
+        else:
+            if "date" not in payload or "score" not in payload:
+                raise ValueError("Each record must include 'date' and 'score'.")
+            st = feature_store.update(user_id, payload["date"], payload["score"])
+        return jsonify({"user_id": user_id, "count_points": st.n})
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": f"Unhandled error: {type(e).__name__}: {str(e)}"}), 500
+
+@app.route("/predict/<user_id>", methods=["GET", "POST"])
+def predict_user(user_id: str):
+    try:
+        features = feature_store.features(user_id)
+        if features is None:
+            return jsonify({"error": f"No stored scores for user: {user_id}"}), 404
+        entry = registry.get(request.args.get("model"))
+        feats, prob = _score_one(entry, "features", features)
         return jsonify({
             "user_id": user_id,
             "prob_close_to_burnout": prob,
+            "model": entry.name,
+            "model_version": entry.version,
             "features": feats
         })
     except FileNotFoundError as e:
@@ -198,5 +520,44 @@ def predict():
     except Exception as e:
         return jsonify({"error": f"Unhandled error: {type(e).__name__}: {str(e)}"}), 500
 
+@app.route("/predict/batch", methods=["GET"])
+def predict_batch_get():
+    # Without this rule GET would fall through to /predict/<user_id> as user "batch"
+    return jsonify({"error": "Use POST for /predict/batch."}), 405, {"Allow": "POST"}
+
+@app.route("/predict/batch", methods=["POST"])
+def predict_batch():
+    try:
+        ndjson_in = (request.mimetype or "") == NDJSON
+        ndjson_out = ndjson_in or request.accept_mimetypes.best == NDJSON
+        model_name = request.args.get("model")
+        if ndjson_in:
+            items: Iterable[Any] = _ndjson_items(request.stream)
+        else:
+            payload = request.get_json(force=True)
+            items = payload.get("items") if isinstance(payload, dict) else payload
+            model_name = model_name or (payload.get("model") if isinstance(payload, dict) else None)
+            if not isinstance(items, list):
+                raise ValueError("Batch body must be a list of items or an object with an 'items' list.")
+        entry = registry.get(model_name)  # pinned for the whole batch, even across a hot swap
+        if ndjson_out:
+            resp = Response(stream_with_context(_score_stream(entry.model, items)), mimetype=NDJSON)
+            resp.headers["X-Model-Version"] = entry.version
+            return resp
+        results = _score_items(entry.model, items)
+        return jsonify({
+            "model": entry.name,
+            "model_version": entry.version,
+            "count": len(results),
+            "errors": sum(1 for r in results if "error" in r),
+            "results": results,
+        })
+    except FileNotFoundError as e:
+        return jsonify({"error": str(e)}), 503
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": f"Unhandled error: {type(e).__name__}: {str(e)}"}), 500
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=8000)
@@ -0,0 +1,42 @@
+"""
+Regression guard for the feature kernel: the parity check of
+bench_feature_kernel.py (without its latency part), plus the online features
+against the batch ones.
+
+Usage:
+  python -m pytest src/ml_model_burnout
+"""
+
+import numpy as np
+import pytest
+
+from bench_feature_kernel import KINDS, check_parity, random_series
+from burnout_features import FEATURE_NAMES
+from burnout_timeseries_pipeline import features_from_timeseries
+from online_features import FeatureStore
+
+pytestmark = [
+    # the reference's np.polyfit on single-date series, and nanmean of empty windows
+    pytest.mark.filterwarnings("ignore:Polyfit may be poorly conditioned"),
+    pytest.mark.filterwarnings("ignore:Mean of empty slice"),
+    pytest.mark.filterwarnings("error::FutureWarning"),
+]
+
+
+def test_kernel_matches_reference():
+    assert check_parity([5, 20, 100, 1000], cases=140, tol=1e-8, rng=np.random.default_rng(0)) == 0
+
+
+@pytest.mark.parametrize("kind", [k for k in KINDS if k != "shuffled"])  # online updates arrive in date order
+def test_online_matches_batch(kind):
+    rng = np.random.default_rng(1)
+    for n in (1, 2, 5, 60, 400):
+        df = random_series(rng, n, kind)
+        if df["score"].isna().all():
+            continue
+        store = FeatureStore()
+        for date, score in zip(df["date"], df["score"]):
+            store.update("u", date, score)
+        online, batch = store.features("u"), features_from_timeseries(df)
+        for k in FEATURE_NAMES:
+            assert online[k] == pytest.approx(batch[k], rel=1e-8, abs=1e-8), (n, k)
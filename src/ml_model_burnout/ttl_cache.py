@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Bounded in-process LRU cache with a per-entry time to live.
+
+Thread-safe: one lock around an OrderedDict (most recently used last).
+Entries past their TTL are dropped when looked up; when the cache is full
+the least recently used entry is evicted. invalidate() drops entries whose
+key matches a predicate, e.g. everything computed by a model that has just
+been swapped out.
+
+stats() reports hits, misses, hit ratio, evictions (capacity), expirations
+(TTL) and invalidations since start.
+"""
+
+import threading, time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+class TTLCache:
+    def __init__(self, max_entries: int = 10000, ttl_s: float = 300.0,
+                 clock: Callable[[], float] = time.monotonic):
+        if max_entries < 1 or ttl_s <= 0:
+            raise ValueError("TTLCache needs max_entries >= 1 and ttl_s > 0.")
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self._clock = clock
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+        self.evictions = self.expirations = self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[0] <= self._clock():
+                del self._data[key]
+                self.expirations += 1
+                item = None
+            if item is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (self._clock() + self.ttl_s, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, match: Callable[[Hashable], bool]) -> int:
+        with self._lock:
+            stale = [k for k in self._data if match(k)]
+            for k in stale:
+                del self._data[k]
+            self.invalidations += len(stale)
+            return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.invalidations += len(self._data)
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": True,
+                "entries": len(self._data),
+                "max_entries": self.max_entries,
+                "ttl_s": self.ttl_s,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Peak memory of the parser under concurrent uploads of large PDFs.
+
+Usage (from src/pdf-parser-microservice):
+  python bench/ingest_memory.py [--pages 2000] [--concurrency 8] [--spool-mb 0 8 1024] \
+    [--max-parses 4] [--out results.json]
+
+For each --spool-mb value the service (uvicorn src.main:app) is started in a
+subprocess with PDF_SPOOL_MAX_MEMORY_MB set to it, the text store disabled and
+serial extraction; --concurrency clients then upload distinct copies of a
+synthetic --pages page PDF at once. Reported are the server's peak resident
+memory (VmHWM, so Linux only), its resident memory when idle before the run,
+the wall time and the answers by status. A --spool-mb larger than the upload
+behaves like reading every upload into memory.
+"""
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from synthetic_pdf import make_pdf  # noqa: E402
+
+
+def _free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _memory_kb(pid, field):
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    return 0
+
+
+def run(args, spool_mb, docs):
+    port = _free_port()
+    env = dict(os.environ, PDF_SPOOL_MAX_MEMORY_MB=str(spool_mb), PDF_TEXT_CACHE_MAX_MB="0",
+               PDF_MAX_CONCURRENT_PARSES=str(args.max_parses), PDF_PARSE_WAIT_S="600", PDF_PARSE_WORKERS="1")
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "src.main:app", "--port", str(port),
+                               "--log-level", "warning"], cwd=os.path.dirname(HERE), env=env)
+    url = f"http://127.0.0.1:{port}"
+    try:
+        while True:
+            try:
+                httpx.get(url + "/stats").raise_for_status()
+                break
+            except httpx.TransportError:
+                time.sleep(0.1)
+        idle_kb = _memory_kb(server.pid, "VmRSS")
+
+        def upload(doc):
+            r = httpx.post(url + "/parse-pdf/", files={"file": ("bench.pdf", doc)}, timeout=600)
+            return r.status_code
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(len(docs)) as clients:
+            statuses = list(clients.map(upload, docs))
+        seconds = time.perf_counter() - start
+        peak_kb = _memory_kb(server.pid, "VmHWM")
+    finally:
+        server.terminate()
+        server.wait()
+    return {"spool_mb": spool_mb, "idle_mb": idle_kb / 1024, "peak_mb": peak_kb / 1024, "seconds": seconds,
+            "statuses": {str(s): statuses.count(s) for s in sorted(set(statuses))}}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Measure the parser's peak memory under concurrent large uploads.")
+    ap.add_argument("--pages", type=int, default=2000)
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--spool-mb", type=float, nargs="+", default=[0, 8, 1024])
+    ap.add_argument("--max-parses", type=int, default=4, help="PDF_MAX_CONCURRENT_PARSES for the server.")
+    ap.add_argument("--out", help="Also write the results as JSON to this file.")
+    args = ap.parse_args()
+
+    doc = make_pdf(args.pages)
+    # distinct bytes per client (a trailing comment), as distinct uploads would be
+    docs = [doc + b"%% client %d\n" % i for i in range(args.concurrency)]
+    print(f"upload={len(doc) / 2**20:.1f} MiB x {args.concurrency}, max_parses={args.max_parses}")
+    print(f"{'spool_mb':>9} {'idle_mb':>8} {'peak_mb':>8} {'seconds':>8}  statuses")
+    results = []
+    for spool_mb in args.spool_mb:
+        r = run(args, spool_mb, docs)
+        results.append(r)
+        print(f"{r['spool_mb']:>9g} {r['idle_mb']:>8.1f} {r['peak_mb']:>8.1f} {r['seconds']:>8.2f}  {r['statuses']}")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"args": vars(args), "upload_bytes": len(doc), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Serial vs process-pool page extraction over synthetic PDFs.
+
+Usage (from src/pdf-parser-microservice):
+  python bench/parallel_extract.py [--pages 50 200 600] [--workers 1 2 4] [--repeat 3] [--out results.json]
+
+For each document size and worker count, times src.extract.extract_pages
+(best of --repeat) with the parallel threshold at 0, checks that the text
+matches the serial result page for page, and reports pages/s and speedup over
+one worker. Pools are started and warmed before timing. Speedup is bounded by
+the cores available; the default worker list goes up to os.cpu_count().
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+from src.extract import extract_pages  # noqa: E402
+from synthetic_pdf import make_pdf  # noqa: E402
+
+
+def _default_workers():
+    cores, workers, w = os.cpu_count() or 1, [], 1
+    while w < cores:
+        workers.append(w)
+        w *= 2
+    return workers + [cores]
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark parallel PDF page extraction.")
+    ap.add_argument("--pages", type=int, nargs="+", default=[50, 200, 600])
+    ap.add_argument("--workers", type=int, nargs="+", default=_default_workers())
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--out", help="Also write the results as JSON to this file.")
+    args = ap.parse_args()
+
+    docs = {n: make_pdf(n) for n in args.pages}
+    reference = {n: extract_pages(data, workers=1) for n, data in docs.items()}
+    results = []
+    print(f"cpu_count={os.cpu_count()}")
+    print(f"{'pages':>6} {'workers':>8} {'seconds':>9} {'pages/s':>9} {'speedup':>8}")
+    for workers in args.workers:
+        pool = None
+        if workers > 1:
+            pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+            list(pool.map(abs, range(workers * 4)))  # start every worker before timing
+        try:
+            for n, data in docs.items():
+                best = float("inf")
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    pages = extract_pages(data, workers=workers, min_pages=0, pool=pool)
+                    best = min(best, time.perf_counter() - start)
+                if pages != reference[n]:
+                    raise SystemExit(f"{n} pages, {workers} workers: text differs from the serial result")
+                results.append({"pages": n, "workers": workers, "seconds": best, "pages_per_s": n / best})
+        finally:
+            if pool is not None:
+                pool.shutdown()
+    serial = {r["pages"]: r["seconds"] for r in results if r["workers"] == 1}
+    for r in sorted(results, key=lambda r: (r["pages"], r["workers"])):
+        r["speedup"] = serial[r["pages"]] / r["seconds"] if r["pages"] in serial else None
+        speedup = f"{r['speedup']:.2f}x" if r["speedup"] else "-"
+        print(f"{r['pages']:>6} {r['workers']:>8} {r['seconds']:>9.3f} {r['pages_per_s']:>9.1f} {speedup:>8}")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"cpu_count": os.cpu_count(), "args": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Synthetic text PDFs for the parser benchmarks.
+
+make_pdf(n_pages) builds an uncompressed PDF with `lines_per_page` lines of
+pseudo-random words per page (Helvetica, one text object per page), written
+directly so the benchmarks need nothing beyond PyPDF2. Page i starts with
+"Page i" so extraction order can be checked.
+"""
+
+import random
+
+WORDS = ("burnout", "quiz", "topic", "syllabus", "lecture", "student", "course", "graph", "knowledge",
+         "chapter", "theorem", "example", "exercise", "summary", "reading", "assignment", "module", "exam")
+
+
+def make_pdf(n_pages: int, lines_per_page: int = 45, words_per_line: int = 11, seed: int = 0) -> bytes:
+    rng = random.Random(seed)
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for p in range(n_pages):
+        lines = [f"Page {p + 1}"] + [" ".join(rng.choice(WORDS) for _ in range(words_per_line))
+                                      for _ in range(lines_per_page - 1)]
+        ops = ["BT", "/F1 10 Tf", "14 TL", "50 780 Td"]
+        ops += [f"({line}) Tj T*" for line in lines]
+        ops.append("ET")
+        stream = "\n".join(ops).encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_id = len(objects)
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id)
+        page_ids.append(len(objects))
+    kids = b" ".join(b"%d 0 R" % i for i in page_ids)
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, n_pages)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % off for off in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
@@ -0,0 +1,132 @@
+"""
+Page text extraction for the PDF parser.
+
+iter_pages() yields (page number, text) in page order as pages are extracted,
+optionally for a page range only; extract_pages() collects it. Documents with
+at least PDF_PARALLEL_MIN_PAGES pages to extract are split into contiguous page
+ranges that are extracted in a process pool of PDF_PARSE_WORKERS processes
+(default: one per core); shorter documents, or PDF_PARSE_WORKERS=1, are
+extracted serially in the calling thread. Readers and pages cannot be shared
+across processes, so each worker opens its own reader on the document.
+
+A document is given either as bytes or as the path of a file holding it (a
+spooled upload, see ingest.py). A file is memory-mapped rather than read, and
+workers are sent its path instead of a copy of its bytes.
+
+When streaming, ranges are smaller (several per worker) and only a couple per
+worker are in flight at once, so the first pages come back early and memory
+does not grow with the document.
+
+The pool is created on first use and uses the spawn start method, since the
+service process runs a threadpool and forking it is not safe.
+"""
+
+import io
+import mmap
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor
+from collections import deque
+from typing import BinaryIO, Iterator, List, Optional, Tuple, Union
+
+from PyPDF2 import PdfReader
+
+PARSE_WORKERS = int(os.getenv("PDF_PARSE_WORKERS", "0")) or os.cpu_count() or 1
+PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "32"))
+
+Source = Union[bytes, str]  # document bytes, or the path of a file holding them
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(PARSE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def shutdown_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True)
+            _pool = None
+
+
+def page_ranges(n_pages: int, parts: int) -> List[Tuple[int, int]]:
+    """Split range(n_pages) into at most `parts` contiguous, near-equal ranges."""
+    parts = max(1, min(parts, n_pages))
+    size, extra = divmod(n_pages, parts)
+    ranges, start = [], 0
+    for i in range(parts):
+        stop = start + size + (1 if i < extra else 0)
+        ranges.append((start, stop))
+        start = stop
+    return ranges
+
+
+def _open(source: Source) -> BinaryIO:
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)  # stays valid after close
+    return io.BytesIO(source)
+
+
+def _extract_range(source: Source, start: int, stop: int) -> List[str]:
+    reader = PdfReader(_open(source))
+    return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+def select_pages(n_pages: int, page_start: int = 1, page_end: Optional[int] = None,
+                 max_pages: Optional[int] = None) -> range:
+    """0-based page indexes for a 1-based inclusive range, capped at max_pages."""
+    stop = n_pages if page_end is None else min(page_end, n_pages)
+    if max_pages is not None:
+        stop = min(stop, page_start - 1 + max_pages)
+    return range(page_start - 1, max(page_start - 1, stop))
+
+
+def iter_pages(source: Source, page_start: int = 1, page_end: Optional[int] = None, max_pages: Optional[int] = None,
+               workers: int = PARSE_WORKERS, min_pages: int = PARALLEL_MIN_PAGES,
+               pool: Optional[Executor] = None, ranges_per_worker: int = 4) -> Iterator[Tuple[int, str]]:
+    """(page number, text) for the selected pages, in order.
+
+    The document is opened here, so an unreadable file raises before the
+    first page is asked for.
+    """
+    reader = PdfReader(_open(source))
+    pages = select_pages(len(reader.pages), page_start, page_end, max_pages)
+    if workers <= 1 or len(pages) < min_pages:
+        return ((i + 1, reader.pages[i].extract_text() or "") for i in pages)
+    ranges = [(pages.start + a, pages.start + b) for a, b in page_ranges(len(pages), workers * ranges_per_worker)]
+    return _iter_pool(pool or get_pool(), source, ranges, max_pending=workers * 2)
+
+
+def _iter_pool(pool: Executor, source: Source, ranges: List[Tuple[int, int]],
+               max_pending: int) -> Iterator[Tuple[int, str]]:
+    pending: deque = deque()
+    next_range = 0
+    try:
+        while pending or next_range < len(ranges):
+            while next_range < len(ranges) and len(pending) < max_pending:
+                start, stop = ranges[next_range]
+                pending.append((start, pool.submit(_extract_range, source, start, stop)))
+                next_range += 1
+            start, future = pending.popleft()
+            for offset, text in enumerate(future.result()):
+                yield start + offset + 1, text
+    finally:
+        for _, future in pending:  # the consumer went away
+            future.cancel()
+
+
+def extract_pages(source: Source, page_start: int = 1, page_end: Optional[int] = None,
+                  max_pages: Optional[int] = None, workers: int = PARSE_WORKERS,
+                  min_pages: int = PARALLEL_MIN_PAGES, pool: Optional[Executor] = None) -> List[str]:
+    """Texts of the selected pages; in a pool, one page range per worker."""
+    return [text for _, text in iter_pages(source, page_start, page_end, max_pages, workers, min_pages, pool,
+                                           ranges_per_worker=1)]
@@ -0,0 +1,205 @@
+"""
+Bounded-memory ingestion of uploaded PDFs.
+
+A Spooler takes an upload chunk by chunk, hashing it on the way. Uploads up to
+PDF_SPOOL_MAX_MEMORY_MB stay in memory as one bytes object; larger ones are
+written to a temporary file in PDF_SPOOL_DIR, and the parser memory-maps that
+file (pool workers map the same file by path) instead of holding a copy. The
+file is deleted when the request is done with it. receive_upload() feeds it the
+file part of a multipart request body straight from the socket, so the upload
+is written once.
+
+ParseSlots caps how many uploads this process receives and parses at once
+(PDF_MAX_CONCURRENT_PARSES), so peak memory and spool disk are bounded by that
+many documents in flight. The slot is taken before the body is read. A request
+that cannot get a slot within PDF_PARSE_WAIT_S seconds is turned away with 503
+instead of queueing without limit.
+
+Settings (env):
+  PDF_SPOOL_MAX_MEMORY_MB=8
+  PDF_SPOOL_DIR=                   default: the system temp directory
+  PDF_MAX_CONCURRENT_PARSES=4
+  PDF_PARSE_WAIT_S=30
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Union
+
+from python_multipart import MultipartParser
+from python_multipart.exceptions import FormParserError
+from python_multipart.multipart import parse_options_header
+from starlette.concurrency import run_in_threadpool
+
+SPOOL_MAX_MEMORY = int(float(os.getenv("PDF_SPOOL_MAX_MEMORY_MB", "8")) * 1024 * 1024)
+SPOOL_DIR = os.getenv("PDF_SPOOL_DIR") or None
+
+
+class SlotsBusy(Exception):
+    pass
+
+
+class BadUpload(Exception):
+    pass
+
+
+class Spooled:
+    """An ingested upload: `source` is its bytes, or the path of the spool file."""
+
+    def __init__(self, source: Union[bytes, str], sha256: str, size: int):
+        self.source = source
+        self.sha256 = sha256
+        self.size = size
+
+    @property
+    def on_disk(self) -> bool:
+        return isinstance(self.source, str)
+
+
+class Spooler:
+    """Collects an upload written to it in chunks; close() deletes its spool file."""
+
+    def __init__(self, max_memory: int = SPOOL_MAX_MEMORY, dir: Optional[str] = SPOOL_DIR):
+        self.max_memory = max_memory
+        self.dir = dir
+        self.size = 0
+        self._digest = hashlib.sha256()
+        self._chunks: List[bytes] = []
+        self._tmp: Optional[Any] = None
+
+    def write(self, chunk: bytes) -> None:
+        self._digest.update(chunk)
+        self.size += len(chunk)
+        if self._tmp is None and self.size > self.max_memory:
+            self._tmp = tempfile.NamedTemporaryFile(dir=self.dir, prefix="upload-", suffix=".pdf", delete=False)
+            self._tmp.writelines(self._chunks)
+            self._chunks = []
+        if self._tmp is None:
+            self._chunks.append(chunk)
+        else:
+            self._tmp.write(chunk)
+
+    def finish(self) -> Spooled:
+        if self._tmp is None:
+            return Spooled(b"".join(self._chunks), self._digest.hexdigest(), self.size)
+        self._tmp.close()
+        return Spooled(self._tmp.name, self._digest.hexdigest(), self.size)
+
+    def close(self) -> None:
+        self._chunks = []
+        if self._tmp is not None:
+            self._tmp.close()
+            try:
+                os.remove(self._tmp.name)
+            except FileNotFoundError:
+                pass
+
+    def __enter__(self) -> "Spooler":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+async def receive_upload(content_type: str, body: AsyncIterator[bytes], spooler: Spooler,
+                         field: str = "file") -> Spooled:
+    """Write the `field` file part of a multipart/form-data body to spooler; raises BadUpload."""
+    kind, params = parse_options_header(content_type)
+    if kind != b"multipart/form-data" or b"boundary" not in params:
+        raise BadUpload("Expected a multipart/form-data upload")
+    part: Dict[str, Any] = {}
+    pending: List[bytes] = []
+    found = ended = False
+
+    def on_part_begin() -> None:
+        part.clear()
+        part.update(header=b"", value=b"", disposition=b"", wanted=False)
+
+    def on_header_field(data: bytes, start: int, end: int) -> None:
+        part["header"] += data[start:end]
+
+    def on_header_value(data: bytes, start: int, end: int) -> None:
+        part["value"] += data[start:end]
+
+    def on_header_end() -> None:
+        if part["header"].lower() == b"content-disposition":
+            part["disposition"] = part["value"]
+        part["header"] = part["value"] = b""
+
+    def on_headers_finished() -> None:
+        nonlocal found
+        _, options = parse_options_header(part["disposition"])
+        part["wanted"] = not found and options.get(b"name") == field.encode() and b"filename" in options
+        found = found or part["wanted"]
+
+    def on_part_data(data: bytes, start: int, end: int) -> None:
+        if part["wanted"]:
+            pending.append(data[start:end])
+
+    def on_end() -> None:
+        nonlocal ended
+        ended = True
+
+    parser = MultipartParser(params[b"boundary"], {
+        "on_part_begin": on_part_begin, "on_header_field": on_header_field, "on_header_value": on_header_value,
+        "on_header_end": on_header_end, "on_headers_finished": on_headers_finished, "on_part_data": on_part_data,
+        "on_end": on_end,
+    })
+    try:
+        async for chunk in body:
+            parser.write(chunk)
+            if pending:
+                data = b"".join(pending)
+                pending.clear()
+                await run_in_threadpool(spooler.write, data)  # may write to the spool file
+        parser.finalize()
+    except FormParserError as e:
+        raise BadUpload(f"Invalid multipart body: {e}")
+    if not ended:
+        raise BadUpload("Multipart body ends before its closing boundary")
+    if not found:
+        raise BadUpload(f"No file in the '{field}' field")
+    return await run_in_threadpool(spooler.finish)
+
+
+class ParseSlots:
+    def __init__(self, limit: int, wait_s: float):
+        self.limit = limit
+        self.wait_s = wait_s
+        self._slots = threading.BoundedSemaphore(limit)
+        self._lock = threading.Lock()
+        self.in_use = self.acquired = self.rejected = 0
+
+    @classmethod
+    def from_env(cls) -> "ParseSlots":
+        return cls(int(os.getenv("PDF_MAX_CONCURRENT_PARSES", "4")), float(os.getenv("PDF_PARSE_WAIT_S", "30")))
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        """Hold one of the slots; raises SlotsBusy if none frees up in time."""
+        if not self._slots.acquire(timeout=self.wait_s):
+            with self._lock:
+                self.rejected += 1
+            raise SlotsBusy(f"All {self.limit} parse slots are in use; retry later")
+        with self._lock:
+            self.in_use += 1
+            self.acquired += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_use -= 1
+            self._slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "limit": self.limit,
+                "in_use": self.in_use,
+                "acquired": self.acquired,
+                "rejected": self.rejected,
+                "spool_max_memory_bytes": SPOOL_MAX_MEMORY,
+            }
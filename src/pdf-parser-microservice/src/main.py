@@ -1,12 +1,161 @@
-from fastapi import FastAPI, UploadFile, File
-from PyPDF2 import PdfReader
-import io
-
-app = FastAPI()
-
-@app.post("/parse-pdf/")
-def parse_pdf(file: UploadFile = File(...)):
-    contents = file.file.read()
-    reader = PdfReader(io.BytesIO(contents))
-    text = "\n".join(page.extract_text() or "" for page in reader.pages)
-    return {"text": text}
+import json
+from contextlib import ExitStack, asynccontextmanager
+from itertools import islice
+from typing import Dict, Iterator, Optional, Tuple
+
+from fastapi import Depends, FastAPI, HTTPException, Path, Query, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+from .extract import extract_pages, iter_pages, shutdown_pool
+from .ingest import BadUpload, ParseSlots, Spooled, Spooler, SlotsBusy, receive_upload
+from .text_store import TextStore
+
+NDJSON = "application/x-ndjson"
+SHA256_PATTERN = "^[0-9a-f]{64}$"
+UPLOAD_OPENAPI = {"requestBody": {"required": True, "content": {"multipart/form-data": {"schema": {
+    "type": "object", "required": ["file"], "properties": {"file": {"type": "string", "format": "binary"}}}}}}}
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.text_store = TextStore.from_env()
+    app.state.parse_slots = ParseSlots.from_env()
+    try:
+        yield
+    finally:
+        shutdown_pool()
+
+app = FastAPI(lifespan=lifespan)
+
+class PageRange:
+    def __init__(self,
+                 page_start: int = Query(1, ge=1, description="First page to extract (1-based)"),
+                 page_end: Optional[int] = Query(None, ge=1, description="Last page to extract (inclusive)"),
+                 max_pages: Optional[int] = Query(None, ge=1, description="Extract at most this many pages")):
+        if page_end is not None and page_end < page_start:
+            raise HTTPException(status_code=422, detail="page_end must not be before page_start")
+        self.page_start, self.page_end, self.max_pages = page_start, page_end, max_pages
+
+    @property
+    def is_whole_document(self) -> bool:
+        return self.page_start == 1 and self.page_end is None and self.max_pages is None
+
+def _ndjson_pages(pages: Iterator[Tuple[int, str]]) -> Iterator[bytes]:
+    # One {"page", "text"} record per line as soon as the page is extracted;
+    # a failure after the first record can only be reported in-band.
+    try:
+        for number, text in pages:
+            yield (json.dumps({"page": number, "text": text}) + "\n").encode()
+    except Exception as e:
+        yield (json.dumps({"error": f"{type(e).__name__}: {e}"}) + "\n").encode()
+
+def _wants_stream(request: Request, stream: bool) -> bool:
+    return stream or NDJSON in request.headers.get("accept", "")
+
+def _respond(pages: Iterator[Tuple[int, str]], stream: bool, headers: Dict[str, str]) -> Response:
+    if stream:
+        return StreamingResponse(_ndjson_pages(pages), media_type=NDJSON, headers=headers)
+    return JSONResponse({"text": "\n".join(text for _, text in pages)}, headers=headers)
+
+def _stored_pages(texts: Iterator[str], pages: PageRange) -> Iterator[Tuple[int, str]]:
+    # Stored pages are read in order: the ones before the range are skipped
+    # without being kept and reading stops at its end.
+    last = pages.page_end
+    if pages.max_pages is not None:
+        capped = pages.page_start - 1 + pages.max_pages
+        last = capped if last is None else min(last, capped)
+    try:
+        yield from islice(enumerate(texts, start=1), pages.page_start - 1, last)
+    finally:
+        texts.close()
+
+def _storing(pages: Iterator[Tuple[int, str]], store: TextStore, digest: str) -> Iterator[Tuple[int, str]]:
+    # A streamed whole-document extraction is written to the store page by
+    # page as it goes out; the entry is only published once it is complete.
+    writer = store.writer(digest)
+    if writer is None:
+        yield from pages
+        return
+    complete = False
+    try:
+        for number, text in pages:
+            writer.add(text)
+            yield number, text
+        complete = True
+    finally:
+        if complete:
+            writer.commit()
+        else:
+            writer.abort()
+
+def _releasing(pages: Iterator[Tuple[int, str]], resources: ExitStack) -> Iterator[Tuple[int, str]]:
+    # The parse slot and the spooled upload are held until the stream ends.
+    with resources:
+        yield from pages
+
+def get_text_store(request: Request) -> TextStore:
+    return request.app.state.text_store
+
+def get_parse_slots(request: Request) -> ParseSlots:
+    return request.app.state.parse_slots
+
+STREAM_DESCRIPTION = f"Stream {NDJSON} page records (also with Accept: {NDJSON})"
+
+# Extracted text is stored by the SHA-256 of the uploaded bytes, returned in
+# X-Content-SHA256. A caller that already knows a document's hash can check
+# HEAD /documents/{sha256} and GET the text instead of uploading it again.
+
+def _parse(upload: Spooled, pages: PageRange, stream: bool, store: TextStore, resources: ExitStack) -> Response:
+    digest = upload.sha256
+    stored = store.iter_pages(digest)
+    headers = {"X-Content-SHA256": digest, "X-Cache": "miss" if stored is None else "hit"}
+    if stored is not None:
+        return _respond(_stored_pages(stored, pages), stream, headers)
+    if stream:
+        extracted = iter_pages(upload.source, pages.page_start, pages.page_end, pages.max_pages)
+        if pages.is_whole_document:
+            extracted = _storing(extracted, store, digest)
+        return _respond(_releasing(extracted, resources.pop_all()), True, headers)
+    texts = extract_pages(upload.source, pages.page_start, pages.page_end, pages.max_pages)
+    if pages.is_whole_document:
+        store.put(digest, texts)
+    return JSONResponse({"text": "\n".join(texts)}, headers=headers)
+
+# The upload is read from the request here rather than by FastAPI, so that the
+# parse slot is held while it arrives and it is spooled once, straight from the
+# socket; the multipart body has a single file field, "file".
+
+@app.post("/parse-pdf/", openapi_extra=UPLOAD_OPENAPI)
+async def parse_pdf(request: Request, pages: PageRange = Depends(),
+                    stream: bool = Query(False, description=STREAM_DESCRIPTION),
+                    store: TextStore = Depends(get_text_store), slots: ParseSlots = Depends(get_parse_slots)):
+    stream = _wants_stream(request, stream)
+    with ExitStack() as resources:
+        try:
+            await run_in_threadpool(resources.enter_context, slots.slot())
+        except SlotsBusy as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+        spooler = resources.enter_context(Spooler())
+        try:
+            upload = await receive_upload(request.headers.get("content-type", ""), request.stream(), spooler)
+        except BadUpload as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        return await run_in_threadpool(_parse, upload, pages, stream, store, resources)
+
+@app.head("/documents/{sha256}")
+def document_exists(sha256: str = Path(..., pattern=SHA256_PATTERN), store: TextStore = Depends(get_text_store)):
+    return Response(status_code=200 if sha256 in store else 404, headers={"X-Content-SHA256": sha256})
+
+@app.get("/documents/{sha256}")
+def read_document(request: Request, sha256: str = Path(..., pattern=SHA256_PATTERN), pages: PageRange = Depends(),
+                  stream: bool = Query(False, description=STREAM_DESCRIPTION),
+                  store: TextStore = Depends(get_text_store)):
+    stored = store.iter_pages(sha256)
+    if stored is None:
+        raise HTTPException(status_code=404, detail="Document not stored; upload it to /parse-pdf/")
+    return _respond(_stored_pages(stored, pages), _wants_stream(request, stream),
+                    {"X-Content-SHA256": sha256, "X-Cache": "hit"})
+
+@app.get("/stats")
+def stats(store: TextStore = Depends(get_text_store), slots: ParseSlots = Depends(get_parse_slots)):
+    return {"text_store": store.stats(), "parse_slots": slots.stats()}
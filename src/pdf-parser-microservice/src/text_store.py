@@ -0,0 +1,175 @@
+"""
+Content-addressed store of extracted page text.
+
+Entries are keyed by the SHA-256 of the uploaded PDF bytes and hold the text
+of every page, one JSON string per line, gzip-compressed on disk as
+<digest>.ndjson.gz. Pages are written and read one at a time, so neither
+storing a long document nor serving it from the store needs it all in memory.
+
+The store is bounded by the total compressed size (PDF_TEXT_CACHE_MAX_MB);
+the least recently used entries are deleted when it is exceeded. Recency is
+kept in memory and rebuilt from file modification times on startup (reads
+touch the file). Writes go to a temporary file that is renamed into place,
+so readers never see a partial entry.
+
+Settings (env):
+  PDF_TEXT_CACHE_DIR=./text-cache
+  PDF_TEXT_CACHE_MAX_MB=512        0 disables the store
+"""
+
+import gzip
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional
+
+SUFFIX = ".ndjson.gz"
+
+
+class PageWriter:
+    """Collects one document's pages on disk; commit() publishes the entry."""
+
+    def __init__(self, store: "TextStore", digest: str):
+        self.store = store
+        self.digest = digest
+        fd, self.tmp_path = tempfile.mkstemp(dir=store.root, suffix=".tmp")
+        self._file = gzip.GzipFile(fileobj=os.fdopen(fd, "wb"), mode="wb", compresslevel=6)
+        self._raw = self._file.fileobj
+        self.pages = 0
+
+    def add(self, text: str) -> None:
+        self._file.write((json.dumps(text) + "\n").encode())
+        self.pages += 1
+
+    def commit(self) -> None:
+        self._file.close()
+        self._raw.close()
+        self.store._publish(self.digest, self.tmp_path)
+
+    def abort(self) -> None:
+        self._file.close()
+        self._raw.close()
+        try:
+            os.remove(self.tmp_path)
+        except FileNotFoundError:
+            pass
+
+
+class TextStore:
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._index: "OrderedDict[str, int]" = OrderedDict()  # digest -> compressed size, LRU first
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.stores = self.evictions = 0
+        if self.enabled:
+            os.makedirs(root, exist_ok=True)
+            self._load()
+
+    @classmethod
+    def from_env(cls) -> "TextStore":
+        return cls(os.getenv("PDF_TEXT_CACHE_DIR", "./text-cache"),
+                   int(float(os.getenv("PDF_TEXT_CACHE_MAX_MB", "512")) * 1024 * 1024))
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.root, digest + SUFFIX)
+
+    def _load(self) -> None:
+        entries = []
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name.endswith(".tmp"):  # left by an interrupted write
+                os.remove(path)
+            elif name.endswith(SUFFIX):
+                st = os.stat(path)
+                entries.append((st.st_mtime, name[:-len(SUFFIX)], st.st_size))
+        for _, digest, size in sorted(entries):
+            self._index[digest] = size
+            self._bytes += size
+        with self._lock:
+            self._evict()
+
+    def __contains__(self, digest: str) -> bool:
+        with self._lock:
+            return digest in self._index
+
+    def iter_pages(self, digest: str) -> Optional[Iterator[str]]:
+        """The stored pages, read lazily, or None if the document is not stored."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            if digest not in self._index:
+                self.misses += 1
+                return None
+            self._index.move_to_end(digest)
+            self.hits += 1
+            path = self._path(digest)
+            try:
+                os.utime(path)
+                f = gzip.open(path, "rb")
+            except FileNotFoundError:  # deleted behind our back
+                self._bytes -= self._index.pop(digest)
+                return None
+        return self._read(f)
+
+    @staticmethod
+    def _read(f) -> Iterator[str]:
+        with f:
+            for line in f:
+                yield json.loads(line)
+
+    def writer(self, digest: str) -> Optional[PageWriter]:
+        return PageWriter(self, digest) if self.enabled else None
+
+    def put(self, digest: str, pages: List[str]) -> None:
+        writer = self.writer(digest)
+        if writer is None:
+            return
+        try:
+            for text in pages:
+                writer.add(text)
+        except BaseException:
+            writer.abort()
+            raise
+        writer.commit()
+
+    def _publish(self, digest: str, tmp_path: str) -> None:
+        size = os.path.getsize(tmp_path)
+        with self._lock:
+            os.replace(tmp_path, self._path(digest))
+            self._bytes += size - self._index.pop(digest, 0)
+            self._index[digest] = size
+            self.stores += 1
+            self._evict()
+
+    def _evict(self) -> None:
+        while self._bytes > self.max_bytes and len(self._index) > 1:
+            digest, size = self._index.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self._path(digest))
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._index),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "stores": self.stores,
+                "evictions": self.evictions,
+            }